@@ -1,7 +1,15 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Depends, Header, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from employees.employee import EmployeeHandler
-from data_handler import EmployeeData, SalaryData, OwnCompanyData, SummaryInsights, Works
+from fastapi.responses import PlainTextResponse
+from data_handler import DB_NAME, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, EmployeeData, SalaryData, OwnCompanyData, SummaryInsights, Works, read_salary_entries_file, catalog_stats
+from database_interface import close_all_pools, get_pool, query_stats
+from responses import FrameJSONResponse, conditional_get, frame_response, negotiate_format, stream_frames_response, tagged
+from db_executor import ExecutionLane, POINT_LANE, REPORT_LANE, create_lanes, lane_slot
+from migrations import migrate
+from request_metrics import MetricsMiddleware
+from profiling import ProfilingMiddleware, authorized, load_profile
+import metrics
 import logging
 import traceback
 
@@ -11,9 +19,70 @@ import traceback
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)  # Set logging level as needed
 
-import polars as pl
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # schema work happens once per process, handlers are shared by every request
+    migrate(DB_NAME)
+    app.state.employee_data = EmployeeData()
+    app.state.own_company_data = OwnCompanyData()
+    app.state.salary_data = SalaryData()
+    app.state.summary_insights = SummaryInsights()
+    app.state.works = Works()
+    app.state.table_versions = get_pool(DB_NAME).versions
+    app.state.lanes = create_lanes()
+    yield
+    for lane in app.state.lanes.values():
+        lane.shutdown()
+    close_all_pools()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def get_employee_data(request: Request) -> EmployeeData:
+    return request.app.state.employee_data
+
+
+def get_own_company_data(request: Request) -> OwnCompanyData:
+    return request.app.state.own_company_data
+
+
+def get_salary_data(request: Request) -> SalaryData:
+    return request.app.state.salary_data
+
+
+def get_summary_insights(request: Request) -> SummaryInsights:
+    return request.app.state.summary_insights
+
+
+def get_works(request: Request) -> Works:
+    return request.app.state.works
+
+
+# cheap lookups and writes must never wait behind full-table reports
+point_lane = lane_slot(POINT_LANE)
+report_lane = lane_slot(REPORT_LANE)
+
+# conditional GETs, keyed on the tables each listing reads
+employees_etag = conditional_get("employees")
+own_companies_etag = conditional_get("own_companies")
+salary_entries_etag = conditional_get("salaries", "salary_lines")
+salary_entries_with_works_etag = conditional_get("salaries", "salary_lines", "works")
+payment_summary_etag = conditional_get("company_payment_rollup")
+works_etag = conditional_get("works")
+
+
+def is_paged(limit, after, fields) -> bool:
+    # list endpoints keep returning the whole table unless the client asks for a page or a projection
+    return limit is not None or after is not None or fields is not None
+
+
+def check_streamable(stream: bool, limit, after, fields):
+    # pages are bounded already, streaming is for whole listings
+    if stream and is_paged(limit, after, fields):
+        raise ValueError("stream can not be combined with limit, after or fields")
+
 
 origins = [
     "http://localhost:5173",
@@ -26,13 +95,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+# added last so it wraps every other middleware
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/get_all_employees")
-async def get_all_employees(key: str | None = None, token: str| None = None):
-    try:
-        employee_handler = EmployeeData()
-        employees = employee_handler.get_all_employees()
-        return {"employees": employees, "has_error": False}
+async def get_all_employees(limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE), after: int | None = None, fields: str | None = None, stream: bool = False, key: str | None = None, token: str| None = None, etag: str = Depends(employees_etag), employee_handler: EmployeeData = Depends(get_employee_data), lane: ExecutionLane = Depends(report_lane)):
+    try:
+        check_streamable(stream, limit, after, fields)
+        if stream:
+            return tagged(stream_frames_response("employees", employee_handler.stream_all_employees(), iterate=lane.iterate, has_error=False), etag)
+        if is_paged(limit, after, fields):
+            employees, next_after = await lane.run(employee_handler.get_employees_page_as_df, limit or DEFAULT_PAGE_SIZE, after, fields)
+            return tagged(await lane.run(FrameJSONResponse, {"employees": employees, "next_after": next_after, "has_error": False}), etag)
+        employees = await lane.run(employee_handler.get_all_employees_as_df)
+        return tagged(await lane.run(FrameJSONResponse, {"employees": employees, "has_error": False}), etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
@@ -40,11 +117,10 @@ async def get_all_employees(key: str | None = None, token: str| None = None):
 
 
 @app.get("/get_employee")
-async def get_employee(employee_id: int | None = None, key: str | None = None, token: str| None = None):
+async def get_employee(employee_id: int | None = None, key: str | None = None, token: str| None = None, etag: str = Depends(employees_etag), employee_handler: EmployeeData = Depends(get_employee_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        employee_handler = EmployeeData()
-        employee = employee_handler.get_employee(employee_id)
-        return employee
+        employee = await lane.run(employee_handler.get_employee, employee_id)
+        return tagged(employee, etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
@@ -52,10 +128,9 @@ async def get_employee(employee_id: int | None = None, key: str | None = None, t
     
 
 @app.post("/add_employee")
-async def add_employee(request: dict | None=None, key: str | None = None, token: str| None = None):
+async def add_employee(request: dict | None=None, key: str | None = None, token: str| None = None, employee_handler: EmployeeData = Depends(get_employee_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        employee_handler = EmployeeData()
-        employee_handler.add_employee(request['data'])
+        await lane.run(employee_handler.add_employee, request['data'])
         return {"msg": "Employee added successfully", "has_error": False}
     except Exception :
         error = traceback.format_exc()
@@ -64,10 +139,9 @@ async def add_employee(request: dict | None=None, key: str | None = None, token:
     
 
 @app.delete("/delete_employee")
-async def delete_employee(employee_id: int, key: str | None = None, token: str| None = None):
+async def delete_employee(employee_id: int, key: str | None = None, token: str| None = None, employee_handler: EmployeeData = Depends(get_employee_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        employee_handler = EmployeeData()
-        employee_handler.delete_employee(employee_id)
+        await lane.run(employee_handler.delete_employee, employee_id)
         return {"msg": "Employee deleted successfully", "has_error": False}
     except Exception :
         error = traceback.format_exc()
@@ -75,10 +149,9 @@ async def delete_employee(employee_id: int, key: str | None = None, token: str|
         return {"error": str(error), "has_error": True}
 
 @app.put("/update_employee")
-async def update_employee(employee_id: str, request: dict | None=None, key: str | None = None, token: str| None = None):
+async def update_employee(employee_id: str, request: dict | None=None, key: str | None = None, token: str| None = None, employee_handler: EmployeeData = Depends(get_employee_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        employee_handler = EmployeeData()
-        employee_handler.update_employee(employee_id, request['data'])
+        await lane.run(employee_handler.update_employee, employee_id, request['data'])
         return {"msg": "updated sucessfulley", "has_error": False}
     except Exception :
         error = traceback.format_exc()
@@ -86,10 +159,9 @@ async def update_employee(employee_id: str, request: dict | None=None, key: str
         return {"error": str(error), "has_error": True}
 
 @app.post("/create_own_company")
-async def create_own_company(payload: dict, key: str | None = None, token: str| None = None):
+async def create_own_company(payload: dict, key: str | None = None, token: str| None = None, own_company_handler: OwnCompanyData = Depends(get_own_company_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        own_company_handler = OwnCompanyData()
-        own_company_handler.add_own_company(payload['data'])
+        await lane.run(own_company_handler.add_own_company, payload['data'])
         return {"company": payload, "key": key, "token": token}
     except Exception:
         error = traceback.format_exc()
@@ -97,32 +169,35 @@ async def create_own_company(payload: dict, key: str | None = None, token: str|
         return {"error": str(error), "has_error": True}
 
 @app.get("/get_all_own_companies")
-async def get_all_own_companies(key: str | None = None, token: str| None = None):
-    try:
-        own_company_handler = OwnCompanyData()
-        companies = own_company_handler.get_all_own_companies()
-        return {"companies": companies, "key": key, "token": token}
+async def get_all_own_companies(limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE), after: int | None = None, fields: str | None = None, stream: bool = False, key: str | None = None, token: str| None = None, etag: str = Depends(own_companies_etag), own_company_handler: OwnCompanyData = Depends(get_own_company_data), lane: ExecutionLane = Depends(report_lane)):
+    try:
+        check_streamable(stream, limit, after, fields)
+        if stream:
+            return tagged(stream_frames_response("companies", own_company_handler.stream_all_own_companies(), iterate=lane.iterate, key=key, token=token), etag)
+        if is_paged(limit, after, fields):
+            companies, next_after = await lane.run(own_company_handler.get_own_companies_page_as_df, limit or DEFAULT_PAGE_SIZE, after, fields)
+            return tagged(await lane.run(FrameJSONResponse, {"companies": companies, "next_after": next_after, "key": key, "token": token}), etag)
+        companies = await lane.run(own_company_handler.get_all_own_companies_as_df)
+        return tagged(await lane.run(FrameJSONResponse, {"companies": companies, "key": key, "token": token}), etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
         return {"error": str(error), "has_error": True}
     
 @app.get("/get_all_own_company_names")
-async def get_all_own_company_names(key: str | None = None, token: str| None = None):
+async def get_all_own_company_names(key: str | None = None, token: str| None = None, etag: str = Depends(own_companies_etag), own_company_handler: OwnCompanyData = Depends(get_own_company_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        own_company_handler = OwnCompanyData()
-        companies = own_company_handler.get_all_own_company_names()
-        return {"companies": companies, "key": key, "token": token}
+        companies = await lane.run(own_company_handler.get_all_own_company_names)
+        return tagged({"companies": companies, "key": key, "token": token}, etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
         return {"error": str(error), "has_error": True}
     
 @app.put("/update_own_company")
-async def update_own_company(company_id: int, payload: dict, key: str | None = None, token: str| None = None):
+async def update_own_company(company_id: int, payload: dict, key: str | None = None, token: str| None = None, own_company_handler: OwnCompanyData = Depends(get_own_company_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        own_company_handler = OwnCompanyData()
-        own_company_handler.update_own_company(company_id, payload['data'])
+        await lane.run(own_company_handler.update_own_company, company_id, payload['data'])
         return {"company_id": company_id, "key": key, "token": token}
     except Exception:
         error = traceback.format_exc()
@@ -130,10 +205,9 @@ async def update_own_company(company_id: int, payload: dict, key: str | None = N
         return {"error": str(error), "has_error": True}
     
 @app.delete("/delete_own_company")
-async def delete_own_company(company_id: int, key: str | None = None, token: str| None = None):
+async def delete_own_company(company_id: int, key: str | None = None, token: str| None = None, own_company_handler: OwnCompanyData = Depends(get_own_company_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        own_company_handler = OwnCompanyData()
-        own_company_handler.delete_own_company(company_id)
+        await lane.run(own_company_handler.delete_own_company, company_id)
         return {"company_id": company_id, "key": key, "token": token}
     except Exception:
         error = traceback.format_exc()
@@ -143,22 +217,50 @@ async def delete_own_company(company_id: int, key: str | None = None, token: str
     
 
 @app.post("/create_employee_salary_entry")
-async def create_employee_salary_entry(payload: dict|None=None, key: str | None = None, token: str| None = None):
+async def create_employee_salary_entry(payload: dict|None=None, key: str | None = None, token: str| None = None, salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        salary_handler = SalaryData()
-        salary_handler.add_salary_entry(payload['data'])
+        await lane.run(salary_handler.add_salary_entry, payload['data'])
         return {"employee_id": payload['data']['employee_id'], "key": key, "token": token}
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
         return {"error": str(error), "has_error": True}
     
-@app.get("/get_all_salary_entries")
-async def get_all_salary_entries(key: str | None = None, token: str| None = None):
+@app.post("/create_employee_salary_entries")
+async def create_employee_salary_entries(payload: dict, key: str | None = None, token: str| None = None, salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(report_lane)):
+    try:
+        inserted = await lane.run(salary_handler.add_salary_entries, payload['data'])
+        return {"inserted": inserted, "has_error": False, "key": key, "token": token}
+    except Exception:
+        error = traceback.format_exc()
+        logger.error(error)
+        return {"error": str(error), "has_error": True}
+
+
+@app.post("/import_employee_salary_entries")
+async def import_employee_salary_entries(file: UploadFile, key: str | None = None, token: str| None = None, salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(report_lane)):
     try:
-        salary_handler = SalaryData()
-        salary_entries = salary_handler.get_all_salary_entries()
-        return {"salary_entries": salary_entries, "key": key, "token": token}
+        content = await file.read()
+        entries = await lane.run(read_salary_entries_file, content, file.filename)
+        inserted = await lane.run(salary_handler.add_salary_entries, entries)
+        return {"inserted": inserted, "has_error": False, "key": key, "token": token}
+    except Exception:
+        error = traceback.format_exc()
+        logger.error(error)
+        return {"error": str(error), "has_error": True}
+
+@app.get("/get_all_salary_entries")
+async def get_all_salary_entries(limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE), after: int | None = None, fields: str | None = None, stream: bool = False, format: str | None = None, compression: str | None = None, accept: str | None = Header(default=None), key: str | None = None, token: str| None = None, etag: str = Depends(salary_entries_with_works_etag), salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(report_lane)):
+    try:
+        response_format = negotiate_format(format, accept)
+        check_streamable(stream, limit, after, fields)
+        if stream:
+            return tagged(stream_frames_response("salary_entries", salary_handler.stream_all_salary_entries(), response_format, compression, iterate=lane.iterate, key=key, token=token), etag)
+        if is_paged(limit, after, fields):
+            salary_entries, next_after = await lane.run(salary_handler.get_salary_entries_page_as_df, limit or DEFAULT_PAGE_SIZE, after, fields)
+            return tagged(await lane.run(frame_response, "salary_entries", salary_entries, response_format, compression, next_after=next_after, key=key, token=token), etag)
+        salary_entries = await lane.run(salary_handler.get_all_salary_entries_as_df)
+        return tagged(await lane.run(frame_response, "salary_entries", salary_entries, response_format, compression, key=key, token=token), etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
@@ -166,37 +268,37 @@ async def get_all_salary_entries(key: str | None = None, token: str| None = None
     
 
 @app.get("/get_all_salary_entries_company")
-async def get_all_salary_entries_company(company: str, key: str | None = None, token: str| None = None):
+async def get_all_salary_entries_company(company: str, stream: bool = False, format: str | None = None, compression: str | None = None, accept: str | None = Header(default=None), key: str | None = None, token: str| None = None, etag: str = Depends(salary_entries_etag), salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(report_lane)):
     try:
-        salary_handler = SalaryData()
-        salary_entries = salary_handler.get_all_salary_entries_company(company)
-        return {"salary_entries": salary_entries, "key": key, "token": token}
+        response_format = negotiate_format(format, accept)
+        if stream:
+            return tagged(stream_frames_response("salary_entries", salary_handler.stream_all_salary_entries_company(company), response_format, compression, iterate=lane.iterate, key=key, token=token), etag)
+        salary_entries = await lane.run(salary_handler.get_all_salary_entries_company_as_df, company)
+        return tagged(await lane.run(frame_response, "salary_entries", salary_entries, response_format, compression, key=key, token=token), etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
         return {"error": str(error), "has_error": True}
 
 @app.get("/get_employee_salary_entries")
-async def get_employee_salary_entries(employee_id: int, key: str | None = None, token: str| None = None):
+async def get_employee_salary_entries(employee_id: int, key: str | None = None, token: str| None = None, etag: str = Depends(salary_entries_etag), salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(report_lane)):
     try:
-        salary_handler = SalaryData()
-        salary_entries = salary_handler.get_all_salary_entries_of_an_employee(employee_id)
+        salary_entries = await lane.run(salary_handler.get_all_salary_entries_of_an_employee_as_df, employee_id)
         if salary_entries is None:
             return {"error": "No salary entries found", "has_error": True}
-        return {"salary_entries": salary_entries, "key": key, "token": token}
+        return tagged(await lane.run(FrameJSONResponse, {"salary_entries": salary_entries, "key": key, "token": token}), etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
         return {"error": str(error), "has_error": True}
 
 @app.get("/get_employee_salary_entries_company")
-async def get_employee_salary_entries_company(employee_id: int, company: str, key: str | None = None, token: str| None = None):
+async def get_employee_salary_entries_company(employee_id: int, company: str, key: str | None = None, token: str| None = None, etag: str = Depends(salary_entries_etag), salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(report_lane)):
     try:
-        salary_handler = SalaryData()
-        salary_entries = salary_handler.get_all_salary_entries_of_an_employee_company(employee_id, company)
+        salary_entries = await lane.run(salary_handler.get_all_salary_entries_of_an_employee_company_as_df, employee_id, company)
         if salary_entries is None:
             return {"error": "No salary entries found", "has_error": True}
-        return {"salary_entries": salary_entries, "key": key, "token": token}
+        return tagged(await lane.run(FrameJSONResponse, {"salary_entries": salary_entries, "key": key, "token": token}), etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
@@ -205,10 +307,9 @@ async def get_employee_salary_entries_company(employee_id: int, company: str, ke
     
 
 @app.delete("/delete_employee_salary_entry")
-async def delete_employee_salary_entry(employee_id: str, salary_entry_id: str, key: str | None = None, token: str| None = None):
+async def delete_employee_salary_entry(employee_id: str, salary_entry_id: str, key: str | None = None, token: str| None = None, salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        salary_handler = SalaryData()
-        salary_handler.delete_salary_entry(employee_id, salary_entry_id)
+        await lane.run(salary_handler.delete_salary_entry, employee_id, salary_entry_id)
         return {"employee_id": employee_id, "salary_entry_id": salary_entry_id, "key": key, "token": token}
     except Exception:
         error = traceback.format_exc()
@@ -217,10 +318,9 @@ async def delete_employee_salary_entry(employee_id: str, salary_entry_id: str, k
     
 
 @app.put("/update_employee_salary_entry")
-async def update_employee_salary_entry(payload: dict, key: str | None = None, token: str| None = None):
+async def update_employee_salary_entry(payload: dict, key: str | None = None, token: str| None = None, salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(point_lane)):
     try:
-        salary_handler = SalaryData()
-        salary_handler.update_salary_entry(payload['data']['salary_entry_id'], payload['data'])
+        await lane.run(salary_handler.update_salary_entry, payload['data']['salary_entry_id'], payload['data'])
         return {"employee_id": payload['data']['employee_id'], "key": key, "token": token}
     except Exception:
         error = traceback.format_exc()
@@ -229,11 +329,22 @@ async def update_employee_salary_entry(payload: dict, key: str | None = None, to
 
 
 @app.get("/company_payment_summary")
-async def company_payment_summary(company: str, key: str | None = None, token: str| None = None):
+async def company_payment_summary(company: str, key: str | None = None, token: str| None = None, etag: str = Depends(payment_summary_etag), summary_handler: SummaryInsights = Depends(get_summary_insights), lane: ExecutionLane = Depends(report_lane)):
     try:
-        summary_handler = SummaryInsights()
-        summary = summary_handler.get_payment_summary(company)
-        return {"summary": summary, "key": key, "token": token}
+        summary = await lane.run(summary_handler.get_payment_summary, company)
+        return tagged({"summary": summary, "key": key, "token": token}, etag)
+    except Exception:
+        error = traceback.format_exc()
+        logger.error(error)
+        return {"error": str(error), "has_error": True}
+
+
+
+@app.get("/company_work_summary")
+async def company_work_summary(company: str, key: str | None = None, token: str| None = None, etag: str = Depends(salary_entries_with_works_etag), salary_handler: SalaryData = Depends(get_salary_data), lane: ExecutionLane = Depends(report_lane)):
+    try:
+        works = await lane.run(salary_handler.get_work_totals, company)
+        return tagged({"works": works, "key": key, "token": token}, etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
@@ -242,22 +353,51 @@ async def company_payment_summary(company: str, key: str | None = None, token: s
 
 
 @app.get("/get_all_works")
-async def get_all_works(key: str | None = None, token: str| None = None):
+async def get_all_works(limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE), after: int | None = None, fields: str | None = None, key: str | None = None, token: str| None = None, etag: str = Depends(works_etag), works_handler: Works = Depends(get_works), lane: ExecutionLane = Depends(point_lane)):
     try:
-        works_handler = Works()
-        works = works_handler.get_all_works_brief()
-        return {"works": works, "key": key, "token": token}
+        if is_paged(limit, after, fields):
+            works, next_after = await lane.run(works_handler.get_works_page_as_df, limit or DEFAULT_PAGE_SIZE, after, fields)
+            return tagged(await lane.run(FrameJSONResponse, {"works": works, "next_after": next_after, "key": key, "token": token}), etag)
+        works = await lane.run(works_handler.get_all_works_brief_as_df)
+        return tagged(await lane.run(FrameJSONResponse, {"works": works, "key": key, "token": token}), etag)
     except Exception:
         error = traceback.format_exc()
         logger.error(error)
         return {"error": str(error), "has_error": True}
     
 
+@app.get("/catalog_cache_stats")
+async def get_catalog_cache_stats(key: str | None = None, token: str| None = None):
+    return {"catalogs": catalog_stats(), "key": key, "token": token}
+
+
+@app.get("/result_cache_stats")
+async def get_result_cache_stats(key: str | None = None, token: str| None = None):
+    return {"result_cache": get_pool(DB_NAME).result_cache.stats(), "key": key, "token": token}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/profiles/{profile_id}", include_in_schema=False)
+async def get_profile(profile_id: str, x_profile: str | None = Header(default=None)):
+    profile = load_profile(profile_id) if authorized(x_profile) else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(profile)
+
+
+@app.get("/query_stats")
+async def get_query_stats(key: str | None = None, token: str| None = None):
+    return {"queries": query_stats(), "slow_queries": list(get_pool(DB_NAME).slow_queries), "key": key, "token": token}
+
+
 @app.post("/create_work")
-async def create_work(payload: dict, key: str | None = None, token: str| None = None):
+async def create_work(payload: dict, key: str | None = None, token: str| None = None, works_handler: Works = Depends(get_works), lane: ExecutionLane = Depends(point_lane)):
     try:
-        works_handler = Works()
-        works_handler.add_work(payload['data'])
+        await lane.run(works_handler.add_work, payload['data'])
         return {"msg": "work created", "has_error": False}
     except Exception:
         error = traceback.format_exc()
@@ -265,10 +405,9 @@ async def create_work(payload: dict, key: str | None = None, token: str| None =
         return {"error": str(error), "has_error": True}
 
 @app.delete("/delete_work")
-async def delete_work(work_id: int, key: str | None = None, token: str| None = None):
+async def delete_work(work_id: int, key: str | None = None, token: str| None = None, works_handler: Works = Depends(get_works), lane: ExecutionLane = Depends(point_lane)):
     try:
-        works_handler = Works()
-        works_handler.delete_work(work_id)
+        await lane.run(works_handler.delete_work, work_id)
         return {"msg": "work deleted", "has_error": False}
     except Exception:
         error = traceback.format_exc()
@@ -0,0 +1,359 @@
+"""
+Load test of the HTTP API.
+
+Seeds a fresh SQLite database with a configurable volume of employees,
+companies, works and salary entries, then drives every route of app.py
+in-process through httpx's ASGITransport. Each route gets `--requests`
+requests from `--concurrency` concurrent clients, one route at a time, so
+the numbers of one route are not skewed by another. Reads run before writes,
+and the delete routes remove rows seeded for them only.
+
+Everything is derived from `--seed`: the data, and the ids and names every
+request uses, so two runs against the same commit send the same requests.
+Results are printed and written as JSON to `--output`. With `--baseline`
+the p95 of every route is compared with an earlier result file.
+
+The first request of a route warms the result and catalog caches like the
+first request after a deploy does, later ones are served from them where the
+app caches, which is what the p50 of cached routes shows.
+
+Usage:
+    python benchmarks/bench_api.py [--employees 10000] [--companies 50] [--salary-entries 5000000]
+        [--works 500] [--concurrency 8] [--requests 200] [--heavy-requests 5] [--routes salary]
+        [--db path/to/seeded.db] [--output bench_api.json] [--baseline earlier.json]
+
+With `--db` the seeded database is kept in that file and reused by later runs
+with the same volumes. Runs never write to it, each one benchmarks a copy.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import data_handler
+from database_interface import DatabaseInterface
+from migrations import migrate
+from workload import BUS_TYPES, PAYMENT_MODES, generate, write
+
+class Workload:
+    """What the requests of every route are built from, all drawn from one seeded generator."""
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.args = args
+        self.counter = 0
+        self.etags = {}
+        # employee of each disposable salary entry, read once the database is seeded
+        self.salary_owners = {}
+        # rows after the regular ones were seeded for the delete routes, each is deleted once
+        self.disposable = {
+            "employee": iter(range(args.employees + 1, args.employees + args.reserve + 1)),
+            "company": iter(range(args.companies + 1, args.companies + args.reserve + 1)),
+            "work": iter(range(args.works + 1, args.works + args.reserve + 1)),
+            "salary_entry": iter(range(args.salary_entries + 1, args.salary_entries + args.reserve + 1)),
+        }
+
+    def unique(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix} bench {self.args.seed}-{self.counter}"
+
+    def employee_id(self) -> int:
+        return self.rng.randrange(1, self.args.employees + 1)
+
+    def company(self) -> str:
+        return f"company {self.rng.randrange(1, self.args.companies + 1)}"
+
+    def salary_entry(self, employee_id: int | None = None) -> dict:
+        lines = self.rng.randrange(1, 4)
+        return {
+            "payment": self.rng.randrange(20_000),
+            "record_date": "2024-08-01",
+            "employee_id": employee_id or self.employee_id(),
+            "type_of_payment": "salary",
+            "mode_of_payment": self.rng.choice(PAYMENT_MODES),
+            "company": self.company(),
+            "work_ids": [self.rng.randrange(1, self.args.works + 1) for _ in range(lines)],
+            "costs": [self.rng.randrange(100, 5000) for _ in range(lines)],
+            "quantities": [self.rng.randrange(1, 10) for _ in range(lines)],
+        }
+
+    def delete_salary_entry(self):
+        entry_id = next(self.disposable["salary_entry"])
+        return "DELETE", f"/delete_employee_salary_entry?employee_id={self.salary_owners[entry_id]}&salary_entry_id={entry_id}", {}
+
+    def salary_entries_csv(self, n: int) -> bytes:
+        rows = ["payment,record_date,employee_id,type_of_payment,mode_of_payment,company,work_ids,costs,quantities"]
+        for _ in range(n):
+            entry = self.salary_entry()
+            rows.append(",".join([
+                str(entry["payment"]), entry["record_date"], str(entry["employee_id"]), entry["type_of_payment"],
+                entry["mode_of_payment"], entry["company"],
+                *(f'"{json.dumps(entry[column])}"' for column in ("work_ids", "costs", "quantities")),
+            ]))
+        return "\n".join(rows).encode("utf-8")
+
+
+# name: (heavy, request builder), a builder returns the arguments of one httpx request
+READ_ROUTES = {
+    "get_all_employees": (False, lambda w: ("GET", "/get_all_employees", {})),
+    "get_all_employees page": (False, lambda w: ("GET", f"/get_all_employees?limit=100&after={w.employee_id()}", {})),
+    "get_employee": (False, lambda w: ("GET", f"/get_employee?employee_id={w.employee_id()}", {})),
+    "get_all_own_companies": (False, lambda w: ("GET", "/get_all_own_companies", {})),
+    "get_all_own_company_names": (False, lambda w: ("GET", "/get_all_own_company_names", {})),
+    "get_all_salary_entries page": (False, lambda w: ("GET", f"/get_all_salary_entries?limit=1000&after={w.rng.randrange(w.args.salary_entries)}", {})),
+    "get_all_salary_entries page arrow": (False, lambda w: ("GET", f"/get_all_salary_entries?limit=1000&after={w.rng.randrange(w.args.salary_entries)}&format=arrow", {})),
+    "get_all_salary_entries stream": (True, lambda w: ("GET", "/get_all_salary_entries?stream=true", {})),
+    "get_all_salary_entries_company": (True, lambda w: ("GET", f"/get_all_salary_entries_company?company={w.company()}", {})),
+    "get_employee_salary_entries": (False, lambda w: ("GET", f"/get_employee_salary_entries?employee_id={w.employee_id()}", {})),
+    "get_employee_salary_entries_company": (False, lambda w: ("GET", f"/get_employee_salary_entries_company?employee_id={w.employee_id()}&company={w.company()}", {})),
+    "company_payment_summary": (False, lambda w: ("GET", f"/company_payment_summary?company={w.company()}", {})),
+    "company_work_summary": (True, lambda w: ("GET", f"/company_work_summary?company={w.company()}", {})),
+    "get_all_works": (False, lambda w: ("GET", "/get_all_works", {})),
+    "get_all_works page": (False, lambda w: ("GET", f"/get_all_works?limit=100&after={w.rng.randrange(w.args.works)}", {})),
+    "get_all_works 304": (False, lambda w: ("GET", "/get_all_works", {"headers": {"If-None-Match": w.etags.get("/get_all_works", "")}})),
+    "catalog_cache_stats": (False, lambda w: ("GET", "/catalog_cache_stats", {})),
+    "result_cache_stats": (False, lambda w: ("GET", "/result_cache_stats", {})),
+    "query_stats": (False, lambda w: ("GET", "/query_stats", {})),
+    "metrics": (False, lambda w: ("GET", "/metrics", {})),
+    "get_all_companies": (False, lambda w: ("GET", "/get_all_companies", {})),
+    "get_company": (False, lambda w: ("GET", "/get_company?company_id=1", {})),
+    "recieve_payment_from_other_company": (False, lambda w: ("GET", "/recieve_payment_from_other_company?company_id=1&payment_amount=100", {})),
+    "get_all_loan_details": (False, lambda w: ("GET", "/get_all_loan_details", {})),
+    "get_loan_detail": (False, lambda w: ("GET", "/get_loan_detail?loan_id=1", {})),
+    "sign_in": (False, lambda w: ("GET", "/sign_in?username=bench&password=bench", {})),
+}
+
+WRITE_ROUTES = {
+    "add_employee": (False, lambda w: ("POST", "/add_employee", {"json": {"data": {"full_name": w.unique("employee"), "phone_no": "9000000000"}}})),
+    "update_employee": (False, lambda w: ("PUT", f"/update_employee?employee_id={w.employee_id()}", {"json": {"data": {"full_name": w.unique("employee")}}})),
+    "delete_employee": (False, lambda w: ("DELETE", f"/delete_employee?employee_id={next(w.disposable['employee'])}", {})),
+    "create_own_company": (False, lambda w: ("POST", "/create_own_company", {"json": {"data": {"company_name": w.unique("company")}}})),
+    "update_own_company": (False, lambda w: ("PUT", f"/update_own_company?company_id={next(w.disposable['company'])}", {"json": {"data": {"company_name": w.unique("company")}}})),
+    "create_employee_salary_entry": (False, lambda w: ("POST", "/create_employee_salary_entry", {"json": {"data": w.salary_entry()}})),
+    "create_employee_salary_entries": (False, lambda w: ("POST", "/create_employee_salary_entries", {"json": {"data": [w.salary_entry() for _ in range(100)]}})),
+    "import_employee_salary_entries": (False, lambda w: ("POST", "/import_employee_salary_entries", {"files": {"file": ("entries.csv", w.salary_entries_csv(100), "text/csv")}})),
+    "update_employee_salary_entry": (False, lambda w: ("PUT", "/update_employee_salary_entry", {"json": {"data": {**w.salary_entry(), "salary_entry_id": w.rng.randrange(1, w.args.salary_entries + 1)}}})),
+    "create_work": (False, lambda w: ("POST", "/create_work", {"json": {"data": {"work_name": w.unique("work"), "bus_type": w.rng.choice(BUS_TYPES), "cost": 1000}}})),
+    "add_company": (False, lambda w: ("POST", "/add_company", {"json": {"name": "bench"}})),
+    "create_bill_to_other_company": (False, lambda w: ("POST", "/create_bill_to_other_company?company_id=1&bill_amount=100", {})),
+    "update_bill_of_other_company": (False, lambda w: ("PUT", "/update_bill_of_other_company?company_id=1&bill_amount=100&bill_id=1", {})),
+    "create_loan_payment": (False, lambda w: ("POST", "/create_loan_payment?loan_id=1&payment_amount=100", {})),
+    "update_loan_payment": (False, lambda w: ("PUT", "/update_loan_payment?loan_id=1&payment_amount=100&payment_id=1", {})),
+    # deletes last, the disposable rows are not referenced by anything above
+    "delete_employee_salary_entry": (False, lambda w: w.delete_salary_entry()),
+    "delete_own_company": (False, lambda w: ("DELETE", f"/delete_own_company?company_id={next(w.disposable['company'])}", {})),
+    "delete_work": (False, lambda w: ("DELETE", f"/delete_work?work_id={next(w.disposable['work'])}", {})),
+    "delete_company": (False, lambda w: ("DELETE", "/delete_company?company_id=1", {})),
+    "delete_bill_of_other_company": (False, lambda w: ("DELETE", "/delete_bill_of_other_company?company_id=1&bill_id=1", {})),
+    "delete_payment_from_other_company": (False, lambda w: ("DELETE", "/delete_payment_from_other_company?company_id=1&payment_id=1", {})),
+    "delete_loan_payment": (False, lambda w: ("DELETE", "/delete_loan_payment?loan_id=1&payment_id=1", {})),
+}
+
+
+async def run_route(client: httpx.AsyncClient, workload: Workload, build, requests: int, concurrency: int) -> dict:
+    """Send `requests` requests built by `build` from `concurrency` clients and summarize them."""
+    # built upfront and in order, so the requests don't depend on how the clients interleave
+    pending = [build(workload) for _ in range(requests)]
+    pending.reverse()
+    latencies, statuses = [], {}
+    errors = 0
+    size = 0
+
+    async def client_loop():
+        nonlocal errors, size
+        while pending:
+            method, url, kwargs = pending.pop()
+            start = time.perf_counter()
+            res = await client.request(method, url, **kwargs)
+            body = res.content
+            latencies.append(time.perf_counter() - start)
+            statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+            size += len(body)
+            # failures are answered with a 200 and an error object
+            if res.status_code >= 500 or b'"has_error":true' in body:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {
+        "requests": requests,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_body_bytes": size // requests,
+    }
+
+
+async def run_routes(args, workload: Workload, routes: dict) -> dict:
+    import app as app_module
+
+    # the app logs at INFO, which makes httpx log every request inside the timed loops
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    app_module.DB_NAME = data_handler.DB_NAME
+    transport = httpx.ASGITransport(app=app_module.app)
+    results = {}
+    # ASGITransport sends no lifespan events, the app's startup and shutdown run here
+    async with app_module.app.router.lifespan_context(app_module.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            workload.etags["/get_all_works"] = (await client.get("/get_all_works")).headers["etag"]
+            for name, (heavy, build) in routes.items():
+                requests = args.heavy_requests if heavy else args.requests
+                results[name] = await run_route(client, workload, build, requests, args.concurrency)
+                result = results[name]
+                print(
+                    f"{name:<40} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                    f"{result['throughput_rps']:>9.1f} {result['errors']:>6}",
+                    flush=True,
+                )
+    return results
+
+
+def seed_problem(db_name: str, args) -> str | None:
+    """Why an existing seeded database does not fit the arguments, None when it does."""
+    db = DatabaseInterface(db_name)
+    ranges = (
+        ("employees", "employee_id", args.employees),
+        ("own_companies", "company_id", args.companies),
+        ("works", "work_id", args.works),
+        ("salaries", "salary_entry_id", args.salary_entries),
+    )
+    for table, key_column, regular in ranges:
+        count = db.execute_select_query(
+            f"SELECT COUNT(*) FROM {table} WHERE {key_column} BETWEEN ? AND ?", (regular + 1, regular + args.reserve),
+        ).item()
+        if count != args.reserve:
+            return (
+                f"{table} has {count} of the {args.reserve} disposable rows {regular + 1}..{regular + args.reserve}, "
+                "seed it with the same volumes and at least as many --requests"
+            )
+    for table, name_column in (("employees", "full_name"), ("own_companies", "company_name"), ("works", "work_name")):
+        used = db.execute_select_query(
+            f"SELECT COUNT(*) FROM {table} WHERE {name_column} LIKE ?", (f"% bench {args.seed}-%",),
+        ).item()
+        if used:
+            return f"{table} already has names the requests of --seed {args.seed} create"
+    return None
+
+
+def copy_database(source: str, target: str):
+    """Copy a database through SQLite's backup API, which includes what is still in the WAL."""
+    # the seeding and checking connections are not needed past this point
+    DatabaseInterface(source).pool.close()
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path) as file:
+        baseline = json.load(file)["routes"]
+    print(f"\n{'route':<40} {'p95 base':>9} {'p95 now':>9} {'change':>8}")
+    for name, result in results.items():
+        if name in baseline:
+            before = baseline[name]["p95_ms"]
+            change = (result["p95_ms"] - before) / before * 100 if before else 0.0
+            print(f"{name:<40} {before:>9.2f} {result['p95_ms']:>9.2f} {change:>7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=10_000)
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--salary-entries", type=int, default=5_000_000)
+    parser.add_argument("--works", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--heavy-requests", type=int, default=5, help="requests per route returning a whole table or company")
+    parser.add_argument("--routes", help="only run the routes whose name contains this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="seeded database to copy for the run, seeded first when it does not exist yet")
+    parser.add_argument("--output", default="bench_api.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare with")
+    args = parser.parse_args()
+    # update_own_company and delete_own_company both use up disposable companies
+    args.reserve = 2 * max(args.requests, args.heavy_requests)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_name = args.db or os.path.join(tmp, "seed.db")
+        seed_seconds = None
+        if not os.path.exists(seed_name):
+            migrate(seed_name)
+            start = time.perf_counter()
+            # the last `reserve` salary entries are the disposable ones, like the extra employees, companies and works
+            write(seed_name, generate(
+                seed=args.seed, employees=args.employees, companies=args.companies, works=args.works,
+                salary_entries=args.salary_entries + args.reserve, reserve=args.reserve,
+            ))
+            seed_seconds = round(time.perf_counter() - start, 2)
+            print(f"seeded {args.salary_entries} salary entries in {seed_seconds} s")
+        else:
+            migrate(seed_name)
+            problem = seed_problem(seed_name, args)
+            if problem:
+                sys.exit(f"{seed_name} cannot be used with these arguments: {problem}")
+
+        # every run writes to its own copy, so the seeded file stays as generated and runs stay comparable
+        db_name = os.path.join(tmp, "bench.db")
+        copy_database(seed_name, db_name)
+        data_handler.DB_NAME = db_name
+
+        workload = Workload(args)
+        first = args.salary_entries + 1
+        owners = DatabaseInterface(db_name).execute_select_query(
+            "SELECT salary_entry_id, employee_id FROM salaries WHERE salary_entry_id BETWEEN ? AND ?", (first, first + args.reserve - 1),
+        )
+        workload.salary_owners = dict(owners.iter_rows())
+
+        routes = {**READ_ROUTES, **WRITE_ROUTES}
+        if args.routes:
+            routes = {name: route for name, route in routes.items() if args.routes in name}
+        print(f"{'route':<40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>6}")
+        results = asyncio.run(run_routes(args, workload, routes))
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "seed_seconds": seed_seconds,
+        "routes": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nwrote {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
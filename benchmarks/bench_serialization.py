@@ -0,0 +1,93 @@
+"""
+Cost of turning a salary listing into a JSON response body.
+
+dicts:  `df.to_dicts()`, then FastAPI's `jsonable_encoder` and `JSONResponse`,
+        which is what the routes did before FrameJSONResponse.
+frame:  `FrameJSONResponse`, Polars writes the rows straight from the frame.
+
+Peak memory is measured with tracemalloc and only counts Python allocations,
+buffers Polars allocates natively are not included.
+
+Usage:
+    python benchmarks/bench_serialization.py [--rows 10000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import polars as pl
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from responses import FrameJSONResponse
+
+
+def salary_frame(n: int) -> pl.DataFrame:
+    """A frame shaped like `SalaryData.get_all_salary_entries_as_df()`."""
+    rng = np.random.default_rng(0)
+    lines = rng.integers(0, 4, n)
+    offsets = np.concatenate([[0], np.cumsum(lines)])
+    work_ids = rng.integers(1, 50, offsets[-1])
+    costs = rng.integers(100, 5000, offsets[-1])
+    quantities = rng.integers(1, 10, offsets[-1])
+
+    def split(values):
+        return pl.Series([values[offsets[i]:offsets[i + 1]].tolist() for i in range(n)], dtype=pl.List(pl.Int64))
+
+    return pl.DataFrame({
+        "salary_entry_id": np.arange(1, n + 1),
+        "payment": rng.integers(0, 20000, n),
+        "record_date": pl.Series(rng.integers(0, 365, n)).cast(pl.Date).dt.offset_by("19723d").cast(pl.Utf8),
+        "employee_id": rng.integers(1, 200, n),
+        "type_of_work": None,
+        "type_of_payment": pl.Series(rng.choice(["salary", "advance"], n)),
+        "mode_of_payment": pl.Series(rng.choice(["cash", "upi", "bank"], n)),
+        "company": pl.Series(rng.choice(["saisri", "srinivasa", "lakshmi"], n)),
+        "work_done": rng.integers(0, 50000, n),
+        "created_at": "2024-07-01 10:00:00",
+        "work_ids": split(work_ids),
+        "costs": split(costs),
+        "quantities": split(quantities),
+    })
+
+
+def dicts_path(df):
+    return JSONResponse(jsonable_encoder({"salary_entries": df.to_dicts(), "key": None, "token": None})).body
+
+
+def frame_path(df):
+    return FrameJSONResponse({"salary_entries": df, "key": None, "token": None}).body
+
+
+def measure(fn, df):
+    start = time.perf_counter()
+    body = fn(df)
+    elapsed = time.perf_counter() - start
+    # tracing slows Python allocations down a lot, so memory gets its own run
+    tracemalloc.start()
+    fn(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'path':<6} {'seconds':>9} {'peak MiB':>9} {'body MiB':>9}")
+    for n in args.rows:
+        df = salary_frame(n)
+        for label, fn in (("dicts", dicts_path), ("frame", frame_path)):
+            elapsed, peak, size = measure(fn, df)
+            print(f"{n:>9} {label:<6} {elapsed:>9.3f} {peak / 2**20:>9.1f} {size / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-statement cost of inlined-literal SQL against parameterized SQL.
+
+Inlined literals produce a new SQL text for every call, so SQLite has to parse
+and plan each statement from scratch. Parameterized SQL keeps a single text,
+and the pooled connection's statement cache hands back the already prepared
+statement.
+
+Usage:
+    python benchmarks/bench_statements.py [--rows 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_interface import DatabaseInterface
+
+
+def timed(label, fn, n):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / n * 1e6:8.2f} us/statement")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+    n = args.rows
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseInterface(os.path.join(tmp, "bench.db"))
+        db.execute_with_auto_commit("CREATE TABLE employees (employee_id INTEGER PRIMARY KEY, full_name TEXT, phone_no TEXT)")
+        conn = db.pool.writer()
+
+        def insert_inlined():
+            for i in range(n):
+                conn.execute(f"INSERT INTO employees (full_name, phone_no) VALUES ('name {i}', '{i}')")
+            conn.commit()
+
+        def insert_parameterized():
+            for i in range(n):
+                conn.execute("INSERT INTO employees (full_name, phone_no) VALUES (?, ?)", (f"name {i}", str(i)))
+            conn.commit()
+
+        reader = db.pool.reader()
+
+        def select_inlined():
+            for i in range(n):
+                reader.execute(f"SELECT * FROM employees WHERE employee_id = {i}").fetchall()
+
+        def select_parameterized():
+            for i in range(n):
+                reader.execute("SELECT * FROM employees WHERE employee_id = ?", (i,)).fetchall()
+
+        timed("INSERT inlined literals", insert_inlined, n)
+        timed("INSERT parameterized + statement cache", insert_parameterized, n)
+        timed("SELECT inlined literals", select_inlined, n)
+        timed("SELECT parameterized + statement cache", select_parameterized, n)
+        db.pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import pytest
+import data_handler
+from data_handler import EmployeeData, OwnCompanyData
+from migrations import migrate
+
+
+@pytest.fixture
+def db_name(tmpdir, monkeypatch):
+    db_name = str(tmpdir.join("test.db"))
+    monkeypatch.setattr(data_handler, "DB_NAME", db_name)
+    migrate(db_name)
+    yield db_name
+    data_handler.DatabaseInterface(db_name).pool.close()
+
+
+@pytest.fixture
+def company(db_name):
+    OwnCompanyData().add_own_company({"company_name": "saisri", "bank_name": ["SBI"]})
+    return "saisri"
+
+
+@pytest.fixture
+def employee_id(db_name):
+    EmployeeData().add_employee({"full_name": "Ravi", "phone_no": "99999"})
+    return EmployeeData().get_all_employees()[0]["employee_id"]
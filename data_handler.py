@@ -1,15 +1,108 @@
+import io
 import json
+import os
+import sqlite3
+import threading
+from itertools import zip_longest
 
-import numpy as np
-from util_classes.PolarsFileSystem import PolarsFileSystem
-from utils import generate_random_id
-from pytz import timezone
 from datetime import datetime
 import polars as pl
-from database_interface import DatabaseInterface
+from database_interface import STREAM_BATCH_ROWS, DatabaseInterface, transactional
 
 DB_NAME = "database_data.db"
 
+# columns a salary entry carries in, in INSERT order
+SALARY_ENTRY_COLUMNS = ["payment", "record_date", "employee_id", "type_of_payment", "mode_of_payment", "company", "work_ids", "costs", "quantities"]
+# list columns folded from salary_lines (and works) onto every salary entry
+SALARY_LINE_FIELDS = ["work_ids", "costs", "quantities", "work_name", "bus_type"]
+
+# page sizes for the keyset-paginated listings
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def read_salary_entries_file(content: bytes, filename: str) -> pl.DataFrame:
+    """
+    Load an uploaded CSV or Parquet file of salary entries. In CSV files the
+    work_ids/costs/quantities columns hold JSON arrays such as `[1, 2]`.
+    """
+    if filename.lower().endswith(".parquet"):
+        return pl.read_parquet(io.BytesIO(content))
+    if filename.lower().endswith(".csv"):
+        return pl.read_csv(io.BytesIO(content), infer_schema_length=None)
+    raise ValueError(f"Unsupported file type {filename}, expected .csv or .parquet")
+
+
+def now_ist() -> datetime:
+    # pytz is only loaded by the writes that stamp created_at
+    from pytz import timezone
+    return datetime.now(timezone("Asia/Kolkata"))
+
+
+def work_done(costs, quantities) -> int:
+    """The dot product of an entry's costs and quantities, loading NumPy on the first write that needs it."""
+    import numpy as np
+    return np.dot(costs, quantities).item()
+
+
+def is_unique_violation(error: sqlite3.IntegrityError, column: str) -> bool:
+    """Whether an IntegrityError was raised by the unique index on `column`, given as table.column."""
+    return str(error) == f"UNIQUE constraint failed: {column}"
+
+
+def parse_fields(fields: str | None, allowed: list, key_column: str):
+    """
+    Turn a comma separated `fields=` value into the list of columns to select.
+    The key column is always included because the next page cursor is read from it.
+    Returns None when no projection was asked for.
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}, expected any of {', '.join(allowed)}")
+    return [key_column] + [field for field in dict.fromkeys(requested) if field != key_column]
+
+
+def next_page_cursor(df: pl.DataFrame, key_column: str, limit: int):
+    """The `after` value for the following page, None once the last page was read."""
+    if len(df) < limit:
+        return None
+    return df[key_column][-1]
+
+
+def concat_batches(first: pl.DataFrame, second: pl.DataFrame) -> pl.DataFrame:
+    """
+    Stack two batches of the same query. A column that is all NULL in one batch
+    and has no declared type was typed as Utf8 by `frame_from_cursor`, it takes
+    the other batch's type.
+    """
+    for name in first.columns:
+        if first[name].null_count() == len(first):
+            first = first.with_columns(pl.col(name).cast(second.schema[name]))
+        elif second[name].null_count() == len(second):
+            second = second.with_columns(pl.col(name).cast(first.schema[name]))
+    return pl.concat([first, second])
+
+
+def read_page(db: DatabaseInterface, table_name: str, key_column: str, limit: int, after: int | None = None, fields: str | None = None):
+    """
+    Read one page of a table in primary-key order, starting after the `after` key.
+    Seeking on the primary key keeps every page a b-tree range read however deep
+    the client pages, unlike OFFSET.
+
+    Returns:
+    --------
+    tuple[polars.DataFrame, int | None]:
+        The page and the cursor for the next one.
+    """
+    columns = parse_fields(fields, db.get_table_columns(table_name), key_column) if fields else None
+    where, params = (f"WHERE {key_column} > ?", (after,)) if after is not None else ("", ())
+    query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name} {where} ORDER BY {key_column} LIMIT ?"
+    res = db.execute_select_query(query, params + (limit,))
+    return res, next_page_cursor(res, key_column, limit)
+
+
 class EmployeeData:
 
     def __init__(self) -> None:
@@ -18,92 +111,92 @@ class EmployeeData:
         """
         self.table_name = "employees"
         self.db = DatabaseInterface(DB_NAME)
-        self.check_table_exists()
-    
-    def check_table_exists(self):
-        query = f"""
-                CREATE TABLE IF NOT EXISTS {self.table_name} (
-                employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                full_name TEXT,
-                created_at TEXT,
-                phone_no TEXT,
-                address TEXT,
-                designation TEXT,
-                description TEXT
-                );
-        """
-        indexquery = f"""
-        CREATE INDEX IF NOT EXISTS idx_employee_id ON {self.table_name}(employee_id);
-        """
-        self.db.execute_with_auto_commit(query)
-        self.db.execute_with_auto_commit(indexquery)
-
-        
-    
-    def add_employee(self, employee: dict):
-
-        get_employee_full_name_query = f"SELECT full_name FROM {self.table_name} WHERE full_name = '{employee.get('full_name')}'"
-        res = self.db.execute_select_query(get_employee_full_name_query)
-        if not res.is_empty():
-            raise ValueError(f"Employee with name {employee.get('full_name')} already exists")
 
+    def add_employee(self, employee: dict):
+        # duplicate names are rejected by the unique index on full_name
         add_employee_query = f"""
         INSERT INTO {self.table_name} (full_name, created_at, phone_no, address, designation, description)
-        VALUES (
-            '{employee.get('full_name')}',
-            '{datetime.now(timezone("Asia/Kolkata")).strftime('%Y-%m-%d %H:%M:00')}',
-            '{employee.get('phone_no')}',
-            '{employee.get('address')}',
-            '{employee.get('designation')}',
-            '{employee.get('description')}'
-        );
+        VALUES (?, ?, ?, ?, ?, ?);
         """
-        self.db.execute_with_auto_commit(add_employee_query)
-
-    
+        try:
+            self.db.execute_with_auto_commit(add_employee_query, (
+                employee.get('full_name'),
+                now_ist().strftime('%Y-%m-%d %H:%M:00'),
+                employee.get('phone_no'),
+                employee.get('address'),
+                employee.get('designation'),
+                employee.get('description'),
+            ))
+        except sqlite3.IntegrityError as error:
+            if is_unique_violation(error, "employees.full_name"):
+                raise ValueError(f"Employee with name {employee.get('full_name')} already exists") from error
+            raise
 
-    
     def get_employee(self, id: int):
-        query = f"SELECT * FROM {self.table_name} WHERE employee_id = {id}"
-        res = self.db.execute_select_query(query)
+        query = f"SELECT * FROM {self.table_name} WHERE employee_id = ?"
+        res = self.db.execute_select_query(query, (id,))
         if len(res) == 0:
             return None
         return res.to_dicts()[0]
-    
+
     def get_all_employees(self):
-        
+        return self.get_all_employees_as_df().to_dicts()
+
+    def get_all_employees_as_df(self):
         query = f"SELECT * FROM {self.table_name}"
-        res = self.db.execute_select_query(query)
-        return res.to_dicts()
-    
+        return self.db.execute_select_query(query)
+
+    def stream_all_employees(self):
+        yield from self.db.stream_select_query(f"SELECT * FROM {self.table_name}")
+
+    def get_employees_page(self, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None, fields: str | None = None):
+        res, next_after = self.get_employees_page_as_df(limit, after, fields)
+        return res.to_dicts(), next_after
+
+    def get_employees_page_as_df(self, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None, fields: str | None = None):
+        return read_page(self.db, self.table_name, "employee_id", limit, after, fields)
+
     def delete_employee(self, employee_id: int):
-        query = f"DELETE FROM {self.table_name} WHERE employee_id = {employee_id}"
-        self.db.execute_with_auto_commit(query)
+        query = f"DELETE FROM {self.table_name} WHERE employee_id = ?"
+        self.db.execute_with_auto_commit(query, (employee_id,))
 
     def update_employee(self, employee_id: int, employee: dict):
 
-        get_all_names_query = f"SELECT full_name FROM {self.table_name} WHERE full_name = '{employee.get('full_name')}' and employee_id != {employee_id}"
-        res = self.db.execute_select_query(get_all_names_query)
-        if not res.is_empty():
-            raise ValueError(f"Employee with name {employee.get('full_name')} already exists")
-
         query = f"""
         UPDATE {self.table_name}
-        SET 
-        full_name = '{employee.get('full_name')}',
-        phone_no = '{employee.get('phone_no')}',
-        address = '{employee.get('address')}',
-        designation = '{employee.get('designation')}',
-        description = '{employee.get('description')}'
-        WHERE employee_id = {employee_id}
-        """
-        self.db.execute_with_auto_commit(query)
-    
+        SET
+        full_name = ?,
+        phone_no = ?,
+        address = ?,
+        designation = ?,
+        description = ?
+        WHERE employee_id = ?
+        """
+        try:
+            self.db.execute_with_auto_commit(query, (
+                employee.get('full_name'),
+                employee.get('phone_no'),
+                employee.get('address'),
+                employee.get('designation'),
+                employee.get('description'),
+                employee_id,
+            ))
+        except sqlite3.IntegrityError as error:
+            if is_unique_violation(error, "employees.full_name"):
+                raise ValueError(f"Employee with name {employee.get('full_name')} already exists") from error
+            raise
+
     def check_employee_exists(self, employee_id: int, company):
-        query = f"SELECT * FROM {self.table_name} WHERE employee_id = {employee_id}"
-        res = self.db.execute_select_query(query)
+        query = f"SELECT * FROM {self.table_name} WHERE employee_id = ?"
+        res = self.db.execute_select_query(query, (employee_id,))
         return not res.is_empty()
 
+    def get_existing_employee_ids(self, employee_ids: list):
+        # one set-based lookup for the whole batch, ids are passed as a single JSON array
+        query = f"SELECT employee_id FROM {self.table_name} WHERE employee_id IN (SELECT value FROM json_each(?))"
+        res = self.db.execute_select_query(query, (json.dumps(employee_ids),))
+        return set(res['employee_id'].to_list())
+
 
 class OwnCompanyData:
 
@@ -113,42 +206,9 @@ class OwnCompanyData:
         """
         self.table_name = "own_companies"
         self.db = DatabaseInterface(DB_NAME)
-        self.check_table_exists()
 
-    def check_table_exists(self):
-        query = f"""
-                CREATE TABLE IF NOT EXISTS {self.table_name} (
-                company_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                company_name TEXT,
-                created_at TEXT,
-                phone_no TEXT,
-                address TEXT,
-                alternate_phone_no TEXT,
-                mail_id TEXT,
-                type_of_company TEXT,
-                gst_no TEXT,
-                pan_no TEXT,
-                bank_name TEXT,
-                bank_branch TEXT,
-                bank_ifsc_code TEXT,
-                account_no TEXT,
-                account_owner_name TEXT,
-                date_of_establishment TEXT,
-                description TEXT                
-                );
-        """
-        indexquery = f"""
-        CREATE INDEX IF NOT EXISTS idx_company_name ON {self.table_name}(company_name);
-        """
-        self.db.execute_with_auto_commit(query)
-        self.db.execute_with_auto_commit(indexquery)
-    
+
     def add_own_company(self, company: dict):
-            
-        get_company_name_query = f"SELECT company_name FROM {self.table_name} WHERE company_name = '{company.get('company_name')}'"
-        res = self.db.execute_select_query(get_company_name_query)
-        if not res.is_empty():
-            raise ValueError(f"Company with name {company.get('company_name')} already exists")
 
         bank_name = company.get("bank_name")
         bank_branch = company.get("bank_branch")
@@ -161,39 +221,62 @@ class OwnCompanyData:
         bank_ifsc_code = json.dumps(bank_ifsc_code)
         account_no = json.dumps(account_no)
         account_owner_name = json.dumps(account_owner_name)
-        
+
         add_company_query = f"""
         INSERT INTO {self.table_name} (company_name, created_at, phone_no, address, alternate_phone_no, mail_id, type_of_company, gst_no, pan_no, bank_name, bank_branch, bank_ifsc_code, account_no, account_owner_name, date_of_establishment, description)
-        VALUES (
-            '{company.get('company_name')}',
-            '{datetime.now(timezone("Asia/Kolkata")).strftime('%Y-%m-%d %H:%M:00')}',
-            '{company.get('phone_no')}',
-            '{company.get('address')}',
-            '{company.get('alternate_phone_no')}',
-            '{company.get('mail_id')}',
-            '{company.get('type_of_company')}',
-            '{company.get('gst_no')}',
-            '{company.get('pan_no')}',
-            '{bank_name}',
-            '{bank_branch}',
-            '{bank_ifsc_code}',
-            '{account_no}',
-            '{account_owner_name}',
-            '{company.get('date_of_establishment')}',
-            '{company.get('description')}'
-        );
-        """
-        self.db.execute_with_auto_commit(add_company_query)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """
+        try:
+            self.db.execute_with_auto_commit(add_company_query, (
+                company.get('company_name'),
+                now_ist().strftime('%Y-%m-%d %H:%M:00'),
+                company.get('phone_no'),
+                company.get('address'),
+                company.get('alternate_phone_no'),
+                company.get('mail_id'),
+                company.get('type_of_company'),
+                company.get('gst_no'),
+                company.get('pan_no'),
+                bank_name,
+                bank_branch,
+                bank_ifsc_code,
+                account_no,
+                account_owner_name,
+                company.get('date_of_establishment'),
+                company.get('description'),
+            ))
+        except sqlite3.IntegrityError as error:
+            if is_unique_violation(error, "own_companies.company_name"):
+                raise ValueError(f"Company with name {company.get('company_name')} already exists") from error
+            raise
 
     def get_all_own_companies(self):
+        return self.get_all_own_companies_as_df().to_dicts()
+
+    def get_all_own_companies_as_df(self):
         query = f"SELECT * FROM {self.table_name}"
         res = self.db.execute_select_query(query)
-        res = res.with_columns(bank_name=pl.col("bank_name").str.json_decode(pl.List(pl.Utf8)))
-        res = res.with_columns(bank_branch=pl.col("bank_branch").str.json_decode(pl.List(pl.Utf8)))
-        res = res.with_columns(bank_ifsc_code=pl.col("bank_ifsc_code").str.json_decode(pl.List(pl.Utf8)))
-        res = res.with_columns(account_no=pl.col("account_no").str.json_decode(pl.List(pl.Utf8)))
-        res = res.with_columns(account_owner_name=pl.col("account_owner_name").str.json_decode(pl.List(pl.Utf8)))
-        return res.to_dicts()
+        return self.decode_bank_columns(res)
+
+    def stream_all_own_companies(self):
+        for res in self.db.stream_select_query(f"SELECT * FROM {self.table_name}"):
+            yield self.decode_bank_columns(res)
+
+    def get_own_companies_page(self, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None, fields: str | None = None):
+        res, next_after = self.get_own_companies_page_as_df(limit, after, fields)
+        return res.to_dicts(), next_after
+
+    def get_own_companies_page_as_df(self, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None, fields: str | None = None):
+        res, next_after = read_page(self.db, self.table_name, "company_id", limit, after, fields)
+        return self.decode_bank_columns(res), next_after
+
+    @staticmethod
+    def decode_bank_columns(res: pl.DataFrame) -> pl.DataFrame:
+        # bank details are stored as JSON arrays, a projection may leave some of them out
+        bank_columns = ["bank_name", "bank_branch", "bank_ifsc_code", "account_no", "account_owner_name"]
+        return res.with_columns([
+            pl.col(column).str.json_decode(pl.List(pl.Utf8)) for column in bank_columns if column in res.columns
+        ])
 
     def get_all_own_company_names(self):
         query = f"SELECT company_name FROM {self.table_name}"
@@ -202,320 +285,644 @@ class OwnCompanyData:
         return res
 
     def update_own_company(self, id, company: dict):
-        query_check_company_exists = f"SELECT * FROM {self.table_name} WHERE company_id = {id}"
-        res = self.db.execute_select_query(query_check_company_exists)
-        if res.is_empty():
-            raise ValueError(f"Company does not exist")
-        
         update_company_query = f"""
-        UPDATE {self.table_name} 
-        SET 
-        company_name = '{company.get('company_name')}',
-        phone_no = '{company.get('phone_no')}',
-        address = '{company.get('address')}',
-        alternate_phone_no = '{company.get('alternate_phone_no')}',
-        mail_id = '{company.get('mail_id')}',
-        type_of_company = '{company.get('type_of_company')}',
-        gst_no = '{company.get('gst_no')}',
-        pan_no = '{company.get('pan_no')}',
-        bank_name = '{json.dumps(company.get('bank_name'))}',
-        bank_branch = '{json.dumps(company.get('bank_branch'))}',
-        bank_ifsc_code = '{json.dumps(company.get('bank_ifsc_code'))}',
-        account_no = '{json.dumps(company.get('account_no'))}',
-        account_owner_name = '{json.dumps(company.get('account_owner_name'))}',
-        date_of_establishment = '{company.get('date_of_establishment')}',
-        description = '{company.get('description')}'
-        WHERE company_id = {id}
-        """
-        self.db.execute_with_auto_commit(update_company_query)
+        UPDATE {self.table_name}
+        SET
+        company_name = ?,
+        phone_no = ?,
+        address = ?,
+        alternate_phone_no = ?,
+        mail_id = ?,
+        type_of_company = ?,
+        gst_no = ?,
+        pan_no = ?,
+        bank_name = ?,
+        bank_branch = ?,
+        bank_ifsc_code = ?,
+        account_no = ?,
+        account_owner_name = ?,
+        date_of_establishment = ?,
+        description = ?
+        WHERE company_id = ?
+        """
+        try:
+            updated = self.db.execute_with_auto_commit(update_company_query, (
+                company.get('company_name'),
+                company.get('phone_no'),
+                company.get('address'),
+                company.get('alternate_phone_no'),
+                company.get('mail_id'),
+                company.get('type_of_company'),
+                company.get('gst_no'),
+                company.get('pan_no'),
+                json.dumps(company.get('bank_name')),
+                json.dumps(company.get('bank_branch')),
+                json.dumps(company.get('bank_ifsc_code')),
+                json.dumps(company.get('account_no')),
+                json.dumps(company.get('account_owner_name')),
+                company.get('date_of_establishment'),
+                company.get('description'),
+                id,
+            ))
+        except sqlite3.IntegrityError as error:
+            if is_unique_violation(error, "own_companies.company_name"):
+                raise ValueError(f"Company with name {company.get('company_name')} already exists") from error
+            raise
+        if updated == 0:
+            raise ValueError(f"Company does not exist")
 
     def delete_own_company(self, id):
-        check_company_exists_query = f"SELECT * FROM {self.table_name} WHERE company_id = {id}"
-        res = self.db.execute_select_query(check_company_exists_query)
-        if res.is_empty():
+        query = f"DELETE FROM {self.table_name} WHERE company_id = ?"
+        if self.db.execute_with_auto_commit(query, (id,)) == 0:
             raise ValueError(f"Company does not exist")
 
-        query = f"DELETE FROM {self.table_name} WHERE company_id = {id}"
-        self.db.execute_with_auto_commit(query)
-    
     def check_own_company_exists(self, company_name):
-        query = f"SELECT * FROM {self.table_name} WHERE company_name = '{company_name}'"
-        res = self.db.execute_select_query(query)
+        query = f"SELECT * FROM {self.table_name} WHERE company_name = ?"
+        res = self.db.execute_select_query(query, (company_name,))
         return not res.is_empty()
 
+    def get_existing_company_names(self, company_names: list):
+        query = f"SELECT company_name FROM {self.table_name} WHERE company_name IN (SELECT value FROM json_each(?))"
+        res = self.db.execute_select_query(query, (json.dumps(company_names),))
+        return set(res['company_name'].to_list())
+
 
 
 
 class SalaryData:
 
+    # work lines are passed as one JSON array of [work_id, cost, quantity] triples,
+    # a NULL salary_entry_id attaches them to the entry inserted just before
+    salary_lines_query = """
+    INSERT INTO salary_lines (salary_entry_id, line_no, work_id, cost, quantity)
+    SELECT COALESCE(?, last_insert_rowid()), key, json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]')
+    FROM json_each(?);
+    """
+
     def __init__(self) -> None:
         """
-        
+
         """
         self.table_name = "salaries"
         self.db = DatabaseInterface(DB_NAME)
-        self.check_table_exists()
-    
-    def check_table_exists(self):
-        query = f"""
-                CREATE TABLE IF NOT EXISTS {self.table_name} (
-                salary_entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                payment INTEGER,
-                record_date TEXT,
-                employee_id INTEGER,
-                type_of_payment TEXT,
-                mode_of_payment TEXT,
-                company TEXT,
-                work_ids TEXT,
-                costs TEXT,
-                quantities TEXT,
-                work_done INTEGER,
-                created_at TEXT
-                );
-        """
-        indexquery = f"""
-        CREATE INDEX IF NOT EXISTS idx_salary_entry_id ON {self.table_name}(salary_entry_id);
-        """
-        self.db.execute_with_auto_commit(query)
-        self.db.execute_with_auto_commit(indexquery)
+        self.own_company_data = OwnCompanyData()
+        self.employee_data = EmployeeData()
+        self.works = Works()
 
-    def add_salary_entry(self, entry: dict):
 
+    @transactional
+    def add_salary_entry(self, entry: dict):
+        """
+        Validate and insert one salary entry with its work lines. The company
+        and employee checks run in the same transaction as the insert.
+        """
         company = entry.get("company")
-        own_company_data = OwnCompanyData()
-        if not own_company_data.check_own_company_exists(company):
+        if not self.own_company_data.check_own_company_exists(company):
             raise ValueError(f"Company with name {company} does not exist")
-        employee_data = EmployeeData()
         employee_id = entry.get("employee_id")
-        if not employee_data.check_employee_exists(employee_id, company):
+        if not self.employee_data.check_employee_exists(employee_id, company):
             raise ValueError(f"Employee with id {employee_id} does not exist")
-        
+
         work_ids = entry.get("work_ids")
         costs = entry.get("costs")
         quantities = entry.get("quantities")
 
-        dot_product = np.dot(costs, quantities)
+        dot_product = work_done(costs, quantities)
         if entry.get('type_of_payment') == "advance":
             if dot_product > 0:
                 raise ValueError(f"Advance payment not allowed in same entry with work done")
 
-        work_ids = json.dumps(work_ids)
-        costs = json.dumps(costs)
-        quantities = json.dumps(quantities)
-
         salary_entry_query = f"""
-        INSERT INTO {self.table_name} (payment, record_date, employee_id, type_of_payment, mode_of_payment, company, works, costs, quantities, work_done, created_at)
-        VALUES (
-            {entry.get('payment')},
-            '{entry.get('record_date')}',
-            {employee_id},
-            '{entry.get('type_of_payment')}',
-            '{entry.get('mode_of_payment')}',
-            '{company}',
-            '{work_ids}',
-            '{costs}',
-            '{quantities}',
-            {dot_product},
-            '{datetime.now(timezone("Asia/Kolkata")).strftime('%Y-%m-%d %H:%M:00')}'
-        );
-        """
-        self.db.execute_with_auto_commit(salary_entry_query)
-        
-    
+        INSERT INTO {self.table_name} (payment, record_date, employee_id, type_of_payment, mode_of_payment, company, work_done, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+        """
+        self.db.execute_statements_with_auto_commit([
+            (salary_entry_query, (
+                entry.get('payment'),
+                entry.get('record_date'),
+                employee_id,
+                entry.get('type_of_payment'),
+                entry.get('mode_of_payment'),
+                company,
+                dot_product,
+                now_ist().strftime('%Y-%m-%d %H:%M:00'),
+            )),
+            (self.salary_lines_query, (None, self.lines_to_json(work_ids, costs, quantities))),
+        ])
+
+    @staticmethod
+    def lines_to_json(work_ids, costs, quantities):
+        return json.dumps([list(line) for line in zip_longest(work_ids or [], costs or [], quantities or [])])
+
+    @staticmethod
+    def explode_lines(df: pl.DataFrame) -> pl.DataFrame:
+        """
+        Turn the work_ids/costs/quantities list columns of a batch into one row per
+        work line: (row, line_no, work_id, cost, quantity). Lists of different
+        lengths are padded with nulls.
+        """
+        lines = None
+        for column, name in (("work_ids", "work_id"), ("costs", "cost"), ("quantities", "quantity")):
+            exploded = (
+                df.select("row", pl.col(column).alias(name))
+                .with_columns(line_no=pl.int_ranges(0, pl.col(name).list.len()))
+                .explode([name, "line_no"])
+                .drop_nulls("line_no")
+            )
+            lines = exploded if lines is None else lines.join(exploded, on=["row", "line_no"], how="full", coalesce=True)
+        return lines.sort("row", "line_no")
+
+    def add_salary_entries(self, entries):
+        """
+        Insert a batch of salary entries in one transaction.
+
+        Parameters:
+        -----------
+        entries : list[dict] or polars.DataFrame
+            Entries shaped like the ones accepted by `add_salary_entry`. In a
+            DataFrame the work_ids/costs/quantities columns may be lists or JSON strings.
+
+        Returns:
+        --------
+        int:
+            The number of inserted entries.
+        """
+        if isinstance(entries, pl.DataFrame):
+            df = entries
+        else:
+            df = pl.DataFrame(entries, infer_schema_length=None)
+        if df.is_empty():
+            return 0
+
+        for column in SALARY_ENTRY_COLUMNS:
+            if column not in df.columns:
+                df = df.with_columns(pl.lit(None).alias(column))
+        for column in ("work_ids", "costs", "quantities"):
+            if df.schema[column] in (pl.Utf8, pl.Null):
+                df = df.with_columns(pl.col(column).cast(pl.Utf8).str.json_decode(pl.List(pl.Int64)))
+            df = df.with_columns(pl.col(column).cast(pl.List(pl.Int64)).fill_null([]))
+
+        companies = df['company'].unique().to_list()
+        missing_companies = set(companies) - self.own_company_data.get_existing_company_names(companies)
+        if missing_companies:
+            raise ValueError(f"Company with name {sorted(missing_companies, key=str)[0]} does not exist")
+
+        employee_ids = df['employee_id'].unique().to_list()
+        missing_employees = set(employee_ids) - self.employee_data.get_existing_employee_ids(employee_ids)
+        if missing_employees:
+            raise ValueError(f"Employee with id {sorted(missing_employees, key=str)[0]} does not exist")
+
+        mismatched = df.filter(pl.col("costs").list.len() != pl.col("quantities").list.len())
+        if not mismatched.is_empty():
+            raise ValueError(f"costs and quantities have different lengths in {len(mismatched)} entries")
+
+        # work_done for the whole batch, from one exploded frame of work lines
+        df = df.with_row_index("row")
+        lines = self.explode_lines(df)
+        per_entry = lines.group_by("row").agg(work_done=(pl.col("cost") * pl.col("quantity")).sum())
+        df = df.join(per_entry, on="row", how="left", coalesce=True).sort("row").with_columns(
+            work_done=pl.col("work_done").fill_null(0),
+        )
+
+        if not df.filter((pl.col("type_of_payment") == "advance") & (pl.col("work_done") > 0)).is_empty():
+            raise ValueError(f"Advance payment not allowed in same entry with work done")
+
+        created_at = now_ist().strftime('%Y-%m-%d %H:%M:00')
+        salary_entry_query = f"""
+        INSERT INTO {self.table_name} (salary_entry_id, payment, record_date, employee_id, type_of_payment, mode_of_payment, company, work_done, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """
+        with self.db.transaction():
+            # ids are assigned up front so the lines can be inserted in one batch too, the
+            # write lock of the transaction keeps them free; AUTOINCREMENT never reuses an id
+            # of a deleted entry, so the sequence counts as taken as well
+            last_id, sequence = self.db.execute_select_query(
+                f"SELECT MAX(salary_entry_id), (SELECT seq FROM sqlite_sequence WHERE name = ?) FROM {self.table_name}",
+                (self.table_name,),
+            ).row(0)
+            first_id = max(last_id or 0, sequence or 0) + 1
+            self.db.execute_many(salary_entry_query, (
+                (first_id + row, *values, created_at)
+                for row, *values in df.select(["row"] + SALARY_ENTRY_COLUMNS[:6] + ["work_done"]).iter_rows()
+            ))
+            self.db.execute_many(
+                "INSERT INTO salary_lines (salary_entry_id, line_no, work_id, cost, quantity) VALUES (?, ?, ?, ?, ?)",
+                lines.select(pl.col("row") + first_id, "line_no", "work_id", "cost", "quantity").iter_rows(),
+            )
+        return len(df)
+
+    def read_salary_entries(self, where: str = "", params=(), with_work_details: bool = False, columns: list | None = None, limit: int | None = None, with_lines: bool = True) -> pl.DataFrame:
+        """
+        Read salary entries joined with their work lines in a single query and
+        fold the lines back into work_ids/costs/quantities list columns.
+
+        `where` filters the salaries table itself. With `limit` only the first
+        `limit` entries in salary_entry_id order are read, and their lines with
+        them; `columns` restricts the salaries columns that are selected.
+        """
+        entries = f"SELECT {', '.join(columns) if columns else '*'} FROM {self.table_name} {where}"
+        if limit is not None:
+            entries += " ORDER BY salary_entry_id LIMIT ?"
+            params = tuple(params) + (limit,)
+        if not with_lines:
+            return self.db.execute_select_query(entries, params)
+
+        res = self.db.execute_select_query(self.salary_lines_join(entries, with_work_details), params)
+        return self.fold_salary_lines(res, with_work_details)
+
+    @staticmethod
+    def salary_lines_join(entries: str, with_work_details: bool) -> str:
+        """The salary entries selected by `entries` with one row per work line, in entry and line order."""
+        work_details = ", w.work_name, w.bus_type" if with_work_details else ""
+        works_join = "LEFT JOIN works w ON w.work_id = l.work_id" if with_work_details else ""
+        return f"""
+        WITH s AS ({entries})
+        SELECT s.*, l.line_no, l.work_id, l.cost, l.quantity{work_details}
+        FROM s
+        LEFT JOIN salary_lines l ON l.salary_entry_id = s.salary_entry_id
+        {works_join}
+        ORDER BY s.salary_entry_id, l.line_no
+        """
+
+    @staticmethod
+    def fold_salary_lines(res: pl.DataFrame, with_work_details: bool) -> pl.DataFrame:
+        """Fold the rows of `salary_lines_join` back into one row per entry with list columns."""
+        line_columns = ["line_no", "work_id", "cost", "quantity", "work_name", "bus_type"]
+        entry_columns = [column for column in res.columns if column not in line_columns and column != "salary_entry_id"]
+        has_line = pl.col("line_no").is_not_null()
+        aggregations = [pl.col(entry_columns).first()]
+        aggregations += [
+            pl.col("work_id").filter(has_line).alias("work_ids"),
+            pl.col("cost").filter(has_line).alias("costs"),
+            pl.col("quantity").filter(has_line).alias("quantities"),
+        ]
+        if with_work_details:
+            aggregations += [pl.col("work_name").filter(has_line), pl.col("bus_type").filter(has_line)]
+        return res.group_by("salary_entry_id", maintain_order=True).agg(aggregations)
+
+    def stream_salary_entries(self, where: str = "", params=(), with_work_details: bool = False, batch_size: int = STREAM_BATCH_ROWS):
+        """
+        Like `read_salary_entries`, but yields the entries in batches read with
+        `stream_select_query`. The lines of the last entry in a batch may continue
+        in the next one, so those rows are held back and folded with the next batch.
+        """
+        query = self.salary_lines_join(f"SELECT * FROM {self.table_name} {where}", with_work_details)
+        pending = None
+        for batch in self.db.stream_select_query(query, params, batch_size):
+            if pending is not None:
+                batch = concat_batches(pending, batch)
+            last_id = batch["salary_entry_id"][-1]
+            pending = batch.filter(pl.col("salary_entry_id") == last_id)
+            complete = batch.filter(pl.col("salary_entry_id") != last_id)
+            if not complete.is_empty():
+                yield self.fold_salary_lines(complete, with_work_details)
+        if pending is not None:
+            yield self.fold_salary_lines(pending, with_work_details)
+
+    def stream_all_salary_entries(self):
+        yield from self.stream_salary_entries(with_work_details=True)
+
+    def stream_all_salary_entries_company(self, company):
+        for res in self.stream_salary_entries("WHERE company = ?", (company,)):
+            yield res.with_columns(works=pl.col("work_ids"))
+
     def get_all_salary_entries_of_an_employee(self, employee_id):
-        query = f"SELECT * FROM {self.table_name} WHERE employee_id = {employee_id}"
-        res = self.db.execute_select_query(query)
-        res = res.with_columns(costs=pl.col("costs").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_columns(quantities=pl.col("quantities").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_columns(works=pl.col("work_ids").str.json_decode(pl.List(pl.Int64)))
-        return res.to_dicts()
-    
+        return self.get_all_salary_entries_of_an_employee_as_df(employee_id).to_dicts()
+
+    def get_all_salary_entries_of_an_employee_as_df(self, employee_id):
+        res = self.read_salary_entries("WHERE employee_id = ?", (employee_id,))
+        return res.with_columns(works=pl.col("work_ids"))
+
     def get_all_salary_entries(self):
-        query = f"SELECT * FROM {self.table_name}"
-        res = self.db.execute_select_query(query)
-        res = res.with_columns(costs=pl.col("costs").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_columns(quantities=pl.col("quantities").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_columns(work_ids=pl.col("work_ids").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_row_count()
-        df = res.select(pl.col('work_ids'), pl.col('index'))
-        df = df.explode(pl.col('work_ids'))
-
-        work_handler = Works()
-        works = work_handler.get_all_works_brief_as_df()
-
-        df = df.join(works, left_on='work_ids', right_on='work_id').group_by('index').agg(pl.col('work_name'), pl.col('bus_type'))
-        res = res.join(df, left_on='index', right_on='index')
-        return res.to_dicts()
-    
+        return self.get_all_salary_entries_as_df().to_dicts()
+
+    def get_all_salary_entries_as_df(self):
+        return self.read_salary_entries(with_work_details=True)
+
+    def get_salary_entries_page(self, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None, fields: str | None = None):
+        res, next_after = self.get_salary_entries_page_as_df(limit, after, fields)
+        return res.to_dicts(), next_after
+
+    def get_salary_entries_page_as_df(self, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None, fields: str | None = None):
+        """
+        One page of `get_all_salary_entries`, in salary_entry_id order after the `after` id.
+        Work lines are only joined in when one of the line fields is requested.
+        """
+        columns = None
+        line_fields = SALARY_LINE_FIELDS
+        if fields:
+            columns = parse_fields(fields, self.db.get_table_columns(self.table_name) + SALARY_LINE_FIELDS, "salary_entry_id")
+            line_fields = [column for column in columns if column in SALARY_LINE_FIELDS]
+        where, params = ("WHERE salary_entry_id > ?", (after,)) if after is not None else ("", ())
+        res = self.read_salary_entries(
+            where,
+            params,
+            with_work_details="work_name" in line_fields or "bus_type" in line_fields,
+            columns=[column for column in columns if column not in SALARY_LINE_FIELDS] if columns else None,
+            limit=limit,
+            with_lines=bool(line_fields),
+        )
+        if columns:
+            res = res.select(columns)
+        return res, next_page_cursor(res, "salary_entry_id", limit)
+
     def delete_salary_entry(self, employee_id, salary_entry_id):
-        query = f"DELETE FROM {self.table_name} WHERE salary_entry_id = {salary_entry_id} AND employee_id = {employee_id}"
-        self.db.execute_with_auto_commit(query)
-    
+        query = f"DELETE FROM {self.table_name} WHERE salary_entry_id = ? AND employee_id = ?"
+        delete_lines_query = f"DELETE FROM salary_lines WHERE salary_entry_id IN (SELECT salary_entry_id FROM {self.table_name} WHERE salary_entry_id = ? AND employee_id = ?)"
+        self.db.execute_statements_with_auto_commit([
+            (delete_lines_query, (salary_entry_id, employee_id)),
+            (query, (salary_entry_id, employee_id)),
+        ])
+
+    @transactional
     def update_salary_entry(self, salary_entry_id, entry: dict):
-        query_check_salary_entry_exists = f"SELECT * FROM {self.table_name} WHERE salary_entry_id = {salary_entry_id}"
-        res = self.db.execute_select_query(query_check_salary_entry_exists)
+        """
+        Replace a salary entry and its work lines. The existence checks run in
+        the same transaction as the update.
+        """
+        query_check_salary_entry_exists = f"SELECT * FROM {self.table_name} WHERE salary_entry_id = ?"
+        res = self.db.execute_select_query(query_check_salary_entry_exists, (salary_entry_id,))
         if res.is_empty():
             raise ValueError(f"Salary entry with id {salary_entry_id} does not exist")
 
         # check own company exists
         company = entry.get("company")
-        own_company_data = OwnCompanyData()
-        if not own_company_data.check_own_company_exists(company):
+        if not self.own_company_data.check_own_company_exists(company):
             raise ValueError(f"Company with name {company} does not exist")
-        
+
         # check employee exists
-        employee_data = EmployeeData()
         employee_id = entry.get("employee_id")
-        if not employee_data.check_employee_exists(employee_id, company):
+        if not self.employee_data.check_employee_exists(employee_id, company):
             raise ValueError(f"Employee with id {employee_id} does not exist")
-        
-        works = entry.get("works")
+
+        works = entry.get("works", entry.get("work_ids"))
         costs = entry.get("costs")
         quantities = entry.get("quantities")
 
-        dot_product = np.dot(costs, quantities)
-
-        works = json.dumps(works)
-        costs = json.dumps(costs)
-        quantities = json.dumps(quantities)
+        dot_product = work_done(costs, quantities)
 
         update_salary_entry_query = f"""
         UPDATE {self.table_name}
-        SET 
-        payment = {entry.get('payment')},
-        record_date = '{entry.get('record_date')}',
-        type_of_work = '{entry.get('type_of_work')}',
-        type_of_payment = '{entry.get('type_of_payment')}',
-        mode_of_payment = '{entry.get('mode_of_payment')}',
-        company = '{company}',
-        works = '{works}',
-        costs = '{costs}',
-        quantities = '{quantities}',
-        work_done = {dot_product}
-        WHERE salary_entry_id = {salary_entry_id}
-        """
-        self.db.execute_with_auto_commit(update_salary_entry_query)
-    
+        SET
+        payment = ?,
+        record_date = ?,
+        type_of_work = ?,
+        type_of_payment = ?,
+        mode_of_payment = ?,
+        company = ?,
+        work_done = ?
+        WHERE salary_entry_id = ?
+        """
+        self.db.execute_statements_with_auto_commit([
+            (update_salary_entry_query, (
+                entry.get('payment'),
+                entry.get('record_date'),
+                entry.get('type_of_work'),
+                entry.get('type_of_payment'),
+                entry.get('mode_of_payment'),
+                company,
+                dot_product,
+                salary_entry_id,
+            )),
+            ("DELETE FROM salary_lines WHERE salary_entry_id = ?", (salary_entry_id,)),
+            (self.salary_lines_query, (salary_entry_id, self.lines_to_json(works, costs, quantities))),
+        ])
+
     def get_all_salary_entries_company(self, company):
-        query = f"SELECT * FROM {self.table_name} WHERE company = '{company}'"
-        res = self.db.execute_select_query(query)
-        res = res.with_columns(costs=pl.col("costs").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_columns(quantities=pl.col("quantities").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_columns(works=pl.col("works").str.json_decode(pl.List(pl.Utf8)))
-        return res.to_dicts()
-    
+        return self.get_all_salary_entries_company_as_df(company).to_dicts()
+
+    def get_all_salary_entries_company_as_df(self, company):
+        res = self.read_salary_entries("WHERE company = ?", (company,))
+        return res.with_columns(works=pl.col("work_ids"))
+
     def get_all_salary_entries_of_an_employee_company(self, employee_id, company):
-        query = f"SELECT * FROM {self.table_name} WHERE employee_id = {employee_id} AND company = '{company}'"
-        res = self.db.execute_select_query(query)
-        res = res.with_columns(costs=pl.col("costs").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_columns(quantities=pl.col("quantities").str.json_decode(pl.List(pl.Int64)))
-        res = res.with_columns(works=pl.col("works").str.json_decode(pl.List(pl.Utf8)))
+        return self.get_all_salary_entries_of_an_employee_company_as_df(employee_id, company).to_dicts()
+
+    def get_all_salary_entries_of_an_employee_company_as_df(self, employee_id, company):
+        res = self.read_salary_entries("WHERE employee_id = ? AND company = ?", (employee_id, company))
+        return res.with_columns(works=pl.col("work_ids"))
+
+    def get_work_totals(self, company):
+        """Per-work quantities and amounts for a company, aggregated in SQL over salary_lines."""
+        query = f"""
+        SELECT l.work_id, w.work_name, w.bus_type, COUNT(DISTINCT l.salary_entry_id) AS total_entries,
+        SUM(l.quantity) AS total_quantity, SUM(l.cost * l.quantity) AS total_work_done
+        FROM salary_lines l
+        JOIN {self.table_name} s ON s.salary_entry_id = l.salary_entry_id
+        LEFT JOIN works w ON w.work_id = l.work_id
+        WHERE s.company = ?
+        GROUP BY l.work_id
+        ORDER BY l.work_id
+        """
+        res = self.db.execute_select_query(query, (company,))
         return res.to_dicts()
-    
 
 
-    
+
+
 
 class SummaryInsights:
 
     def __init__(self) -> None:
         self.employees_table_name = "employees"
+        self.db = DatabaseInterface(DB_NAME)
+        self.summary_fields = [
+            "total_payment", "average_payment", "max_payment", "min_payment", "total_entries",
+            "total_work_done", "average_work_done", "max_work_done", "min_work_done",
+        ]
 
     def get_payment_summary(self, company):
-        
-        aggregate_query = f"""
-        SELECT SUM(payment) as total_payment, AVG(payment) as average_payment, MAX(payment) as max_payment, MIN(payment) as min_payment,
-        COUNT(payment) as total_entries, SUM(work_done) as total_work_done, AVG(work_done) as average_work_done, MAX(work_done) as max_work_done, MIN(work_done) as min_work_done
-        FROM salaries WHERE company = '{company}';
-        """
-        db = DatabaseInterface(DB_NAME)
-        res = db.execute_select_query(aggregate_query)
+
+        # company_payment_rollup is kept current by triggers on salaries, see migrations.py
+        aggregate_query = """
+        SELECT CASE WHEN payment_count > 0 THEN payment_sum END as total_payment, payment_sum * 1.0 / payment_count as average_payment,
+        payment_max as max_payment, payment_min as min_payment, payment_count as total_entries,
+        CASE WHEN work_done_count > 0 THEN work_done_sum END as total_work_done, work_done_sum * 1.0 / work_done_count as average_work_done,
+        work_done_max as max_work_done, work_done_min as min_work_done
+        FROM company_payment_rollup WHERE company = ?;
+        """
+        res = self.db.execute_select_query(aggregate_query, (company,))
         if res.is_empty():
-            return None
+            # same shape as an aggregate over no rows
+            return dict.fromkeys(self.summary_fields, None) | {"total_entries": 0}
         return res.to_dicts()[0]
-    
+
+
+class CatalogCache:
+    """
+    Process-level copy of a small reference table that is read far more often than
+    it changes. The table is held as a Polars DataFrame plus dict indexes built by
+    `build_indexes`, loaded on first use and dropped by `invalidate` after every write.
+    With `versions` the copy is also reloaded once any other process wrote the table.
+
+    Attributes:
+    -----------
+    hits : int
+        Reads served from memory.
+    misses : int
+        Reads that had to (re)load the table from the database.
+    """
+
+    def __init__(self, load, build_indexes, versions=None, table_name: str | None = None) -> None:
+        self._load = load
+        self._build_indexes = build_indexes
+        self._versions = versions
+        self._tables = (table_name,)
+        self._lock = threading.Lock()
+        # (table versions, entry), replaced as a whole so lock-free reads see a matching pair
+        self._cached = (None, None)
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        """Return (DataFrame, indexes), loading them if the cache is empty or stale."""
+        cached_versions, entry = self._cached
+        table_versions = self._versions.get(self._tables) if self._versions is not None else None
+        if entry is not None and table_versions == cached_versions:
+            self.hits += 1
+            return entry
+        with self._lock:
+            self.misses += 1
+            version = self._version
+        df = self._load()
+        entry = (df, self._build_indexes(df))
+        with self._lock:
+            # a write that landed while we were loading makes this copy stale already
+            if version == self._version:
+                self._cached = (table_versions, entry)
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._cached = (None, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "loaded": self._cached[1] is not None}
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(db: DatabaseInterface, table_name: str, query: str, build_indexes) -> CatalogCache:
+    """Return the process-wide catalog cache for a table, one per database file."""
+    key = (os.path.abspath(db.db_name), table_name)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = CatalogCache(lambda: db.execute_select_query(query), build_indexes, db.pool.versions, table_name)
+        return catalog
+
+
+def catalog_stats():
+    with _catalogs_lock:
+        catalogs = list(_catalogs.items())
+    return {table_name: catalog.stats() for (_, table_name), catalog in catalogs}
+
 
 class Works:
 
     def __init__(self) -> None:
         self.table_name = "works"
         self.db = DatabaseInterface(DB_NAME)
-        self.check_table_exists()
-    
-    def check_table_exists(self):
-        query = f"""
-                CREATE TABLE IF NOT EXISTS {self.table_name} (
-                work_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                work_name TEXT,
-                bus_type TEXT,
-                cost INTEGER,
-                description TEXT
-                );
-        """
-        indexquery = f"""
-        CREATE INDEX IF NOT EXISTS idx_work_id ON {self.table_name}(work_id);
-        """
-        self.db.execute_with_auto_commit(query)
-        self.db.execute_with_auto_commit(indexquery)
-    
+        self.bus_types = BusTypes()
+        self.catalog = get_catalog(
+            self.db,
+            self.table_name,
+            f"SELECT work_id, work_name, bus_type, cost FROM {self.table_name}",
+            lambda df: {
+                "by_id": dict(zip(df["work_id"].to_list(), df.to_dicts())),
+                "by_name": dict(zip(df["work_name"].to_list(), df["work_id"].to_list())),
+            },
+        )
+
+
     def add_work(self, work: dict):
-        get_work_name_query = f"SELECT work_name FROM {self.table_name} WHERE work_name = '{work.get('work_name')}'"
-        res = self.db.execute_select_query(get_work_name_query)
-        if not res.is_empty():
-            raise ValueError(f"Work with name {work.get('work_name')} already exists")
-        
-        bus_types = BusTypes()
-        if not bus_types.check_bus_type_exists(work.get('bus_type')):
+        if not self.bus_types.check_bus_type_exists(work.get('bus_type')):
             raise ValueError(f"Bus type with name {work.get('bus_type')} does not exist")
-        
+
         add_work_query = f"""
         INSERT INTO {self.table_name} (work_name, bus_type, cost, description)
-        VALUES (
-            '{work.get('work_name')}',
-            '{work.get('bus_type')}',
-            {work.get('cost')},
-            '{work.get('description')}'
-        );
-        """
-        self.db.execute_with_auto_commit(add_work_query)
-    
+        VALUES (?, ?, ?, ?);
+        """
+        try:
+            self.db.execute_with_auto_commit(add_work_query, (
+                work.get('work_name'),
+                work.get('bus_type'),
+                work.get('cost'),
+                work.get('description'),
+            ))
+        except sqlite3.IntegrityError as error:
+            if is_unique_violation(error, "works.work_name"):
+                raise ValueError(f"Work with name {work.get('work_name')} already exists") from error
+            raise
+        self.catalog.invalidate()
+
     def get_all_works_brief(self):
-        query = f"SELECT work_id, work_name, bus_type, cost FROM {self.table_name}"
-        res = self.db.execute_select_query(query)
+        res, _ = self.catalog.get()
         return res.to_dicts()
-    
+
+    def get_works_page(self, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None, fields: str | None = None):
+        res, next_after = self.get_works_page_as_df(limit, after, fields)
+        return res.to_dicts(), next_after
+
+    def get_works_page_as_df(self, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None, fields: str | None = None):
+        # pages are cut from the cached catalog, no database round trip
+        res, _ = self.catalog.get()
+        columns = parse_fields(fields, res.columns, "work_id")
+        if after is not None:
+            res = res.filter(pl.col("work_id") > after)
+        res = res.sort("work_id").head(limit)
+        if columns:
+            res = res.select(columns)
+        return res, next_page_cursor(res, "work_id", limit)
+
     def get_all_works_brief_as_df(self):
-        query = f"SELECT work_id, work_name, bus_type, cost FROM {self.table_name}"
-        res = self.db.execute_select_query(query)
+        res, _ = self.catalog.get()
         return res
 
+    def check_work_exists(self, work_id):
+        _, indexes = self.catalog.get()
+        return work_id in indexes["by_id"]
+
     def delete_work(self, work_id):
         # check if work exists
-        query = f"SELECT * FROM {self.table_name} WHERE work_id = {work_id}"
-        res = self.db.execute_select_query(query)
-        if res.is_empty():
+        if not self.check_work_exists(work_id):
             raise ValueError(f"Work with id {work_id} does not exist")
 
-        query = f"DELETE FROM {self.table_name} WHERE work_id = {work_id}"
-        self.db.execute_with_auto_commit(query)
+        query = f"DELETE FROM {self.table_name} WHERE work_id = ?"
+        self.db.execute_with_auto_commit(query, (work_id,))
+        self.catalog.invalidate()
         return True
-    
+
     def update_work(self, work_id, work: dict):
-        query_check_work_exists = f"SELECT * FROM {self.table_name} WHERE work_id = {work_id}"
-        res = self.db.execute_select_query(query_check_work_exists)
-        if res.is_empty():
+        if not self.check_work_exists(work_id):
             raise ValueError(f"Work with id {work_id} does not exist")
-        
+
         query = f"""
         UPDATE {self.table_name}
-        SET 
-        work_name = '{work.get('work_name')}',
-        bus_type = '{work.get('bus_type')}',
-        cost = {work.get('cost')},
-        description = '{work.get('description')}'
-        WHERE work_id = {work_id}
+        SET
+        work_name = ?,
+        bus_type = ?,
+        cost = ?,
+        description = ?
+        WHERE work_id = ?
         """
-        self.db.execute_with_auto_commit(query)
+        try:
+            self.db.execute_with_auto_commit(query, (
+                work.get('work_name'),
+                work.get('bus_type'),
+                work.get('cost'),
+                work.get('description'),
+                work_id,
+            ))
+        except sqlite3.IntegrityError as error:
+            if is_unique_violation(error, "works.work_name"):
+                raise ValueError(f"Work with name {work.get('work_name')} already exists") from error
+            raise
+        self.catalog.invalidate()
 
 
 class BusTypes:
@@ -523,67 +930,65 @@ class BusTypes:
     def __init__(self) -> None:
         self.table_name = "bus_types"
         self.db = DatabaseInterface(DB_NAME)
-        self.check_table_exists()
+        self.catalog = get_catalog(
+            self.db,
+            self.table_name,
+            f"SELECT * FROM {self.table_name}",
+            lambda df: {
+                "by_id": dict(zip(df["bus_type_id"].to_list(), df["bus_type"].to_list())),
+                "by_name": dict(zip(df["bus_type"].to_list(), df["bus_type_id"].to_list())),
+            },
+        )
 
-    def check_table_exists(self):
-        query = f"""
-                CREATE TABLE IF NOT EXISTS {self.table_name} (
-                bus_type_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                bus_type TEXT
-                );
-        """
-        indexquery = f"""
-        CREATE INDEX IF NOT EXISTS idx_bus_type_id ON {self.table_name}(bus_type_id);
-        """
-        self.db.execute_with_auto_commit(query)
-        self.db.execute_with_auto_commit(indexquery)
 
     def add_bus_type(self, bus_type: dict):
-        get_bus_type_query = f"SELECT bus_type FROM {self.table_name} WHERE bus_type = '{bus_type.get('bus_type')}'"
-        res = self.db.execute_select_query(get_bus_type_query)
-        if not res.is_empty():
-            raise ValueError(f"Bus type with name {bus_type.get('bus_type')} already exists")
-        
         add_bus_type_query = f"""
         INSERT INTO {self.table_name} (bus_type)
-        VALUES (
-            '{bus_type.get('bus_type')}'
-        );
+        VALUES (?);
         """
-        self.db.execute_with_auto_commit(add_bus_type_query)
+        try:
+            self.db.execute_with_auto_commit(add_bus_type_query, (bus_type.get('bus_type'),))
+        except sqlite3.IntegrityError as error:
+            if is_unique_violation(error, "bus_types.bus_type"):
+                raise ValueError(f"Bus type with name {bus_type.get('bus_type')} already exists") from error
+            raise
+        self.catalog.invalidate()
 
     def get_all_bus_types(self):
-        query = f"SELECT * FROM {self.table_name}"
-        res = self.db.execute_select_query(query)
+        res, _ = self.catalog.get()
         return res
-    
+
     def delete_bus_type(self, bus_type_id):
         # check if the bus type exists
-        query = f"SELECT * FROM {self.table_name} WHERE bus_type_id = {bus_type_id}"
-        res = self.db.execute_select_query(query)
-        if res.is_empty():
+        _, indexes = self.catalog.get()
+        if bus_type_id not in indexes["by_id"]:
             raise ValueError(f"Bus type with id {bus_type_id} does not exist")
-        
-        query = f"DELETE FROM {self.table_name} WHERE bus_type_id = {bus_type_id}"
-        self.db.execute_with_auto_commit(query)
+
+        query = f"DELETE FROM {self.table_name} WHERE bus_type_id = ?"
+        self.db.execute_with_auto_commit(query, (bus_type_id,))
+        self.catalog.invalidate()
 
     def update_bus_type(self, bus_type_id, bus_type: dict):
-        query_check_bus_type_exists = f"SELECT * FROM {self.table_name} WHERE bus_type_id = {bus_type_id}"
-        res = self.db.execute_select_query(query_check_bus_type_exists)
-        if res.is_empty():
+        _, indexes = self.catalog.get()
+        if bus_type_id not in indexes["by_id"]:
             raise ValueError(f"Bus type with id {bus_type_id} does not exist")
-        
+
         query = f"""
         UPDATE {self.table_name}
-        SET 
-        bus_type = '{bus_type.get('bus_type')}'
-        WHERE bus_type_id = {bus_type_id}
+        SET
+        bus_type = ?
+        WHERE bus_type_id = ?
         """
-        self.db.execute_with_auto_commit(query)
-    
+        try:
+            self.db.execute_with_auto_commit(query, (bus_type.get('bus_type'), bus_type_id))
+        except sqlite3.IntegrityError as error:
+            if is_unique_violation(error, "bus_types.bus_type"):
+                raise ValueError(f"Bus type with name {bus_type.get('bus_type')} already exists") from error
+            raise
+        self.catalog.invalidate()
+
     def check_bus_type_exists(self, bus_type):
-        query = f"SELECT * FROM {self.table_name} WHERE bus_type = '{bus_type}'"
-        res = self.db.execute_select_query(query)
-        return not res.is_empty()
+        _, indexes = self.catalog.get()
+        return bus_type in indexes["by_name"]
+
 
-    
\ No newline at end of file
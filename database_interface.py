@@ -1,29 +1,817 @@
+import contextlib
+import functools
+import json
+import logging
+import os
+import queue
+import re
 import sqlite3
-import traceback
-import connectorx as cx
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import Future
+import polars as pl
+
+import metrics
+
+# Connection tuning applied to every pooled connection
+JOURNAL_MODE = "WAL"
+SYNCHRONOUS = "NORMAL"
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+BUSY_TIMEOUT_MS = 5000
+# prepared statements kept per connection, keyed by the exact SQL text
+STATEMENT_CACHE_SIZE = 256
+# rows fetched per batch by stream_select_query
+STREAM_BATCH_ROWS = 10_000
+
+# select results kept per database file, bounded by their estimated in-memory size
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# results are re-read after this long even without a write, a safety net for writes made outside this process
+RESULT_CACHE_TTL_S = 60.0
+
+# commit writes made outside a transaction() block in groups, on one writer thread per database
+GROUP_COMMIT = os.environ.get("DB_GROUP_COMMIT", "0") == "1"
+# how long a group stays open for more writes, with 0 a group is whatever queued up during the previous commit
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("DB_GROUP_COMMIT_WINDOW_MS", "0"))
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("DB_GROUP_COMMIT_MAX_BATCH", "256"))
+
+# statements slower than this are logged with their query plan, kept in ConnectionPool.slow_queries
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_SIZE = 100
+# log every statement SQLite runs, BEGIN/COMMIT and trigger bodies included, at DEBUG level
+TRACE_STATEMENTS = os.environ.get("DB_TRACE_STATEMENTS", "0") == "1"
+
+# how often the shared table versions are checked for writes from other connections
+VERSION_POLL_INTERVAL_S = 0.002
+# table_versions row holding a random id of the database, see migrations.py
+VERSION_EPOCH_KEY = "__epoch__"
+
+# tables that triggers write whenever the key table is written, see migrations.py
+TRIGGER_WRITTEN_TABLES = {"salaries": ("company_payment_rollup",)}
+
+BUMP_TABLE_VERSIONS_QUERY = "UPDATE table_versions SET version = version + 1 WHERE table_name IN (SELECT value FROM json_each(?))"
+
+WRITTEN_TABLE_PATTERN = re.compile(
+    r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|(?<!DO\s)UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+[\"`\[]?(\w+)",
+    re.IGNORECASE,
+)
+
+
+# one source of a FROM list: a table or table-valued function call, optionally aliased
+_FROM_ITEM = r"[\"`\[]?(\w+)[\"`\]]?(\s*\([^()]*\))?(?:\s+(?:AS\s+)?\w+)?"
+FROM_ITEM_PATTERN = re.compile(_FROM_ITEM, re.IGNORECASE)
+FROM_LIST_PATTERN = re.compile(rf"\bFROM\s+({_FROM_ITEM}(?:\s*,\s*{_FROM_ITEM})*)", re.IGNORECASE)
+JOIN_TABLE_PATTERN = re.compile(r"\bJOIN\s+[\"`\[]?(\w+)\b(?!\s*\()", re.IGNORECASE)
+CTE_NAME_PATTERN = re.compile(r"(?:\bWITH|,)\s+(\w+)\s+AS\s*\(", re.IGNORECASE)
+# results of these change without any write, queries calling them are never cached
+VOLATILE_PATTERN = re.compile(
+    r"\b(?:random|randomblob|changes|total_changes|last_insert_rowid|date|time|datetime|julianday|strftime|unixepoch|current_date|current_time|current_timestamp)\b",
+    re.IGNORECASE,
+)
+SQL_TOKEN_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+")
+# frames walked up from a handler helper to the handler method that was called
+CALLER_MAX_DEPTH = 16
+
+slow_query_logger = logging.getLogger("database_interface.slow_queries")
+statement_logger = logging.getLogger("database_interface.statements")
+
+QUERY_DURATION = metrics.histogram(
+    "db_query_duration_seconds", "Time SQLite spent running a statement and returning its rows.", ("query", "caller"),
+)
+QUERY_ROWS = metrics.histogram(
+    "db_query_rows", "Rows a statement returned or changed.", ("query", "caller"), metrics.ROW_BUCKETS,
+)
+
+
+def read_tables(query: str):
+    """
+    Tables a select query reads through FROM and JOIN, without its CTE names and
+    table-valued functions. None when the query must not be cached.
+    """
+    if VOLATILE_PATTERN.search(query):
+        return None
+    ctes = {name.lower() for name in CTE_NAME_PATTERN.findall(query)}
+    tables = {table.lower() for table in JOIN_TABLE_PATTERN.findall(query)}
+    # every source of `FROM a, b`, a comma join reads b as much as a
+    for match in FROM_LIST_PATTERN.finditer(query):
+        tables.update(name.lower() for name, call, *_ in FROM_ITEM_PATTERN.findall(match.group(1)) if not call)
+    tables -= ctes
+    return tuple(sorted(tables)) or None
+
+
+def params_key(params) -> tuple:
+    """The bound values of a query as part of a cache key, named parameters by name."""
+    # 1, 1.0 and True are equal as Python values but not as SQLite parameters
+    if isinstance(params, Mapping):
+        return tuple(sorted((name, type(value), value) for name, value in params.items()))
+    return tuple((type(param), param) for param in params)
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace outside of quoted literals, so formatting alone never splits cache entries."""
+    return SQL_TOKEN_PATTERN.sub(lambda match: match.group(1) or " ", query).strip()
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def written_tables(query: str) -> frozenset:
+    """Tables a write statement modifies, including the ones its triggers modify."""
+    tables = {table.lower() for table in WRITTEN_TABLE_PATTERN.findall(query)}
+    for table in list(tables):
+        tables.update(TRIGGER_WRITTEN_TABLES.get(table, ()))
+    return frozenset(tables)
+
+
+def calling_method() -> str:
+    """
+    Qualified name of the method that called into this module, followed up
+    through the helpers of its own module, e.g. `SalaryData.get_all_salary_entries_as_df`
+    rather than the `read_salary_entries` helper it runs its query through.
+    """
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    module = frame.f_globals.get("__name__")
+    caller = frame
+    for _ in range(CALLER_MAX_DEPTH):
+        frame = frame.f_back
+        if frame is None or frame.f_globals.get("__name__") != module:
+            break
+        caller = frame
+    return getattr(caller.f_code, "co_qualname", caller.f_code.co_name)
+
+
+def explain(conn, query: str, params=()):
+    """
+    The EXPLAIN QUERY PLAN details of a statement, one string per plan step.
+    With params None every placeholder is bound to NULL.
+    """
+    if params is None:
+        params = (None,) * query.count("?")
+    try:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+    except sqlite3.Error as error:
+        return [f"unavailable: {error}"]
+
+
+def query_stats():
+    """Latency percentiles and row counts of every statement run so far, slowest in total first."""
+    rows = dict(QUERY_ROWS.items())
+    stats = []
+    for (query, caller), histogram in QUERY_DURATION.items():
+        stats.append({
+            "query": query,
+            "caller": caller,
+            **histogram.stats(),
+            "rows": rows[(query, caller)].sum if (query, caller) in rows else 0,
+        })
+    return sorted(stats, key=lambda stat: stat["sum"], reverse=True)
+
+
+class TableVersions:
+    """
+    A version per table that changes after every committed write, shared by
+    every process using the database file.
+
+    Once migrations created the table_versions table, DatabaseInterface bumps
+    the rows of the written tables in the same transaction as each write, one
+    statement per transaction rather than a trigger per row. A watcher connection reads
+    PRAGMA data_version, which changes whenever any other connection commits, at
+    most every VERSION_POLL_INTERVAL_S, and reloads the versions when it moved.
+    Writes from sibling worker processes so become visible within milliseconds
+    without any external service. Tables without a row fall back to counters
+    bumped by this process's own writes.
+
+    Attributes:
+    -----------
+    epoch : str
+        Random per process, or per database once table_versions exists, so
+        version numbers from unrelated sources are never compared.
+    """
+
+    def __init__(self, connect=None) -> None:
+        self.epoch = self.process_epoch = uuid.uuid4().hex[:12]
+        self._connect = connect
+        self._conn = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._data_version = None
+        self._checked_at = 0.0
+        self._shared = {}
+        self._local = {}
+
+    def bump(self, tables):
+        """Record a write committed by this process, visible to the next `get` right away."""
+        with self._lock:
+            for table in tables:
+                self._local[table] = self._local.get(table, 0) + 1
+        self.sync(force=True)
+
+    def sync(self, force: bool = False):
+        """Reload the shared versions if any connection committed since the last check."""
+        if self._connect is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._checked_at < VERSION_POLL_INTERVAL_S:
+            return
+        # one thread polls at a time, the others keep using the versions they have
+        if not self._sync_lock.acquire(blocking=force):
+            return
+        try:
+            self._checked_at = now
+            if self._conn is None:
+                self._conn = self._connect()
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            try:
+                shared = dict(self._conn.execute("SELECT table_name, version FROM table_versions"))
+            except sqlite3.OperationalError:
+                # not migrated yet
+                shared = {}
+            epoch = shared.pop(VERSION_EPOCH_KEY, None)
+            self._shared = shared
+            self.epoch = f"db{epoch}" if epoch is not None else self.process_epoch
+        finally:
+            self._sync_lock.release()
+
+    def shared_tables(self, tables) -> list:
+        """Those of `tables` that have a row in table_versions."""
+        self.sync()
+        return sorted(table for table in tables if table in self._shared)
+
+    def get(self, tables) -> tuple:
+        """The current version of each of `tables`, in order."""
+        self.sync()
+        shared, local = self._shared, self._local
+        # tagged by source, a shared and a local number are never equal
+        return tuple(("s", shared[table]) if table in shared else ("l", local.get(table, 0)) for table in tables)
+
+    def token(self, tables) -> str:
+        """A string that changes whenever one of `tables` is written, equal across processes for shared versions."""
+        versions = self.get(tables)
+        epoch = self.epoch if all(source == "s" for source, _ in versions) else self.process_epoch
+        return f"{epoch}-{'.'.join(f'{source}{version}' for source, version in versions)}"
+
+    def close(self):
+        with self._sync_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._data_version = None
+
+
+class ResultCache:
+    """
+    LRU cache of select results keyed on normalized SQL plus parameters.
+
+    Every entry remembers the versions of the tables its query read, a lookup
+    after a write to any of them is a miss, so invalidation is exact without
+    having to find the affected entries. Entries also expire after `ttl` seconds
+    and the least recently used ones are evicted once the estimated size of the
+    cached frames exceeds `max_bytes`.
+    """
+
+    def __init__(self, versions: TableVersions, max_bytes: int = RESULT_CACHE_MAX_BYTES, ttl: float = RESULT_CACHE_TTL_S) -> None:
+        self.versions = versions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, versions):
+        """
+        The cached result for `key` if it was read at `versions`, the current
+        versions of its tables. Callers take them before calling, syncing them
+        may read the database and must not hold up other lookups.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                frame, _, entry_versions, expires_at, size = entry
+                if expires_at > time.monotonic() and entry_versions == versions:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return frame
+                del self._entries[key]
+                self.bytes -= size
+            self.misses += 1
+            return None
+
+    def put(self, key, frame: pl.DataFrame, tables, versions):
+        """Store a result read while `tables` were at `versions`, taken before the read started."""
+        size = frame.estimated_size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[4]
+            self._entries[key] = (frame, tables, versions, time.monotonic() + self.ttl, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted[4]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+
+class ConnectionPool:
+    """
+    Keeps one writer and one reader sqlite3 connection per thread open for the
+    life of the process, so statements no longer pay for opening the database file.
+
+    Attributes:
+    -----------
+    db_name : str
+        Path of the SQLite database file.
+    """
 
-class DatabaseInterface:
     def __init__(self, db_name: str):
         self.db_name = db_name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+        self.versions = TableVersions(self.dedicated_reader)
+        self.result_cache = ResultCache(self.versions)
+        self.group_commit = None
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        # (schema_version, declared type by column name), see column_types
+        self._column_types = (None, {})
+        if GROUP_COMMIT:
+            self.enable_group_commit()
+
+    def _connect(self, readonly: bool, tracked: bool = True):
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        if not readonly:
+            # journal_mode is persistent in the file, setting it from the writer is enough
+            conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        if readonly:
+            # readers run in autocommit mode so they never hold a read transaction open
+            conn.isolation_level = None
+            conn.execute("PRAGMA query_only=ON")
+        if TRACE_STATEMENTS:
+            conn.set_trace_callback(statement_logger.debug)
+        if tracked:
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def column_types(self, conn) -> dict:
+        """
+        The Polars type of every column name that is declared with the same type
+        affinity in each table having it, reloaded after schema changes.
+        """
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        cached_version, types = self._column_types
+        if cached_version == schema_version:
+            return types
+        declared = {}
+        for column, column_type in conn.execute(
+            "SELECT p.name, p.type FROM sqlite_master m JOIN pragma_table_info(m.name) p WHERE m.type = 'table'"
+        ):
+            declared.setdefault(column, set()).add(affinity_dtype(column_type))
+        types = {column: dtypes.pop() for column, dtypes in declared.items() if len(dtypes) == 1 and None not in dtypes}
+        self._column_types = (schema_version, types)
+        return types
 
-    def execute_with_auto_commit(self, query: str):
-        # Connect to the database
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+    def _get(self, role: str):
+        cached = getattr(self._local, role, None)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        conn = self._connect(readonly=(role == "reader"))
+        setattr(self._local, role, (self._generation, conn))
+        return conn
+
+    def writer(self):
+        """Return the calling thread's writer connection, opening it on first use."""
+        return self._get("writer")
+
+    def reader(self):
+        """Return the calling thread's read-only connection, opening it on first use."""
+        return self._get("reader")
+
+    def dedicated_reader(self):
+        """
+        Open a read-only connection that belongs to a single caller rather than a
+        thread, e.g. a stream consumed from whichever worker thread is free.
+        The caller must close it.
+        """
+        return self._connect(readonly=True, tracked=False)
+
+    def enable_group_commit(self, window_ms: float = GROUP_COMMIT_WINDOW_MS, max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        """Send the writes of every DatabaseInterface of this database through a `GroupCommitWriter`."""
+        if self.group_commit is not None:
+            self.group_commit.close()
+        self.group_commit = GroupCommitWriter(self, window_ms / 1000, max_batch)
+
+    def close(self):
+        """Close every connection opened by the pool, threads reconnect lazily afterwards."""
+        if self.group_commit is not None:
+            # pending writes are committed first, the writer thread restarts on the next write
+            self.group_commit.close()
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for conn in connections:
+            conn.close()
+        self.versions.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name: str) -> ConnectionPool:
+    """Return the process-wide pool for a database file, shared by every DatabaseInterface."""
+    key = os.path.abspath(db_name)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_name)
+        return pool
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def affinity_dtype(declared: str):
+    """The Polars type of a declared column type, by SQLite's type affinity rules. None for BLOB and NUMERIC."""
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return pl.Int64
+    if any(name in declared for name in ("CHAR", "CLOB", "TEXT")):
+        return pl.Utf8
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB")):
+        return pl.Float64
+    return None
+
+
+def frame_from_cursor(cursor, rows, column_types=None) -> pl.DataFrame:
+    """
+    Build a Polars DataFrame from sqlite3 rows. Columns without a value to infer
+    a type from, in an empty result or holding only NULLs, get their declared
+    type from `column_types()`, a callable returning the types by column name,
+    so a result has the same schema with or without rows. Columns it does not
+    know, e.g. computed ones, are typed as strings.
+    """
+    columns = [description[0] for description in cursor.description]
+    if not rows:
+        declared = column_types() if column_types else {}
+        return pl.DataFrame(schema={column: declared.get(column, pl.Utf8) for column in columns})
+    df = pl.DataFrame(rows, schema=columns, orient="row", infer_schema_length=None)
+    null_columns = [name for name, dtype in df.schema.items() if dtype == pl.Null]
+    if null_columns:
+        declared = column_types() if column_types else {}
+        df = df.with_columns(pl.col(name).cast(declared.get(name, pl.Utf8)) for name in null_columns)
+    return df
+
+
+class UnitOfWork:
+    """State of the transaction a thread has open through `DatabaseInterface.transaction`."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.tables = set()
+        self.depth = 0
+
+
+class GroupCommitWriter:
+    """
+    One thread that runs the write transactions of every caller of a database
+    and commits them together. Transactions queued while the previous batch was
+    committing form the next batch, and with a `window_s` above 0 the batch also
+    waits that long for more (at most `max_batch`). A batch shares one
+    BEGIN IMMEDIATE ... COMMIT and so one WAL append and sync.
+
+    Each transaction runs in a savepoint of its own: an error undoes only that
+    transaction's statements and is raised to its caller, the others still
+    commit. Callers wait on a future that is resolved once the batch committed,
+    so they see the same results and errors as with a transaction of their own.
+    """
+
+    def __init__(self, pool: "ConnectionPool", window_s: float, max_batch: int):
+        self.pool = pool
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue `fn(*args, **kwargs)` to run inside the writer thread's transaction."""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"group-commit:{self.pool.db_name}", daemon=True)
+                self._thread.start()
+            self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _run(self):
+        db = DatabaseInterface(self.pool.db_name, self.pool)
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window_s
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(db, batch)
+
+    def _commit(self, db: "DatabaseInterface", batch):
+        outcomes = []
         try:
-            # Execute the query
-            cursor.execute(query)
-            # Commit the transaction
+            with db.transaction():
+                for future, fn, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        # nested in the batch's transaction, i.e. a savepoint
+                        with db.transaction():
+                            outcomes.append((future, fn(*args, **kwargs), None))
+                    except Exception as error:
+                        outcomes.append((future, None, error))
+        except Exception as error:
+            # the transaction itself failed, nothing of the batch was written
+            own_errors = {future: own_error for future, _, own_error in outcomes}
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(own_errors.get(future) or error)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        """Commit what is queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+
+def transactional(method):
+    """
+    Decorator for handler methods that make several reads and writes through
+    `self.db` which must commit together, e.g. validation followed by a write.
+    The method runs as one `DatabaseInterface.run_in_transaction` call.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.db.run_in_transaction(method, self, *args, **kwargs)
+    return wrapper
+
+
+class DatabaseInterface:
+    def __init__(self, db_name: str, pool: ConnectionPool | None = None):
+        self.db_name = db_name
+        self.pool = pool or get_pool(db_name)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Unit of work shared by every DatabaseInterface of this database on the
+        calling thread. Statements run inside the block, reads included, go to
+        the thread's writer connection within one `BEGIN IMMEDIATE ... COMMIT`,
+        so checks made before a write still hold when it commits. Reads inside
+        the block bypass the result cache and see the block's own writes.
+
+        A nested block becomes a savepoint: an error leaving it undoes only its
+        own statements, an error leaving the outermost block rolls everything back.
+        Yields the writer connection.
+        """
+        unit = getattr(self.pool._local, "unit_of_work", None)
+        if unit is not None:
+            savepoint = f"unit_of_work_{unit.depth}"
+            tables = set(unit.tables)
+            unit.depth += 1
+            unit.conn.execute(f"SAVEPOINT {savepoint}")
+            try:
+                yield unit.conn
+                unit.conn.execute(f"RELEASE {savepoint}")
+            except BaseException:
+                unit.conn.execute(f"ROLLBACK TO {savepoint}")
+                unit.conn.execute(f"RELEASE {savepoint}")
+                # undone writes leave the versions alone
+                unit.tables = tables
+                raise
+            finally:
+                unit.depth -= 1
+            return
+
+        conn = self.pool.writer()
+        unit = UnitOfWork(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        self.pool._local.unit_of_work = unit
+        try:
+            yield conn
+            self._bump_shared_versions(conn, unit.tables)
             conn.commit()
-            conn.close()
-        except Exception:
-            conn.close()
+        except BaseException:
+            conn.rollback()
             raise
+        finally:
+            self.pool._local.unit_of_work = None
+        self.pool.versions.bump(unit.tables)
+
+    def run_in_transaction(self, fn, *args, **kwargs):
+        """
+        Return `fn(*args, **kwargs)` called inside `transaction()`. With group
+        commit enabled and no transaction open on this thread, `fn` runs on the
+        pool's `GroupCommitWriter` thread and its transaction is committed
+        together with the other callers' ones, this thread waits for the commit.
+        """
+        group_commit = self.pool.group_commit
+        if group_commit is not None and getattr(self.pool._local, "unit_of_work", None) is None:
+            # the wait for the batch to commit counts as database time of this request
+            with metrics.timed("db"):
+                return group_commit.submit(fn, *args, **kwargs).result()
+        with self.transaction():
+            return fn(*args, **kwargs)
+
+    def _execute(self, statements, caller: str, many: bool = False):
+        # runs inside transaction(), returns the rowcount of the last statement
+        unit = self.pool._local.unit_of_work
+        rowcount = 0
+        for query, params in statements:
+            start = time.perf_counter()
+            cursor = unit.conn.executemany(query, params) if many else unit.conn.execute(query, params)
+            rowcount = cursor.rowcount
+            elapsed = time.perf_counter() - start
+            metrics.add_time("db", elapsed)
+            unit.tables |= written_tables(query)
+            if many:
+                # the plan of the first parameter tuple stands for all, a generator is already consumed
+                params = params[0] if isinstance(params, (list, tuple)) and params else None
+            self._observe(unit.conn, query, params, caller, elapsed, max(rowcount, 0))
+        return rowcount
+
+    def _observe(self, conn, query: str, params, caller: str, elapsed: float, rows: int):
+        normalized = normalize_sql(query)
+        QUERY_DURATION.labels(normalized, caller).observe(elapsed)
+        QUERY_ROWS.labels(normalized, caller).observe(rows)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            # bound values are left out of the log, they are payroll data
+            entry = {
+                "query": normalized,
+                "caller": caller,
+                "duration_ms": round(elapsed * 1000, 3),
+                "rows": rows,
+                "plan": explain(conn, query, params),
+                "at": time.time(),
+            }
+            self.pool.slow_queries.append(entry)
+            slow_query_logger.warning(
+                "slow query in %s took %.1f ms for %d rows: %s plan: %s",
+                caller, entry["duration_ms"], rows, normalized, " | ".join(entry["plan"]),
+            )
+
+    def execute_with_auto_commit(self, query: str, params=()):
+        """
+        Run a write statement and commit it, or leave it to the enclosing
+        `transaction()`. Values must be passed through `params` and referenced
+        with `?` placeholders so the compiled statement is reused.
+        Returns the number of rows the statement changed.
+        """
+        return self.run_in_transaction(self._execute, [(query, params)], calling_method())
+
+    def execute_statements_with_auto_commit(self, statements):
+        """Run a list of (query, params) write statements in order inside a single transaction."""
+        self.run_in_transaction(self._execute, statements, calling_method())
+
+    def execute_many(self, query: str, seq_of_params):
+        """Run one write statement for every parameter tuple inside a single transaction."""
+        return self.run_in_transaction(self._execute, [(query, seq_of_params)], calling_method(), many=True)
+
+    def _bump_shared_versions(self, conn, tables):
+        # part of the writing transaction, other processes never see the data without the new versions
+        shared = self.pool.versions.shared_tables(tables)
+        if shared:
+            conn.execute(BUMP_TABLE_VERSIONS_QUERY, (json.dumps(shared),))
+
+    def execute_select_query(self, query: str, params=(), cache: bool = True):
+        """
+        Run a select query on the reader connection and return a Polars DataFrame.
+        Results are served from the pool's result cache until one of the tables
+        the query reads is written, pass `cache=False` to always read.
+        Inside a `transaction()` the query runs on its connection, uncached.
+        """
+        unit = getattr(self.pool._local, "unit_of_work", None)
+        if unit is not None:
+            return self._fetch(unit.conn, query, params)
+        tables = read_tables(query) if cache else None
+        if tables:
+            key = (normalize_sql(query), params_key(params))
+            # versions are taken before reading, a write racing the read leaves the entry already stale
+            versions = self.pool.versions.get(tables)
+            cached = self.pool.result_cache.get(key, versions)
+            if cached is not None:
+                return cached
+        res = self._fetch(self.pool.reader(), query, params)
+        if tables:
+            self.pool.result_cache.put(key, res, tables, versions)
+        return res
+
+    def _fetch(self, conn, query: str, params):
+        start = time.perf_counter()
+        cursor = conn.execute(query, params)
+        try:
+            rows = cursor.fetchall()
+            elapsed = time.perf_counter() - start
+            metrics.add_time("db", elapsed)
+            self._observe(conn, query, params, calling_method(), elapsed, len(rows))
+            return frame_from_cursor(cursor, rows, lambda: self.pool.column_types(conn))
+        finally:
+            cursor.close()
+
+    def stream_select_query(self, query: str, params=(), batch_size: int = STREAM_BATCH_ROWS):
+        """
+        Yield the result of a select query as Polars DataFrames of at most
+        `batch_size` rows, so only one batch is held in memory at a time.
+        The whole result is read from one snapshot on a dedicated connection,
+        the generator may be advanced from any thread.
+        """
+        caller = calling_method()
+        conn = self.pool.dedicated_reader()
+        try:
+            # only the time spent in SQLite counts, not the time the consumer holds a batch
+            start = time.perf_counter()
+            cursor = conn.execute(query, params)
+            elapsed = time.perf_counter() - start
+            metrics.add_time("db", elapsed)
+            count = 0
+            while True:
+                start = time.perf_counter()
+                rows = cursor.fetchmany(batch_size)
+                fetched = time.perf_counter() - start
+                # batches are fetched from whichever request context advances the stream
+                metrics.add_time("db", fetched)
+                elapsed += fetched
+                if not rows:
+                    break
+                count += len(rows)
+                yield frame_from_cursor(cursor, rows, lambda: self.pool.column_types(conn))
+            self._observe(conn, query, params, caller, elapsed, count)
+        finally:
+            conn.close()
 
-    def execute_select_query(self, query: str):
-        # Use ConnectorX to execute the SELECT query
-        result = cx.read_sql(f'sqlite://{self.db_name}', query, return_type="polars2")
-        return result
+    def get_table_columns(self, table_name: str):
+        """Column names of a table in declaration order."""
+        return [row[1] for row in self.pool.reader().execute(f"PRAGMA table_info({table_name})")]
 
 # Example usage
 if __name__ == "__main__":
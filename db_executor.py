@@ -0,0 +1,137 @@
+"""
+Runs the blocking sqlite3/Polars work of data_handler.py off the event loop.
+
+Requests are split into lanes, each with its own thread pool, concurrency limit
+and queue depth, so slow report queries can only ever occupy the report lane
+while point lookups and writes keep flowing through theirs.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Request
+
+import metrics
+import profiling
+
+
+POINT_LANE = "point"
+REPORT_LANE = "report"
+
+LANE_LIMITS = {
+    POINT_LANE: (
+        int(os.environ.get("DB_POINT_CONCURRENCY", "8")),
+        int(os.environ.get("DB_POINT_QUEUE_DEPTH", "64")),
+    ),
+    REPORT_LANE: (
+        int(os.environ.get("DB_REPORT_CONCURRENCY", "2")),
+        int(os.environ.get("DB_REPORT_QUEUE_DEPTH", "16")),
+    ),
+}
+
+
+_EXHAUSTED = object()
+
+
+def _call_in_request(fn, args, kwargs):
+    # runs on a lane thread, in a copy of the request's context
+    with profiling.attached():
+        # the call's time outside SQLite and serialization is building and transforming frames
+        return metrics.time_remainder("polars", fn, *args, **kwargs)
+
+
+class LaneOverloaded(HTTPException):
+    def __init__(self, lane: str):
+        super().__init__(status_code=503, detail=f"Too many pending {lane} requests, retry shortly", headers={"Retry-After": "1"})
+
+
+class ExecutionLane:
+    """
+    A bounded thread pool plus admission control.
+
+    Attributes:
+    -----------
+    name : str
+        Lane name, used for thread names and error messages.
+    concurrency : int
+        Maximum number of calls running at once.
+    max_queue_depth : int
+        Maximum number of requests allowed to wait for a free slot, further
+        requests are rejected with a 503 instead of piling up.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue_depth: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue_depth = max_queue_depth
+        self.waiting = 0
+        self.running = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"db-{name}")
+
+    async def acquire(self, admitted: bool = False):
+        # an admitted request already passed the queue check once and is never rejected mid-response
+        if not admitted and self._semaphore.locked() and self.waiting >= self.max_queue_depth:
+            raise LaneOverloaded(self.name)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._semaphore.release()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call on the lane's thread pool, the caller must hold a slot."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, _call_in_request, fn, args, kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def iterate(self, generator):
+        """
+        Advance a blocking generator on the lane's thread pool and yield its items.
+
+        Streaming response bodies are consumed after the route returned and its
+        lane_slot was released, so the iteration holds a slot of its own for as
+        long as the stream runs.
+        """
+        await self.acquire(admitted=True)
+        try:
+            while True:
+                item = await self.run(next, generator, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    break
+                yield item
+        finally:
+            self.release()
+            try:
+                generator.close()
+            except ValueError:
+                # still running on a worker after the client went away, it finishes and is collected later
+                pass
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def create_lanes() -> dict:
+    return {name: ExecutionLane(name, concurrency, depth) for name, (concurrency, depth) in LANE_LIMITS.items()}
+
+
+def lane_slot(name: str):
+    """
+    FastAPI dependency that reserves a slot in the named lane for the duration
+    of the request and hands the lane to the route.
+    """
+    async def dependency(request: Request):
+        lane = request.app.state.lanes[name]
+        await lane.acquire()
+        try:
+            yield lane
+        finally:
+            lane.release()
+    return dependency
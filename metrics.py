@@ -0,0 +1,232 @@
+"""
+In-process metrics shared by the database layer and the app.
+
+Histograms keep cumulative bucket counts like Prometheus histograms do, so a
+percentile is estimated from the buckets without storing every observation.
+Metrics are registered once per process with `histogram`, `counter` or `gauge`
+and are grouped by label values, e.g.
+`QUERY_DURATION.labels(query, caller).observe(seconds)`, and exported with
+`render_prometheus`.
+
+The time a request spends in each phase (database, Polars, serialization) is
+added up with `add_time` / `timed` in a dict carried by a context variable,
+which the lanes copy into their worker threads.
+"""
+import bisect
+import contextlib
+import contextvars
+import math
+import threading
+import time
+
+# upper bounds in seconds, from 0.1 ms statements to 10 s reports
+LATENCY_BUCKETS_S = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# upper bounds for row counts
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+# upper bounds for body sizes in bytes
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# seconds per phase of the request being handled, None outside of requests
+request_phases = contextvars.ContextVar("request_phases", default=None)
+
+
+class Histogram:
+    """Observations counted into fixed buckets, safe to update from any thread."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_S):
+        self.buckets = tuple(buckets)
+        # the last slot counts observations above the largest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Estimate the q-quantile by interpolating inside the bucket it falls in,
+        observations above the largest bound are reported as that bound.
+        """
+        with self._lock:
+            counts, count = list(self.counts), self.count
+        if count == 0:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def cumulative(self):
+        """(upper bound, observations at or below it) pairs, ending with +Inf."""
+        with self._lock:
+            counts = list(self.counts)
+        total = 0
+        pairs = []
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            total += bucket_count
+            pairs.append((bound, total))
+        return pairs
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Value:
+    """A counter or gauge value, safe to update from any thread."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+
+class MetricFamily:
+    """One histogram, counter or gauge per combination of label values."""
+
+    def __init__(self, kind: str, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS_S):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = Histogram(self.buckets) if self.kind == "histogram" else Value()
+        return child
+
+    def items(self):
+        """(label values, histogram or value) pairs."""
+        with self._lock:
+            return list(self._children.items())
+
+    def clear(self):
+        with self._lock:
+            self._children.clear()
+
+
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+def _register(kind: str, name: str, help: str, labelnames, buckets=LATENCY_BUCKETS_S) -> MetricFamily:
+    with _registry_lock:
+        family = REGISTRY.get(name)
+        if family is None:
+            family = REGISTRY[name] = MetricFamily(kind, name, help, labelnames, buckets)
+        return family
+
+
+def histogram(name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS_S) -> MetricFamily:
+    """Return the process-wide histogram `name`, registering it on first use."""
+    return _register("histogram", name, help, labelnames, buckets)
+
+
+def counter(name: str, help: str, labelnames=()) -> MetricFamily:
+    """Return the process-wide counter `name`, registering it on first use."""
+    return _register("counter", name, help, labelnames)
+
+
+def gauge(name: str, help: str, labelnames=()) -> MetricFamily:
+    """Return the process-wide gauge `name`, registering it on first use."""
+    return _register("gauge", name, help, labelnames)
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        families = sorted(REGISTRY.values(), key=lambda family: family.name)
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for values, child in family.items():
+            if family.kind != "histogram":
+                lines.append(f"{family.name}{_format_labels(family.labelnames, values)} {_format_number(child.value)}")
+                continue
+            for bound, count in child.cumulative():
+                labels = _format_labels(family.labelnames + ("le",), values + (_format_number(bound),))
+                lines.append(f"{family.name}_bucket{labels} {count}")
+            labels = _format_labels(family.labelnames, values)
+            lines.append(f"{family.name}_sum{labels} {_format_number(child.sum)}")
+            lines.append(f"{family.name}_count{labels} {child.count}")
+    return "\n".join(lines) + "\n"
+
+
+def add_time(phase: str, seconds: float):
+    """Add `seconds` to a phase of the current request, a no-op outside of requests."""
+    phases = request_phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def timed(phase: str):
+    """Add the duration of the block to a phase of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(phase, time.perf_counter() - start)
+
+
+def time_remainder(phase: str, fn, *args, **kwargs):
+    """
+    Call `fn` and add the part of its duration that no phase timed inside it
+    claimed to `phase`, e.g. a handler's time outside SQLite and serialization.
+    """
+    phases = request_phases.get()
+    if phases is None:
+        return fn(*args, **kwargs)
+    claimed = sum(phases.values())
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        nested = sum(phases.values()) - claimed
+        add_time(phase, max(time.perf_counter() - start - nested, 0.0))
@@ -0,0 +1,295 @@
+"""
+Schema migrations for the SQLite database. Each migration runs exactly once,
+in order, and the applied version is tracked in PRAGMA user_version. Run
+`migrate` once at process start, never from the request path.
+"""
+from database_interface import VERSION_EPOCH_KEY, DatabaseInterface
+
+# tables whose writes are counted in table_versions
+VERSIONED_TABLES = ("employees", "own_companies", "salaries", "salary_lines", "works", "bus_types", "company_payment_rollup")
+
+
+def create_base_tables(conn):
+    conn.execute("""
+            CREATE TABLE IF NOT EXISTS employees (
+            employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            full_name TEXT,
+            created_at TEXT,
+            phone_no TEXT,
+            address TEXT,
+            designation TEXT,
+            description TEXT
+            );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employee_id ON employees(employee_id);")
+
+    conn.execute("""
+            CREATE TABLE IF NOT EXISTS own_companies (
+            company_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_name TEXT,
+            created_at TEXT,
+            phone_no TEXT,
+            address TEXT,
+            alternate_phone_no TEXT,
+            mail_id TEXT,
+            type_of_company TEXT,
+            gst_no TEXT,
+            pan_no TEXT,
+            bank_name TEXT,
+            bank_branch TEXT,
+            bank_ifsc_code TEXT,
+            account_no TEXT,
+            account_owner_name TEXT,
+            date_of_establishment TEXT,
+            description TEXT
+            );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_company_name ON own_companies(company_name);")
+
+    conn.execute("""
+            CREATE TABLE IF NOT EXISTS salaries (
+            salary_entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payment INTEGER,
+            record_date TEXT,
+            employee_id INTEGER,
+            type_of_work TEXT,
+            type_of_payment TEXT,
+            mode_of_payment TEXT,
+            company TEXT,
+            work_ids TEXT,
+            costs TEXT,
+            quantities TEXT,
+            work_done INTEGER,
+            created_at TEXT
+            );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salary_entry_id ON salaries(salary_entry_id);")
+
+    conn.execute("""
+            CREATE TABLE IF NOT EXISTS works (
+            work_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            work_name TEXT,
+            bus_type TEXT,
+            cost INTEGER,
+            description TEXT
+            );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_work_id ON works(work_id);")
+
+    conn.execute("""
+            CREATE TABLE IF NOT EXISTS bus_types (
+            bus_type_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bus_type TEXT
+            );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bus_type_id ON bus_types(bus_type_id);")
+
+
+def reconcile_salary_columns(conn):
+    # databases created by older builds stored the work ids in a `works` column
+    # and had a `type_of_work` column that newer builds never created
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(salaries)")]
+    if "works" in columns and "work_ids" not in columns:
+        conn.execute("ALTER TABLE salaries RENAME COLUMN works TO work_ids")
+    if "type_of_work" not in columns:
+        conn.execute("ALTER TABLE salaries ADD COLUMN type_of_work TEXT")
+
+
+def normalize_salary_lines(conn):
+    # one row per work line instead of three parallel JSON arrays on the salary entry
+    conn.execute("""
+            CREATE TABLE IF NOT EXISTS salary_lines (
+            salary_entry_id INTEGER NOT NULL REFERENCES salaries(salary_entry_id) ON DELETE CASCADE,
+            line_no INTEGER NOT NULL,
+            work_id INTEGER,
+            cost INTEGER,
+            quantity INTEGER,
+            PRIMARY KEY (salary_entry_id, line_no)
+            ) WITHOUT ROWID;
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salary_lines_work_id ON salary_lines(work_id);")
+
+    # a line exists wherever any of the three arrays has an element, malformed arrays count as empty
+    conn.execute("""
+        WITH s AS (
+            SELECT salary_entry_id,
+                CASE WHEN json_valid(work_ids) THEN work_ids ELSE '[]' END AS work_ids,
+                CASE WHEN json_valid(costs) THEN costs ELSE '[]' END AS costs,
+                CASE WHEN json_valid(quantities) THEN quantities ELSE '[]' END AS quantities
+            FROM salaries
+        ), k AS (
+            SELECT salary_entry_id, key AS line_no FROM s, json_each(s.work_ids)
+            UNION SELECT salary_entry_id, key FROM s, json_each(s.costs)
+            UNION SELECT salary_entry_id, key FROM s, json_each(s.quantities)
+        )
+        INSERT INTO salary_lines (salary_entry_id, line_no, work_id, cost, quantity)
+        SELECT s.salary_entry_id, k.line_no,
+            json_extract(s.work_ids, '$[' || k.line_no || ']'),
+            json_extract(s.costs, '$[' || k.line_no || ']'),
+            json_extract(s.quantities, '$[' || k.line_no || ']')
+        FROM s JOIN k ON k.salary_entry_id = s.salary_entry_id
+    """)
+    for column in ("work_ids", "costs", "quantities"):
+        conn.execute(f"ALTER TABLE salaries DROP COLUMN {column}")
+
+
+def index_access_paths(conn):
+    # indexes on INTEGER PRIMARY KEY columns duplicate the rowid b-tree
+    for index in ("idx_salary_entry_id", "idx_employee_id", "idx_work_id", "idx_bus_type_id"):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+
+    # company filters and the per-company payment summary, covering SUM/AVG/MIN/MAX without touching the table
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salaries_company_payment ON salaries(company, payment, work_done);")
+    # employee_id alone and employee_id AND company
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salaries_employee_company ON salaries(employee_id, company);")
+    # duplicate-name checks
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_full_name ON employees(full_name);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_works_work_name ON works(work_name);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bus_types_bus_type ON bus_types(bus_type);")
+    conn.execute("ANALYZE;")
+
+
+def create_company_payment_rollup(conn):
+    # per-company running totals so the payment summary is a primary-key lookup;
+    # sums and counts move incrementally, MIN/MAX are re-read from the indexes
+    # whenever a row leaves a company so they stay exact after deletes
+    conn.execute("""
+            CREATE TABLE IF NOT EXISTS company_payment_rollup (
+            company TEXT PRIMARY KEY,
+            payment_count INTEGER NOT NULL DEFAULT 0,
+            payment_sum INTEGER NOT NULL DEFAULT 0,
+            payment_max INTEGER,
+            payment_min INTEGER,
+            work_done_count INTEGER NOT NULL DEFAULT 0,
+            work_done_sum INTEGER NOT NULL DEFAULT 0,
+            work_done_max INTEGER,
+            work_done_min INTEGER
+            );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salaries_company_work_done ON salaries(company, work_done);")
+
+    conn.execute("""
+        INSERT INTO company_payment_rollup
+        SELECT company, COUNT(payment), COALESCE(SUM(payment), 0), MAX(payment), MIN(payment),
+        COUNT(work_done), COALESCE(SUM(work_done), 0), MAX(work_done), MIN(work_done)
+        FROM salaries GROUP BY company
+    """)
+
+    add_new_row = """
+        INSERT INTO company_payment_rollup (company, payment_count, payment_sum, payment_max, payment_min,
+            work_done_count, work_done_sum, work_done_max, work_done_min)
+        VALUES (NEW.company, NEW.payment IS NOT NULL, COALESCE(NEW.payment, 0), NEW.payment, NEW.payment,
+            NEW.work_done IS NOT NULL, COALESCE(NEW.work_done, 0), NEW.work_done, NEW.work_done)
+        ON CONFLICT(company) DO UPDATE SET
+            payment_count = payment_count + excluded.payment_count,
+            payment_sum = payment_sum + excluded.payment_sum,
+            payment_max = CASE WHEN payment_max IS NULL OR excluded.payment_max > payment_max THEN COALESCE(excluded.payment_max, payment_max) ELSE payment_max END,
+            payment_min = CASE WHEN payment_min IS NULL OR excluded.payment_min < payment_min THEN COALESCE(excluded.payment_min, payment_min) ELSE payment_min END,
+            work_done_count = work_done_count + excluded.work_done_count,
+            work_done_sum = work_done_sum + excluded.work_done_sum,
+            work_done_max = CASE WHEN work_done_max IS NULL OR excluded.work_done_max > work_done_max THEN COALESCE(excluded.work_done_max, work_done_max) ELSE work_done_max END,
+            work_done_min = CASE WHEN work_done_min IS NULL OR excluded.work_done_min < work_done_min THEN COALESCE(excluded.work_done_min, work_done_min) ELSE work_done_min END;
+    """
+    remove_old_row = """
+        UPDATE company_payment_rollup SET
+            payment_count = payment_count - (OLD.payment IS NOT NULL),
+            payment_sum = payment_sum - COALESCE(OLD.payment, 0),
+            payment_max = (SELECT MAX(payment) FROM salaries WHERE company = OLD.company),
+            payment_min = (SELECT MIN(payment) FROM salaries WHERE company = OLD.company),
+            work_done_count = work_done_count - (OLD.work_done IS NOT NULL),
+            work_done_sum = work_done_sum - COALESCE(OLD.work_done, 0),
+            work_done_max = (SELECT MAX(work_done) FROM salaries WHERE company = OLD.company),
+            work_done_min = (SELECT MIN(work_done) FROM salaries WHERE company = OLD.company)
+        WHERE company = OLD.company;
+    """
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_salaries_rollup_insert AFTER INSERT ON salaries BEGIN {add_new_row} END;")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_salaries_rollup_delete AFTER DELETE ON salaries BEGIN {remove_old_row} END;")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_salaries_rollup_update AFTER UPDATE OF company, payment, work_done ON salaries
+        BEGIN {remove_old_row} {add_new_row} END;
+    """)
+
+
+def track_table_versions(conn):
+    # a write counter per table, bumped by DatabaseInterface inside every writing
+    # transaction so each process sharing the file can tell which of its cached
+    # reads went stale, see TableVersions
+    conn.execute("""
+            CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+    """)
+    conn.execute("INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, abs(random()))", (VERSION_EPOCH_KEY,))
+    for table in VERSIONED_TABLES:
+        conn.execute("INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)", (table,))
+
+
+# name columns that identify a row, (table, key column, name column, index replaced by the unique one)
+UNIQUE_NAMES = (
+    ("employees", "employee_id", "full_name", "idx_employees_full_name"),
+    ("own_companies", "company_id", "company_name", "idx_company_name"),
+    ("works", "work_id", "work_name", "idx_works_work_name"),
+    ("bus_types", "bus_type_id", "bus_type", "idx_bus_types_bus_type"),
+)
+
+
+def enforce_unique_names(conn):
+    # older builds only checked names with a SELECT before writing, so racing
+    # requests could store duplicates: the first row keeps the name, later ones
+    # get their id appended, then the database rejects duplicates itself
+    for table, key_column, name_column, old_index in UNIQUE_NAMES:
+        duplicates = conn.execute(f"""
+            SELECT {key_column}, {name_column} FROM {table}
+            WHERE {name_column} IS NOT NULL
+            AND {key_column} NOT IN (SELECT MIN({key_column}) FROM {table} GROUP BY {name_column})
+            ORDER BY {key_column}
+        """).fetchall()
+        for key, name in duplicates:
+            # a real row may already be called "name (id)", a counter is added until the name is free
+            renamed, attempt = f"{name} ({key})", 1
+            while conn.execute(f"SELECT 1 FROM {table} WHERE {name_column} = ?", (renamed,)).fetchone():
+                attempt += 1
+                renamed = f"{name} ({key}-{attempt})"
+            conn.execute(f"UPDATE {table} SET {name_column} = ? WHERE {key_column} = ?", (renamed, key))
+        conn.execute(f"DROP INDEX IF EXISTS {old_index}")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_{name_column} ON {table}({name_column});")
+
+
+MIGRATIONS = [
+    create_base_tables,
+    reconcile_salary_columns,
+    normalize_salary_lines,
+    index_access_paths,
+    create_company_payment_rollup,
+    track_table_versions,
+    enforce_unique_names,
+]
+
+
+def get_schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_name: str) -> int:
+    """
+    Apply every pending migration, each in its own transaction.
+
+    Returns:
+    --------
+    int:
+        The schema version after migrating.
+    """
+    conn = DatabaseInterface(db_name).pool.writer()
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # re-read inside the write lock so concurrent workers don't apply a step twice
+            if get_schema_version(conn) < version:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return get_schema_version(conn)
@@ -0,0 +1,185 @@
+"""
+Opt-in profiling of single requests.
+
+With PROFILE_TOKEN set, a request sent with `X-Profile: <token>` runs under a
+stack sampler. The sampler reads the stacks of the threads working on that
+request: the event loop thread, and each lane worker while it runs one of the
+request's calls. The samples are stored as collapsed stacks, one
+`frame;frame;frame count` line per distinct stack, the input format of
+flamegraph.pl, speedscope and inferno. The response names the profile in its
+X-Profile-Id header and `/profiles/{id}` returns it to holders of the token.
+
+Without PROFILE_TOKEN, or without the header, a request pays for one
+attribute check in the middleware and one context variable lookup per lane call.
+"""
+import contextlib
+import contextvars
+import hmac
+import os
+import re
+import sys
+import threading
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_HEADER = b"x-profile"
+# time between two samples of the profiled threads
+PROFILE_INTERVAL_S = float(os.environ.get("PROFILE_INTERVAL_MS", "1")) / 1000
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+# older profiles are deleted once there are more than this many
+PROFILE_KEEP = 50
+
+PROFILE_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# the sampler of the request being handled, None unless it is profiled
+current_sampler = contextvars.ContextVar("current_sampler", default=None)
+
+
+def collapse(frame) -> str:
+    """The stack ending in `frame` as `file:function` names from the outermost call in."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples the stacks of the attached threads from a background thread."""
+
+    def __init__(self, interval_s: float = PROFILE_INTERVAL_S):
+        self.interval_s = interval_s
+        self.samples = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def attach(self):
+        """Sample the calling thread until `detach`, calls may nest."""
+        thread = threading.current_thread()
+        with self._lock:
+            name, depth = self._threads.get(thread.ident, (thread.name, 0))
+            self._threads[thread.ident] = (name, depth + 1)
+
+    def detach(self):
+        ident = threading.get_ident()
+        with self._lock:
+            name, depth = self._threads[ident]
+            if depth == 1:
+                del self._threads[ident]
+            else:
+                self._threads[ident] = (name, depth - 1)
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            threads = list(self._threads.items())
+        for ident, (name, _) in threads:
+            frame = frames.get(ident)
+            if frame is not None:
+                stack = f"{name};{collapse(frame)}"
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def _run(self):
+        # sample before the first wait, so every profile holds at least one sample
+        self.sample()
+        while not self._stopped.wait(self.interval_s):
+            self.sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+@contextlib.contextmanager
+def attached():
+    """Sample the calling thread while it works for the current request, if that is profiled."""
+    sampler = current_sampler.get()
+    if sampler is None:
+        yield
+        return
+    sampler.attach()
+    try:
+        yield
+    finally:
+        sampler.detach()
+
+
+def authorized(token: str | None) -> bool:
+    if PROFILE_TOKEN is None or token is None:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+def save_profile(profile_id: str, collapsed: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.folded"), "w") as file:
+        file.write(collapsed)
+    profiles = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".folded")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:-PROFILE_KEEP]:
+        os.remove(entry.path)
+
+
+def finish_profile(sampler: StackSampler, profile_id: str):
+    sampler.stop()
+    save_profile(profile_id, sampler.collapsed())
+
+
+def load_profile(profile_id: str) -> str | None:
+    """A stored profile in collapsed stack format, None for unknown ids."""
+    if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.folded")) as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests that carry the profile token."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if PROFILE_TOKEN is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = dict(scope["headers"]).get(PROFILE_HEADER)
+        if token is None or not authorized(token.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode("latin-1"))]}
+            await send(message)
+
+        sampler = StackSampler()
+        context_token = current_sampler.set(sampler)
+        # the event loop thread also runs other requests, their code shows up in its samples
+        sampler.attach()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.detach()
+            current_sampler.reset(context_token)
+            # joining the sampler and writing and pruning the profile directory would block every request on the loop
+            await run_in_threadpool(finish_profile, sampler, profile_id)
@@ -0,0 +1,92 @@
+"""
+Per-route request metrics for the app, exported by `/metrics`.
+
+`MetricsMiddleware` counts requests by route and status, observes their
+latency and response sizes, tracks the requests in flight and breaks each
+request down into the time it spent in SQLite, in Polars and in serialization.
+The breakdown of a request is also sent back in its Server-Timing header.
+
+Routes are labelled with their path template rather than the requested path,
+paths no route matches share the `unmatched` label, so the number of label
+values stays bounded whatever clients request.
+"""
+import time
+
+from starlette.routing import Match
+
+import metrics
+
+PHASES = ("db", "polars", "serialization")
+
+REQUESTS = metrics.counter("http_requests_total", "Requests answered, by route and status.", ("method", "route", "status"))
+REQUEST_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the end of its body.", ("method", "route"),
+)
+IN_FLIGHT = metrics.gauge("http_requests_in_flight", "Requests being handled.", ("method", "route"))
+RESPONSE_SIZE = metrics.histogram(
+    "http_response_size_bytes", "Response body sizes as sent, after compression.", ("method", "route"), metrics.SIZE_BUCKETS,
+)
+REQUEST_PHASES = metrics.histogram(
+    "http_request_phase_seconds", "Time a request spent in SQLite, in Polars and in serialization.", ("method", "route", "phase"),
+)
+
+
+def route_template(scope) -> str:
+    """The path template of the route that will handle the request."""
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+
+def server_timing(phases: dict) -> str:
+    return ", ".join(f"{phase};dur={phases.get(phase, 0.0) * 1000:.3f}" for phase in PHASES)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the metrics above for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = route_template(scope)
+        # a fresh dict per request, the lanes' worker threads add to it through the copied context
+        phases = {}
+        token = metrics.request_phases.set(phases)
+        in_flight = IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        status = 500
+        size = 0
+        start = time.perf_counter()
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # streamed bodies are still being produced, their header only covers the work done so far
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(phases).encode("latin-1")))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            metrics.request_phases.reset(token)
+            in_flight.dec()
+            REQUESTS.labels(method, route, str(status)).inc()
+            REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - start)
+            RESPONSE_SIZE.labels(method, route).observe(size)
+            for phase in PHASES:
+                REQUEST_PHASES.labels(method, route, phase).observe(phases.get(phase, 0.0))
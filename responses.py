@@ -0,0 +1,223 @@
+"""
+JSON responses written straight from Polars frames.
+
+Returning `df.to_dicts()` from a route builds a Python dict per row, which
+FastAPI then walks again with `jsonable_encoder` before encoding it. Routes
+that return a `FrameJSONResponse` hand over the frame itself and Polars writes
+the rows as JSON from its Arrow buffers, only the small envelope around the
+rows goes through the json module.
+
+Listings that are only loaded back into DataFrames can also be negotiated as
+Arrow IPC, Parquet or NDJSON with `frame_response`, and listings too large to
+hold in memory are streamed batch by batch with `stream_frames_response`.
+
+GET routes are made conditional with `conditional_get` and `tagged`.
+"""
+import hashlib
+import io
+import json
+
+import polars as pl
+from fastapi import Header, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from metrics import timed
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+COMPRESSIONS = ("gzip", "zstd")
+# codecs each binary format can apply internally, everything else is sent with a Content-Encoding
+NATIVE_COMPRESSIONS = {"arrow": ("zstd",), "parquet": ("gzip", "zstd")}
+# rows per NDJSON chunk, the whole listing is never encoded at once
+NDJSON_CHUNK_ROWS = 10_000
+# formats that can be written one batch at a time without knowing the full schema upfront
+STREAMING_FORMATS = ("json", "ndjson")
+
+
+def frame_to_json(df: pl.DataFrame) -> bytes:
+    """The rows of a frame as a JSON array of objects, the same shape as `df.to_dicts()`."""
+    buffer = io.BytesIO()
+    df.write_json(buffer, row_oriented=True)
+    return buffer.getvalue()
+
+
+class FrameJSONResponse(Response):
+    """
+    A JSON object response whose DataFrame values are serialized by Polars, e.g.
+    `FrameJSONResponse({"salary_entries": df, "key": key, "token": token})`.
+    The body is encoded when the response is constructed, so routes build it
+    through `lane.run` to keep the encoding off the event loop.
+    """
+    media_type = "application/json"
+
+    def render(self, content: dict) -> bytes:
+        with timed("serialization"):
+            members = []
+            for name, value in content.items():
+                if isinstance(value, pl.DataFrame):
+                    encoded = frame_to_json(value)
+                else:
+                    encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                members.append(json.dumps(name).encode("utf-8") + b":" + encoded)
+            return b"{" + b",".join(members) + b"}"
+
+
+def negotiate_format(format: str | None, accept: str | None) -> str:
+    """
+    Pick the response format from an explicit `format=` value, else from the
+    first Accept media type we can produce, else JSON.
+    """
+    if format:
+        if format not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported format {format}, expected one of {', '.join(MEDIA_TYPES)}")
+        return format
+    by_media_type = {media_type: name for name, media_type in MEDIA_TYPES.items()}
+    by_media_type["application/x-parquet"] = "parquet"
+    by_media_type["application/vnd.apache.arrow.file"] = "arrow"
+    for media_range in (accept or "").split(","):
+        name = by_media_type.get(media_range.split(";")[0].strip().lower())
+        if name:
+            return name
+    return "json"
+
+
+def encoder(compression: str | None):
+    """A bytes -> bytes function applying the codec, the identity without one."""
+    if compression is None:
+        return lambda chunk: chunk
+    import pyarrow as pa
+    codec = pa.Codec(compression)
+
+    def encode(chunk: bytes) -> bytes:
+        # every chunk becomes a complete gzip member / zstd frame, concatenations of those are valid streams
+        with timed("serialization"):
+            return codec.compress(chunk, asbytes=True)
+    return encode
+
+
+def frame_response(name: str, df: pl.DataFrame, format: str = "json", compression: str | None = None, **envelope) -> Response:
+    """
+    Encode a listing in the negotiated format.
+
+    JSON keeps the `{name: rows, **envelope}` object the routes always returned.
+    The other formats carry only the rows, a `next_after` cursor in the
+    envelope is sent as the X-Next-After header instead.
+    """
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression {compression}, expected one of {', '.join(COMPRESSIONS)}")
+    headers = {}
+    if envelope.get("next_after") is not None and format != "json":
+        headers["X-Next-After"] = str(envelope["next_after"])
+    native = compression in NATIVE_COMPRESSIONS.get(format, ())
+    if compression is not None and not native:
+        headers["Content-Encoding"] = compression
+    encode = encoder(None if native else compression)
+
+    if format == "json":
+        body = FrameJSONResponse({name: df, **envelope}).body
+        return Response(encode(body), media_type=MEDIA_TYPES[format], headers=headers)
+    if format == "ndjson":
+        def chunks():
+            for offset in range(0, len(df), NDJSON_CHUNK_ROWS):
+                buffer = io.BytesIO()
+                with timed("serialization"):
+                    df.slice(offset, NDJSON_CHUNK_ROWS).write_ndjson(buffer)
+                yield encode(buffer.getvalue())
+        return StreamingResponse(chunks(), media_type=MEDIA_TYPES[format], headers=headers)
+
+    buffer = io.BytesIO()
+    with timed("serialization"):
+        if format == "arrow":
+            df.write_ipc_stream(buffer, compression=compression if native else "uncompressed")
+        else:
+            df.write_parquet(buffer, compression=compression if native else "uncompressed")
+    return Response(encode(buffer.getvalue()), media_type=MEDIA_TYPES[format], headers=headers)
+
+
+def stream_frames_response(name: str, batches, format: str = "json", compression: str | None = None, iterate=None, **envelope) -> StreamingResponse:
+    """
+    Stream a generator of DataFrame batches as JSON, shaped exactly like
+    `frame_response` would shape the whole listing, or as NDJSON. Only one
+    batch is read and encoded at a time.
+
+    `iterate` turns the blocking generator of encoded chunks into the response
+    body, e.g. `lane.iterate` to read and encode on a lane's threads. By default
+    Starlette runs it in its own thread pool.
+    """
+    if format not in STREAMING_FORMATS:
+        raise ValueError(f"Streaming supports {', '.join(STREAMING_FORMATS)}, not {format}")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression {compression}, expected one of {', '.join(COMPRESSIONS)}")
+    headers = {"Content-Encoding": compression} if compression else {}
+    encode = encoder(compression)
+
+    def ndjson_chunks():
+        for df in batches:
+            buffer = io.BytesIO()
+            with timed("serialization"):
+                df.write_ndjson(buffer)
+            yield encode(buffer.getvalue())
+
+    def json_chunks():
+        yield encode(b"{" + json.dumps(name).encode("utf-8") + b":[")
+        first = True
+        for df in batches:
+            if df.is_empty():
+                continue
+            # each batch is a JSON array, its rows are spliced into the one open array
+            with timed("serialization"):
+                rows = frame_to_json(df)[1:-1]
+            yield encode(rows if first else b"," + rows)
+            first = False
+        tail = FrameJSONResponse(envelope).body[1:-1] if envelope else b""
+        yield encode(b"]" + (b"," + tail if tail else b"") + b"}")
+
+    chunks = json_chunks() if format == "json" else ndjson_chunks()
+    return StreamingResponse(iterate(chunks) if iterate else chunks, media_type=MEDIA_TYPES[format], headers=headers)
+
+
+def conditional_get(*tables: str):
+    """
+    FastAPI dependency for GET routes whose body only depends on the request and
+    on `tables`. The ETag is derived from the tables' write versions, a matching
+    If-None-Match is answered with 304 before the route takes a lane slot or
+    touches the database. Otherwise the route gets the ETag to send with `tagged`.
+
+    Declare it before the lane dependency so a 304 never waits for a slot.
+    The dependency stays a plain function: FastAPI runs it in its threadpool,
+    so the PRAGMA data_version check and table_versions read of
+    `TableVersions.sync` never block the event loop.
+    """
+    def dependency(request: Request, if_none_match: str | None = Header(default=None)) -> str:
+        versions = request.app.state.table_versions
+        # the representation also depends on the query string and the negotiated format
+        variant = f"{request.url.path}?{request.url.query}|{request.headers.get('accept', '')}"
+        digest = hashlib.blake2b(variant.encode("utf-8"), digest_size=6).hexdigest()
+        etag = f'"{versions.token(tables)}-{digest}"'
+        if if_none_match:
+            candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+            if etag in candidates or "*" in candidates:
+                raise HTTPException(status_code=304, headers={"ETag": etag})
+        return etag
+    return dependency
+
+
+def tagged(content, etag: str) -> Response:
+    """
+    Attach the ETag from `conditional_get` to a successful response, error
+    bodies are sent without one so clients never revalidate against them.
+    """
+    if isinstance(content, Response):
+        response = content
+    else:
+        with timed("serialization"):
+            response = JSONResponse(jsonable_encoder(content))
+    response.headers["ETag"] = etag
+    # cache, but ask again every time, the 304 makes asking cheap
+    response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,216 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import polars as pl
+import pytest
+from fastapi.testclient import TestClient
+import app as app_module
+import data_handler
+import profiling
+from database_interface import TableVersions
+
+# cumulative `-X importtime` of `import app`, most of it is FastAPI and Polars
+IMPORT_BUDGET_S = 2.5
+# only loaded on the code paths that use them, never by starting a worker
+LAZY_MODULES = ("numpy", "pandas", "pyarrow", "pytz", "featherstore")
+
+
+@pytest.fixture
+def client(tmpdir, monkeypatch):
+    db_name = str(tmpdir.join("test.db"))
+    monkeypatch.setattr(data_handler, "DB_NAME", db_name)
+    monkeypatch.setattr(app_module, "DB_NAME", db_name)
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+def test_employee_endpoints(client):
+    res = client.post("/add_employee", json={"data": {"full_name": "Ravi", "phone_no": "99999"}})
+    assert res.json() == {"msg": "Employee added successfully", "has_error": False}
+    employees = client.get("/get_all_employees").json()["employees"]
+    assert [employee["full_name"] for employee in employees] == ["Ravi"]
+
+
+def test_handlers_are_created_once(client):
+    employee_data = app_module.app.state.employee_data
+    client.get("/get_all_employees")
+    client.get("/get_all_employees")
+    assert app_module.app.state.employee_data is employee_data
+
+
+def test_bulk_salary_entry_import(client):
+    client.post("/create_own_company", json={"data": {"company_name": "saisri"}})
+    client.post("/add_employee", json={"data": {"full_name": "Ravi"}})
+    employee_id = client.get("/get_all_employees").json()["employees"][0]["employee_id"]
+
+    entry = {"payment": 100, "employee_id": employee_id, "company": "saisri", "work_ids": [1], "costs": [5], "quantities": [2]}
+    res = client.post("/create_employee_salary_entries", json={"data": [entry, entry]})
+    assert res.json()["inserted"] == 2
+
+    csv = f'payment,employee_id,company,work_ids,costs,quantities\n10,{employee_id},saisri,"[1, 2]","[1, 2]","[3, 4]"\n'
+    res = client.post("/import_employee_salary_entries", files={"file": ("entries.csv", csv)})
+    assert res.json()["inserted"] == 1
+
+    entries = client.get("/get_all_salary_entries_company", params={"company": "saisri"}).json()["salary_entries"]
+    assert [entry["work_done"] for entry in entries] == [10, 10, 11]
+
+
+def test_list_endpoints_page_on_request(client):
+    for name in ("Ravi", "Sita", "Arjun"):
+        client.post("/add_employee", json={"data": {"full_name": name}})
+
+    assert len(client.get("/get_all_employees").json()["employees"]) == 3
+    page = client.get("/get_all_employees", params={"limit": 2, "fields": "full_name"}).json()
+    assert page["employees"] == [{"employee_id": 1, "full_name": "Ravi"}, {"employee_id": 2, "full_name": "Sita"}]
+    page = client.get("/get_all_employees", params={"limit": 2, "after": page["next_after"]}).json()
+    assert [employee["full_name"] for employee in page["employees"]] == ["Arjun"]
+    assert page["next_after"] is None
+
+    assert client.get("/get_all_employees", params={"limit": 0}).status_code == 422
+
+
+def test_salary_entries_content_negotiation(client):
+    client.post("/create_own_company", json={"data": {"company_name": "saisri"}})
+    client.post("/add_employee", json={"data": {"full_name": "Ravi"}})
+    entry = {"payment": 100, "employee_id": 1, "company": "saisri", "work_ids": [1], "costs": [5], "quantities": [2]}
+    client.post("/create_employee_salary_entries", json={"data": [entry, entry, entry]})
+    expected = client.get("/get_all_salary_entries").json()["salary_entries"]
+
+    res = client.get("/get_all_salary_entries", headers={"Accept": "application/vnd.apache.arrow.stream"})
+    assert res.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert pl.read_ipc_stream(io.BytesIO(res.content)).to_dicts() == expected
+
+    res = client.get("/get_all_salary_entries", params={"format": "parquet", "compression": "zstd", "limit": 2})
+    assert pl.read_parquet(io.BytesIO(res.content)).to_dicts() == expected[:2]
+    assert res.headers["x-next-after"] == "2"
+
+    res = client.get("/get_all_salary_entries_company", params={"company": "saisri", "format": "ndjson", "compression": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert [json.loads(line)["work_done"] for line in res.text.splitlines()] == [10, 10, 10]
+
+    res = client.get("/get_all_salary_entries", params={"format": "xml"})
+    assert res.json()["has_error"] is True
+
+
+def test_list_endpoints_stream(client):
+    client.post("/create_own_company", json={"data": {"company_name": "saisri"}})
+    client.post("/add_employee", json={"data": {"full_name": "Ravi"}})
+    entry = {"payment": 100, "employee_id": 1, "company": "saisri", "work_ids": [1], "costs": [5], "quantities": [2]}
+    client.post("/create_employee_salary_entries", json={"data": [entry, entry]})
+
+    for path, params in (("/get_all_salary_entries", {}), ("/get_all_salary_entries_company", {"company": "saisri"}), ("/get_all_employees", {})):
+        assert client.get(path, params=params | {"stream": True}).json() == client.get(path, params=params).json()
+
+    res = client.get("/get_all_salary_entries", params={"stream": True, "format": "ndjson"})
+    assert [json.loads(line)["payment"] for line in res.text.splitlines()] == [100, 100]
+    assert client.get("/get_all_salary_entries", params={"stream": True, "limit": 1}).json()["has_error"] is True
+
+
+def test_conditional_get_answers_304_without_the_database(client, monkeypatch):
+    client.post("/add_employee", json={"data": {"full_name": "Ravi"}})
+    res = client.get("/get_all_employees")
+    etag = res.headers["etag"]
+    assert client.get("/get_all_employees", params={"limit": 1}).headers["etag"] != etag
+
+    def no_database(*args, **kwargs):
+        raise AssertionError("304 must not read the database")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(data_handler.DatabaseInterface, "execute_select_query", no_database)
+        res = client.get("/get_all_employees", headers={"If-None-Match": etag})
+        assert res.status_code == 304
+        assert res.content == b""
+
+    client.post("/add_employee", json={"data": {"full_name": "Sita"}})
+    res = client.get("/get_all_employees", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["etag"] != etag
+    assert len(res.json()["employees"]) == 2
+
+
+def test_conditional_get_syncs_versions_off_the_event_loop(client, monkeypatch):
+    sync = TableVersions.sync
+    on_loop = []
+
+    def recording_sync(self, force=False):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return sync(self, force=True)
+
+    monkeypatch.setattr(TableVersions, "sync", recording_sync)
+    etag = client.get("/get_all_works").headers["etag"]
+    assert client.get("/get_all_works", headers={"If-None-Match": etag}).status_code == 304
+    assert on_loop and not any(on_loop)
+
+
+def metric_value(body: str, sample: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_break_requests_down_by_route(client):
+    listed = 'http_requests_total{method="GET",route="/get_all_employees",status="200"}'
+    unmatched = 'http_requests_total{method="GET",route="unmatched",status="404"}'
+    db_phase = 'http_request_phase_seconds_count{method="GET",route="/get_all_employees",phase="db"}'
+    # metrics live for the whole process, other tests count too
+    before = client.get("/metrics").text
+
+    client.post("/add_employee", json={"data": {"full_name": "Ravi"}})
+    res = client.get("/get_all_employees?limit=10")
+    timings = dict(part.split(";dur=") for part in res.headers["server-timing"].split(", "))
+    assert set(timings) == {"db", "polars", "serialization"}
+    assert float(timings["db"]) > 0 and float(timings["serialization"]) > 0
+    # paths no route matches share one label
+    client.get("/get_employee/1")
+
+    body = client.get("/metrics").text
+    for sample in (listed, unmatched, db_phase):
+        assert metric_value(body, sample) == metric_value(before, sample) + 1
+    assert metric_value(body, 'http_requests_in_flight{method="GET",route="/metrics"}') == 1
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert "# TYPE db_query_duration_seconds histogram" in body
+
+
+def test_profiling_is_opt_in_per_request(client, tmpdir, monkeypatch):
+    res = client.get("/get_all_employees", headers={"X-Profile": "secret"})
+    assert "x-profile-id" not in res.headers
+
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmpdir.join("profiles")))
+    assert "x-profile-id" not in client.get("/get_all_employees", headers={"X-Profile": "guess"}).headers
+    res = client.get("/get_all_employees", headers={"X-Profile": "secret"})
+    assert res.status_code == 200
+    profile_id = res.headers["x-profile-id"]
+
+    assert client.get(f"/profiles/{profile_id}").status_code == 404
+    profile = client.get(f"/profiles/{profile_id}", headers={"X-Profile": "secret"}).text
+    # collapsed stacks: the thread name, then file:function frames from the outermost call in, then the count
+    lines = profile.splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert all(".py:" in frame for frame in stack.split(";")[1:])
+
+
+def test_app_import_stays_within_budget():
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import app, sys; print([m for m in {LAZY_MODULES!r} if m in sys.modules])"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+    )
+    assert res.stdout.strip() == "[]"
+    cumulative_us = {}
+    for line in res.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                cumulative_us[name.strip()] = int(cumulative)
+    assert cumulative_us["app"] / 1e6 < IMPORT_BUDGET_S
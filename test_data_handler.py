@@ -0,0 +1,355 @@
+import sqlite3
+import time
+import polars as pl
+import pytest
+import data_handler
+from data_handler import EmployeeData, OwnCompanyData, SalaryData, SummaryInsights, Works, BusTypes
+from database_interface import ConnectionPool, DatabaseInterface, query_stats
+from migrations import MIGRATIONS, enforce_unique_names, migrate
+
+
+def test_migrate_is_idempotent(db_name):
+    assert migrate(db_name) == len(MIGRATIONS)
+
+
+def test_migrate_upgrades_legacy_salaries(tmpdir):
+    db_name = str(tmpdir.join("legacy.db"))
+    conn = sqlite3.connect(db_name)
+    conn.execute("""CREATE TABLE salaries (salary_entry_id INTEGER PRIMARY KEY AUTOINCREMENT, payment INTEGER, record_date TEXT,
+        employee_id INTEGER, type_of_payment TEXT, mode_of_payment TEXT, company TEXT, works TEXT, costs TEXT,
+        quantities TEXT, work_done INTEGER, created_at TEXT)""")
+    conn.execute("INSERT INTO salaries (payment, company, works, costs, quantities) VALUES (10, 'saisri', '[4, 5]', '[2, 3]', '[1, 1]')")
+    conn.execute("INSERT INTO salaries (payment, company, works, costs, quantities) VALUES (20, 'saisri', 'None', '[]', '[]')")
+    conn.commit()
+    conn.close()
+    migrate(db_name)
+    conn = sqlite3.connect(db_name)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(salaries)")]
+    assert "type_of_work" in columns
+    assert not {"works", "work_ids", "costs", "quantities"} & set(columns)
+    lines = conn.execute("SELECT salary_entry_id, line_no, work_id, cost, quantity FROM salary_lines ORDER BY 1, 2").fetchall()
+    assert lines == [(1, 0, 4, 2, 1), (1, 1, 5, 3, 1)]
+
+
+def test_handlers_issue_no_ddl(db_name):
+    statements = []
+    pool = data_handler.DatabaseInterface(db_name).pool
+    pool.writer().set_trace_callback(statements.append)
+    EmployeeData(), OwnCompanyData(), SalaryData(), SummaryInsights(), Works(), BusTypes()
+    assert statements == []
+
+
+def test_employee_round_trip(employee_id):
+    employee = EmployeeData().get_employee(employee_id)
+    assert employee["full_name"] == "Ravi"
+    with pytest.raises(ValueError):
+        EmployeeData().add_employee({"full_name": "Ravi"})
+
+
+def test_salary_entry_round_trip(company, employee_id):
+    salary_data = SalaryData()
+    salary_data.add_salary_entry({
+        "payment": 500, "record_date": "2024-07-01", "employee_id": employee_id,
+        "type_of_payment": "salary", "mode_of_payment": "cash", "company": company,
+        "work_ids": [], "costs": [2, 3], "quantities": [10, 5],
+    })
+    entries = salary_data.get_all_salary_entries_company(company)
+    assert len(entries) == 1
+    assert entries[0]["work_done"] == 35
+    assert entries[0]["costs"] == [2, 3]
+
+    with pytest.raises(ValueError):
+        salary_data.add_salary_entry({"company": "unknown", "employee_id": employee_id})
+
+    summary = SummaryInsights().get_payment_summary(company)
+    assert summary["total_payment"] == 500
+    assert summary["total_entries"] == 1
+
+
+def test_salary_entry_checks_and_writes_share_one_transaction(company, employee_id):
+    salary_data = SalaryData()
+    entry = {
+        "payment": 500, "record_date": "2024-07-01", "employee_id": employee_id,
+        "type_of_payment": "salary", "mode_of_payment": "cash", "company": company,
+        "work_ids": [1], "costs": [2], "quantities": [10],
+    }
+    statements = []
+    pool = salary_data.db.pool
+    pool.writer().set_trace_callback(statements.append)
+    pool.reader().set_trace_callback(statements.append)
+    salary_data.add_salary_entry(entry)
+    salary_data.update_salary_entry(1, {**entry, "payment": 700})
+    pool.writer().set_trace_callback(None)
+    pool.reader().set_trace_callback(None)
+
+    keywords = [statement.split()[0] for statement in statements]
+    assert keywords.count("BEGIN") == keywords.count("COMMIT") == 2
+    # the existence checks ran inside the transactions, on the writer
+    assert keywords[0] == "BEGIN" and keywords[keywords.index("COMMIT") + 1] == "BEGIN"
+    assert salary_data.get_all_salary_entries_company(company)[0]["payment"] == 700
+
+
+def test_values_are_bound_not_inlined(db_name):
+    EmployeeData().add_employee({"full_name": "O'Brien", "address": "'); DROP TABLE employees; --"})
+    employee = EmployeeData().get_all_employees()[0]
+    assert employee["full_name"] == "O'Brien"
+    assert employee["address"] == "'); DROP TABLE employees; --"
+
+
+def test_add_salary_entries_batch(company, employee_id):
+    salary_data = SalaryData()
+    inserted = salary_data.add_salary_entries([
+        {"payment": 100, "record_date": "2024-07-01", "employee_id": employee_id, "type_of_payment": "salary",
+         "company": company, "work_ids": [1, 2], "costs": [2, 3], "quantities": [10, 5]},
+        {"payment": 50, "record_date": "2024-07-02", "employee_id": employee_id, "type_of_payment": "advance",
+         "company": company, "work_ids": [], "costs": [], "quantities": []},
+    ])
+    assert inserted == 2
+    entries = salary_data.get_all_salary_entries_company(company)
+    assert [entry["work_done"] for entry in entries] == [35, 0]
+    assert entries[0]["works"] == [1, 2]
+    assert entries[1]["costs"] == []
+
+
+def test_add_salary_entries_runs_one_statement_per_table(company, employee_id):
+    def calls():
+        return {
+            stat["query"].split("(")[0]: stat["count"]
+            for stat in query_stats() if stat["caller"] == "SalaryData.add_salary_entries" and stat["query"].startswith("INSERT")
+        }
+
+    salary_data = SalaryData()
+    entry = {"payment": 100, "employee_id": employee_id, "company": company, "work_ids": [1, 2], "costs": [2, 3], "quantities": [1, 1]}
+    salary_data.add_salary_entry(entry)
+    last_id = salary_data.get_all_salary_entries_company(company)[0]["salary_entry_id"]
+    salary_data.delete_salary_entry(employee_id, last_id)
+
+    before = calls()
+    assert salary_data.add_salary_entries([entry] * 50) == 50
+    after = calls()
+    assert {query: count - before.get(query, 0) for query, count in after.items()} == {
+        "INSERT INTO salaries ": 1, "INSERT INTO salary_lines ": 1,
+    }
+    # ids are assigned past deleted ones, like AUTOINCREMENT does
+    ids = [row["salary_entry_id"] for row in salary_data.get_all_salary_entries_company(company)]
+    assert ids == list(range(last_id + 1, last_id + 51))
+    lines = salary_data.db.execute_select_query("SELECT COUNT(*) AS n, MIN(salary_entry_id) AS first FROM salary_lines").row(0)
+    assert lines == (100, last_id + 1)
+
+
+def test_salary_lines_are_replaced_on_update_and_removed_on_delete(company, employee_id):
+    salary_data = SalaryData()
+    entry = {"payment": 100, "employee_id": employee_id, "company": company, "work_ids": [1, 2], "costs": [2, 3], "quantities": [1, 1]}
+    salary_data.add_salary_entry(entry)
+    salary_entry_id = salary_data.get_all_salary_entries_company(company)[0]["salary_entry_id"]
+
+    salary_data.update_salary_entry(salary_entry_id, dict(entry, works=[7], costs=[10], quantities=[4]))
+    updated = salary_data.get_all_salary_entries_of_an_employee(employee_id)[0]
+    assert (updated["work_ids"], updated["costs"], updated["quantities"], updated["work_done"]) == ([7], [10], [4], 40)
+    assert salary_data.get_work_totals(company) == [
+        {"work_id": 7, "work_name": None, "bus_type": None, "total_entries": 1, "total_quantity": 4, "total_work_done": 40}
+    ]
+
+    salary_data.delete_salary_entry(employee_id, salary_entry_id)
+    assert salary_data.db.execute_select_query("SELECT * FROM salary_lines").is_empty()
+
+
+def test_add_salary_entries_is_all_or_nothing(company, employee_id):
+    salary_data = SalaryData()
+    entry = {"payment": 100, "employee_id": employee_id, "company": company, "costs": [1], "quantities": [1]}
+    with pytest.raises(ValueError, match="Employee with id 999 does not exist"):
+        salary_data.add_salary_entries([entry, dict(entry, employee_id=999)])
+    with pytest.raises(ValueError, match="Advance payment not allowed"):
+        salary_data.add_salary_entries([entry, dict(entry, type_of_payment="advance")])
+    assert salary_data.get_all_salary_entries_company(company) == []
+
+
+def test_works_catalog_is_cached_and_invalidated_on_write(db_name):
+    BusTypes().add_bus_type({"bus_type": "volvo"})
+    works = Works()
+    works.add_work({"work_name": "paint", "bus_type": "volvo", "cost": 500})
+    misses = works.catalog.misses
+
+    assert [work["work_name"] for work in works.get_all_works_brief()] == ["paint"]
+    assert [work["work_name"] for work in Works().get_all_works_brief()] == ["paint"]
+    assert works.catalog.misses == misses + 1
+    assert works.catalog.hits >= 1
+
+    with pytest.raises(ValueError, match="already exists"):
+        works.add_work({"work_name": "paint", "bus_type": "volvo", "cost": 1})
+    with pytest.raises(ValueError, match="Bus type with name tata does not exist"):
+        works.add_work({"work_name": "wash", "bus_type": "tata", "cost": 1})
+
+    work_id = works.get_all_works_brief()[0]["work_id"]
+    works.update_work(work_id, {"work_name": "paint", "bus_type": "volvo", "cost": 700})
+    assert works.get_all_works_brief()[0]["cost"] == 700
+    works.delete_work(work_id)
+    assert works.get_all_works_brief() == []
+
+
+def test_payment_summary_rollup_matches_aggregate(company, employee_id):
+    salary_data = SalaryData()
+    summary = SummaryInsights()
+    assert summary.get_payment_summary(company)["total_entries"] == 0
+
+    def entry(payment, cost):
+        return {"payment": payment, "employee_id": employee_id, "company": company, "costs": [cost], "quantities": [1]}
+
+    salary_data.add_salary_entries([entry(100, 5), entry(300, 1), entry(200, 9)])
+    salary_data.add_salary_entry(entry(50, 2))
+    ids = {row["payment"]: row["salary_entry_id"] for row in salary_data.get_all_salary_entries_company(company)}
+    salary_data.delete_salary_entry(employee_id, ids[300])
+    salary_data.update_salary_entry(ids[50], entry(75, 20))
+
+    expected = salary_data.db.execute_select_query("""
+        SELECT SUM(payment) as total_payment, AVG(payment) as average_payment, MAX(payment) as max_payment, MIN(payment) as min_payment,
+        COUNT(payment) as total_entries, SUM(work_done) as total_work_done, AVG(work_done) as average_work_done, MAX(work_done) as max_work_done, MIN(work_done) as min_work_done
+        FROM salaries WHERE company = ?""", (company,)).to_dicts()[0]
+    assert summary.get_payment_summary(company) == expected
+    assert expected["max_payment"] == 200 and expected["max_work_done"] == 20
+
+    for salary_entry_id in ids.values():
+        salary_data.delete_salary_entry(employee_id, salary_entry_id)
+    assert summary.get_payment_summary(company) == dict.fromkeys(expected, None) | {"total_entries": 0}
+
+
+def test_keyset_pages_cover_every_row_once(db_name):
+    employee_data = EmployeeData()
+    for name in ("Ravi", "Sita", "Arjun", "Kiran", "Mohan"):
+        employee_data.add_employee({"full_name": name, "phone_no": "99999"})
+
+    names, after = [], None
+    while True:
+        rows, after = employee_data.get_employees_page(2, after, fields="full_name")
+        assert all(set(row) == {"employee_id", "full_name"} for row in rows)
+        names += [row["full_name"] for row in rows]
+        if after is None:
+            break
+    assert names == ["Ravi", "Sita", "Arjun", "Kiran", "Mohan"]
+
+    with pytest.raises(ValueError):
+        employee_data.get_employees_page(2, fields="full_name,password")
+
+
+def test_salary_entries_page_projection(company, employee_id):
+    salary_data = SalaryData()
+    entry = {"payment": 100, "employee_id": employee_id, "company": company, "work_ids": [1, 2], "costs": [2, 3], "quantities": [10, 5]}
+    salary_data.add_salary_entries([entry, entry, entry])
+
+    rows, after = salary_data.get_salary_entries_page(2)
+    assert [row["costs"] for row in rows] == [[2, 3], [2, 3]]
+    rows, after = salary_data.get_salary_entries_page(2, after, fields="payment,quantities")
+    assert rows == [{"salary_entry_id": 3, "payment": 100, "quantities": [10, 5]}]
+    assert after is None
+
+    rows, _ = salary_data.get_salary_entries_page(5, fields="work_done")
+    assert rows == [{"salary_entry_id": i, "work_done": 35} for i in (1, 2, 3)]
+
+    rows, after = OwnCompanyData().get_own_companies_page(5, fields="company_name,bank_name")
+    assert rows == [{"company_id": 1, "company_name": "saisri", "bank_name": ["SBI"]}]
+
+
+def test_empty_pages_have_the_schema_of_full_pages(company, employee_id):
+    salary_data = SalaryData()
+    empty, _ = salary_data.get_salary_entries_page_as_df(5)
+    salary_data.add_salary_entries([{"payment": 100, "employee_id": employee_id, "company": company, "work_ids": [1], "costs": [2], "quantities": [3]}])
+    full, after = salary_data.get_salary_entries_page_as_df(5)
+    assert len(full) == 1 and empty.schema == full.schema
+    assert empty.schema["work_done"] == pl.Int64
+    assert salary_data.get_salary_entries_page_as_df(5, after=1)[0].schema == full.schema
+
+
+def test_streamed_salary_entries_match_the_listing(company, employee_id):
+    salary_data = SalaryData()
+    entries = [
+        {"payment": i, "employee_id": employee_id, "company": company, "work_ids": list(range(i % 4)), "costs": [2] * (i % 4), "quantities": [3] * (i % 4)}
+        for i in range(10)
+    ]
+    salary_data.add_salary_entries(entries)
+    # batches of 4 joined rows cut through the lines of an entry almost every time
+    streamed = [row for batch in salary_data.stream_salary_entries(batch_size=4) for row in batch.to_dicts()]
+    assert streamed == salary_data.read_salary_entries().to_dicts()
+
+
+def test_writes_from_other_processes_invalidate_caches(db_name):
+    employee_data = EmployeeData()
+    works = Works()
+    BusTypes().add_bus_type({"bus_type": "volvo"})
+    works.add_work({"work_name": "paint", "bus_type": "volvo", "cost": 500})
+    employee_data.add_employee({"full_name": "Ravi"})
+    assert [employee["full_name"] for employee in employee_data.get_all_employees()] == ["Ravi"]
+    assert works.check_work_exists(1)
+    versions = employee_data.db.pool.versions
+    token = versions.token(["employees"])
+
+    # a sibling worker process has a pool, connections and versions of its own
+    sibling = DatabaseInterface(db_name)
+    sibling.pool = ConnectionPool(db_name)
+    sibling.execute_with_auto_commit("INSERT INTO employees (full_name) VALUES (?)", ("Sita",))
+    sibling.execute_with_auto_commit("DELETE FROM works")
+    sibling.pool.close()
+
+    time.sleep(0.01)
+    assert [employee["full_name"] for employee in employee_data.get_all_employees()] == ["Ravi", "Sita"]
+    assert not works.check_work_exists(1)
+    assert versions.token(["employees"]) != token
+    assert versions.token(["employees"]).startswith("db")
+
+
+def test_migrate_renames_duplicate_names(tmpdir):
+    db_name = str(tmpdir.join("duplicates.db"))
+    migrate_until = MIGRATIONS.index(enforce_unique_names)
+    conn = sqlite3.connect(db_name)
+    for migration in MIGRATIONS[:migrate_until]:
+        migration(conn)
+    conn.execute(f"PRAGMA user_version = {migrate_until}")
+    conn.executemany("INSERT INTO employees (full_name) VALUES (?)", [("Ravi",), ("Ravi",), ("Sita",), (None,), (None,)])
+    conn.commit()
+    conn.close()
+
+    migrate(db_name)
+    conn = sqlite3.connect(db_name)
+    assert [row[0] for row in conn.execute("SELECT full_name FROM employees ORDER BY employee_id")] == ["Ravi", "Ravi (2)", "Sita", None, None]
+    conn.close()
+
+
+def test_migrate_renames_duplicates_around_existing_names(tmpdir):
+    db_name = str(tmpdir.join("duplicates.db"))
+    migrate_until = MIGRATIONS.index(enforce_unique_names)
+    conn = sqlite3.connect(db_name)
+    for migration in MIGRATIONS[:migrate_until]:
+        migration(conn)
+    conn.execute(f"PRAGMA user_version = {migrate_until}")
+    conn.executemany("INSERT INTO employees (full_name) VALUES (?)", [("A",), ("A (3)",), ("A",), ("A (3)",), ("A (3)",)])
+    conn.commit()
+    conn.close()
+
+    migrate(db_name)
+    conn = sqlite3.connect(db_name)
+    names = [row[0] for row in conn.execute("SELECT full_name FROM employees ORDER BY employee_id")]
+    assert names == ["A", "A (3)", "A (3-2)", "A (3) (4)", "A (3) (5)"]
+    conn.close()
+
+
+def test_duplicate_names_are_rejected_in_one_statement(db_name):
+    employee_data = EmployeeData()
+    employee_data.add_employee({"full_name": "Ravi"})
+    employee_data.add_employee({"full_name": "Sita"})
+
+    statements = []
+    employee_data.db.pool.writer().set_trace_callback(statements.append)
+    with pytest.raises(ValueError, match="Employee with name Ravi already exists"):
+        employee_data.add_employee({"full_name": "Ravi"})
+    assert [statement.split()[0] for statement in statements] == ["BEGIN", "INSERT", "ROLLBACK"]
+    employee_data.db.pool.writer().set_trace_callback(None)
+
+    with pytest.raises(ValueError, match="Employee with name Ravi already exists"):
+        employee_data.update_employee(2, {"full_name": "Ravi"})
+    BusTypes().add_bus_type({"bus_type": "volvo"})
+    with pytest.raises(ValueError, match="Bus type with name volvo already exists"):
+        BusTypes().add_bus_type({"bus_type": "volvo"})
+    Works().add_work({"work_name": "paint", "bus_type": "volvo"})
+    with pytest.raises(ValueError, match="Work with name paint already exists"):
+        Works().add_work({"work_name": "paint", "bus_type": "volvo"})
+    with pytest.raises(ValueError, match="Company does not exist"):
+        OwnCompanyData().update_own_company(42, {"company_name": "saisri"})
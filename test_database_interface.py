@@ -0,0 +1,226 @@
+import sqlite3
+import threading
+import time
+import polars as pl
+import database_interface
+import pytest
+from database_interface import DatabaseInterface, ResultCache, TableVersions, get_pool, query_stats, written_tables
+
+
+@pytest.fixture
+def db(tmpdir):
+    db = DatabaseInterface(str(tmpdir.join("test.db")))
+    db.execute_with_auto_commit("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER)")
+    yield db
+    db.pool.close()
+
+
+def test_interfaces_share_pool(db):
+    other = DatabaseInterface(db.db_name)
+    assert other.pool is db.pool
+    assert get_pool(db.db_name) is db.pool
+
+
+def test_connections_are_reused_per_thread(db):
+    assert db.pool.writer() is db.pool.writer()
+    assert db.pool.reader() is db.pool.reader()
+    assert db.pool.reader() is not db.pool.writer()
+
+    other_thread = []
+    thread = threading.Thread(target=lambda: other_thread.append(db.pool.reader()))
+    thread.start()
+    thread.join()
+    assert other_thread[0] is not db.pool.reader()
+
+
+def test_pragmas_applied(db):
+    conn = db.pool.writer()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert db.pool.reader().execute("PRAGMA query_only").fetchone()[0] == 1
+
+
+def test_reader_sees_committed_writes(db):
+    db.execute_with_auto_commit("INSERT INTO users (name, age) VALUES ('Alice', 30)")
+    res = db.execute_select_query("SELECT * FROM users")
+    assert res.to_dicts() == [{"id": 1, "name": "Alice", "age": 30}]
+
+
+def test_empty_select_keeps_columns(db):
+    res = db.execute_select_query("SELECT name, age FROM users")
+    assert res.is_empty()
+    assert res.columns == ["name", "age"]
+
+
+def test_close_reconnects_lazily(db):
+    conn = db.pool.writer()
+    db.pool.close()
+    assert db.pool.writer() is not conn
+    db.execute_with_auto_commit("INSERT INTO users (name, age) VALUES ('Bob', 41)")
+    assert len(db.execute_select_query("SELECT * FROM users")) == 1
+
+
+def test_stream_select_query_yields_batches(db):
+    db.execute_many("INSERT INTO users (name, age) VALUES (?, ?)", [(f"user{i}", i) for i in range(25)])
+    batches = db.stream_select_query("SELECT * FROM users WHERE age >= ? ORDER BY id", (5,), batch_size=8)
+    first = next(batches)
+    # the batches are read on a connection of their own, writes can go on meanwhile
+    db.execute_with_auto_commit("DELETE FROM users")
+    rest = list(batches)
+    assert [len(batch) for batch in [first] + rest] == [8, 8, 4]
+    assert rest[-1]["name"].to_list()[-1] == "user24"
+
+
+def test_writes_bump_table_versions(db):
+    assert written_tables("DELETE FROM salaries WHERE salary_entry_id = ?") == {"salaries", "company_payment_rollup"}
+    # without a table_versions table the versions are counted by this process
+    assert db.pool.versions.get(["users"]) == (("l", 0),)
+    db.execute_with_auto_commit("INSERT INTO users (name, age) VALUES (?, ?)", ("Ravi", 30))
+    db.execute_many("UPDATE users SET age = ? WHERE id = ?", [(31, 1)])
+    assert db.pool.versions.get(["users"]) == (("l", 2),)
+    with pytest.raises(sqlite3.OperationalError):
+        db.execute_statements_with_auto_commit([("DELETE FROM users", ()), ("DELETE FROM missing", ())])
+    # rolled back writes leave the version alone
+    assert db.pool.versions.get(["users"]) == (("l", 2),)
+
+
+def test_transaction_is_one_unit_of_work(db):
+    statements = []
+    db.pool.writer().set_trace_callback(statements.append)
+    other = DatabaseInterface(db.db_name)
+    with db.transaction():
+        db.execute_with_auto_commit("INSERT INTO users (name, age) VALUES (?, ?)", ("Ravi", 30))
+        # reads see the uncommitted write, other interfaces of the database join in
+        assert other.execute_select_query("SELECT name FROM users")["name"].to_list() == ["Ravi"]
+        assert db.pool.reader().execute("SELECT count(*) FROM users").fetchone() == (0,)
+        other.execute_many("UPDATE users SET age = ? WHERE id = ?", [(31, 1)])
+        assert db.pool.versions.get(["users"]) == (("l", 0),)
+    db.pool.writer().set_trace_callback(None)
+    assert [statement.split()[0] for statement in statements].count("COMMIT") == 1
+    assert db.pool.versions.get(["users"]) == (("l", 1),)
+
+    with db.transaction():
+        db.execute_with_auto_commit("INSERT INTO users (name, age) VALUES (?, ?)", ("Sita", 25))
+        # a failing nested block only undoes its own statements
+        with pytest.raises(sqlite3.OperationalError):
+            db.execute_statements_with_auto_commit([("DELETE FROM users", ()), ("DELETE FROM missing", ())])
+    assert db.execute_select_query("SELECT name FROM users ORDER BY id")["name"].to_list() == ["Ravi", "Sita"]
+
+    with pytest.raises(ValueError):
+        with db.transaction():
+            db.execute_with_auto_commit("DELETE FROM users")
+            raise ValueError("abort")
+    assert len(db.execute_select_query("SELECT * FROM users")) == 2
+    assert db.pool.versions.get(["users"]) == (("l", 2),)
+
+
+def test_group_commit_batches_concurrent_writes(db):
+    db.execute_with_auto_commit("CREATE UNIQUE INDEX users_name ON users (name)")
+    db.pool.enable_group_commit(window_ms=50)
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def insert(name):
+        barrier.wait()
+        try:
+            db.execute_with_auto_commit("INSERT INTO users (name, age) VALUES (?, ?)", (name, 30))
+        except sqlite3.IntegrityError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=insert, args=(f"user{i % 7}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # the duplicate fails on its own, the other writes still commit
+    assert len(errors) == 1
+    assert len(db.execute_select_query("SELECT * FROM users")) == 7
+    # one version bump per commit
+    assert db.pool.versions.get(["users"])[0][1] < 7
+
+    def check_and_write():
+        db.execute_with_auto_commit("DELETE FROM users")
+        raise ValueError("abort")
+
+    with pytest.raises(ValueError):
+        db.run_in_transaction(check_and_write)
+    db.pool.close()
+    assert len(db.execute_select_query("SELECT * FROM users")) == 7
+    assert db.execute_with_auto_commit("UPDATE users SET age = ?", (31,)) == 7
+
+
+def test_select_results_are_cached_until_a_read_table_is_written(db):
+    db.execute_with_auto_commit("INSERT INTO users (name, age) VALUES (?, ?)", ("Ravi", 30))
+    db.execute_with_auto_commit("CREATE TABLE logs (id INTEGER PRIMARY KEY)")
+    cache = db.pool.result_cache
+    first = db.execute_select_query("SELECT * FROM users WHERE age > ?", (20,))
+    assert db.execute_select_query("SELECT *\n    FROM users   WHERE age > ?", (20,)) is first
+    assert db.execute_select_query("SELECT * FROM users WHERE age > ?", (20.0,)) is not first
+    assert cache.stats()["hits"] == 1
+
+    db.execute_with_auto_commit("INSERT INTO logs DEFAULT VALUES")
+    assert db.execute_select_query("SELECT * FROM users WHERE age > ?", (20,)) is first
+    db.execute_with_auto_commit("UPDATE users SET age = ?", (10,))
+    assert db.execute_select_query("SELECT * FROM users WHERE age > ?", (20,)).is_empty()
+
+    volatile = "SELECT name, random() AS r FROM users"
+    assert db.execute_select_query(volatile) is not db.execute_select_query(volatile)
+    assert db.execute_select_query("SELECT * FROM users", cache=False) is not db.execute_select_query("SELECT * FROM users", cache=False)
+
+
+def test_comma_joined_reads_are_invalidated_by_writes_to_every_table(db):
+    db.execute_with_auto_commit("CREATE TABLE ages (age INTEGER, label TEXT)")
+    db.execute_many("INSERT INTO users (name, age) VALUES (?, ?)", [("Ravi", 30)])
+    db.execute_with_auto_commit("INSERT INTO ages (age, label) VALUES (?, ?)", (30, "thirties"))
+    query = "SELECT u.name, a.label FROM users u, ages AS a WHERE a.age = u.age"
+    assert db.execute_select_query(query)["label"].to_list() == ["thirties"]
+    db.execute_with_auto_commit("UPDATE ages SET label = ?", ("adult",))
+    assert db.execute_select_query(query)["label"].to_list() == ["adult"]
+
+
+def test_named_parameters_are_part_of_the_cache_key(db):
+    db.execute_many("INSERT INTO users (name, age) VALUES (?, ?)", [("Ravi", 30), ("Asha", 40)])
+    query = "SELECT name FROM users WHERE age = :age"
+    assert db.execute_select_query(query, {"age": 30})["name"].to_list() == ["Ravi"]
+    assert db.execute_select_query(query, {"age": 40})["name"].to_list() == ["Asha"]
+
+
+def test_result_cache_evicts_least_recently_used_and_expires(db, monkeypatch):
+    versions = TableVersions()
+    cache = ResultCache(versions, max_bytes=100, ttl=10)
+    frame = pl.DataFrame({"a": list(range(5))})  # 40 bytes
+    current = versions.get(("users",))
+    for key in ("a", "b"):
+        cache.put(key, frame, ("users",), current)
+    cache.get("a", current)
+    cache.put("c", frame, ("users",), current)
+    assert cache.get("b", current) is None
+    assert cache.get("a", current) is frame and cache.get("c", current) is frame
+    assert cache.stats()["evictions"] == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a", current) is None
+
+
+def test_statements_are_timed_per_query_and_caller(db, monkeypatch):
+    def load_adults():
+        return db.execute_select_query("SELECT * FROM users WHERE age >= ?", (18,), cache=False)
+
+    db.execute_many("INSERT INTO users (name, age) VALUES (?, ?)", [("Ravi", 30), ("Sita", 12)])
+    load_adults()
+    monkeypatch.setattr(database_interface, "SLOW_QUERY_MS", 0)
+    load_adults()
+
+    stats = {(stat["query"], stat["caller"]): stat for stat in query_stats()}
+    # helpers are followed up to the function of their module that was called
+    select = stats[("SELECT * FROM users WHERE age >= ?", "test_statements_are_timed_per_query_and_caller")]
+    assert select["count"] == 2 and select["rows"] == 2
+    assert select["p50"] is not None
+    insert = stats[("INSERT INTO users (name, age) VALUES (?, ?)", "test_statements_are_timed_per_query_and_caller")]
+    assert insert["rows"] == 2
+
+    slow = db.pool.slow_queries[-1]
+    assert slow["query"] == "SELECT * FROM users WHERE age >= ?"
+    assert any("SCAN users" in step for step in slow["plan"])
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import pytest
+from db_executor import ExecutionLane, LaneOverloaded
+
+
+def test_run_happens_off_the_event_loop_thread():
+    async def main():
+        lane = ExecutionLane("test", concurrency=1, max_queue_depth=1)
+        await lane.acquire()
+        try:
+            return await lane.run(threading.get_ident)
+        finally:
+            lane.release()
+            lane.shutdown()
+
+    assert asyncio.run(main()) != threading.get_ident()
+
+
+def test_rejects_when_queue_is_full():
+    async def main():
+        lane = ExecutionLane("test", concurrency=1, max_queue_depth=1)
+        await lane.acquire()
+        waiter = asyncio.create_task(lane.acquire())
+        await asyncio.sleep(0)
+        assert lane.waiting == 1
+        with pytest.raises(LaneOverloaded) as excinfo:
+            await lane.acquire()
+        assert excinfo.value.status_code == 503
+        lane.release()
+        await waiter
+        assert lane.running == 1
+        lane.release()
+        lane.shutdown()
+
+    asyncio.run(main())
+
+
+def test_iterate_holds_a_slot_while_streaming():
+    def numbers():
+        for i in range(3):
+            yield i, threading.get_ident()
+
+    async def main():
+        lane = ExecutionLane("test", concurrency=1, max_queue_depth=0)
+        items = []
+        async for item in lane.iterate(numbers()):
+            assert lane.running == 1
+            items.append(item)
+        assert lane.running == 0
+        lane.shutdown()
+        return items
+
+    items = asyncio.run(main())
+    assert [i for i, _ in items] == [0, 1, 2]
+    assert all(thread != threading.get_ident() for _, thread in items)
@@ -0,0 +1,130 @@
+"""
+Runs EXPLAIN QUERY PLAN for every statement the handlers issue and fails if a
+filtered query falls back to a full table SCAN. Queries without a WHERE clause
+are whole-table listings and are allowed to scan, as are the already filtered
+rows of a CO-ROUTINE subquery.
+"""
+import re
+import pytest
+import data_handler
+from data_handler import EmployeeData, OwnCompanyData, SalaryData, SummaryInsights, Works, BusTypes
+from database_interface import DatabaseInterface
+from migrations import migrate
+
+
+@pytest.fixture
+def recorded_queries(tmpdir, monkeypatch):
+    db_name = str(tmpdir.join("test.db"))
+    monkeypatch.setattr(data_handler, "DB_NAME", db_name)
+    migrate(db_name)
+
+    queries = []
+
+    def record(method):
+        def wrapper(self, query, params=(), *args, **kwargs):
+            queries.append((query, params))
+            return method(self, query, params, *args, **kwargs)
+        return wrapper
+
+    def record_statements(method):
+        def wrapper(self, statements, *args, **kwargs):
+            statements = list(statements)
+            queries.extend(statements)
+            return method(self, statements, *args, **kwargs)
+        return wrapper
+
+    def record_many(method):
+        def wrapper(self, query, seq_of_params, *args, **kwargs):
+            seq_of_params = list(seq_of_params)
+            queries.append((query, seq_of_params[0]))
+            return method(self, query, seq_of_params, *args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(DatabaseInterface, "execute_select_query", record(DatabaseInterface.execute_select_query))
+    monkeypatch.setattr(DatabaseInterface, "execute_with_auto_commit", record(DatabaseInterface.execute_with_auto_commit))
+    monkeypatch.setattr(DatabaseInterface, "execute_statements_with_auto_commit", record_statements(DatabaseInterface.execute_statements_with_auto_commit))
+    monkeypatch.setattr(DatabaseInterface, "execute_many", record_many(DatabaseInterface.execute_many))
+
+    exercise_handlers()
+    yield DatabaseInterface(db_name), queries
+    DatabaseInterface(db_name).pool.close()
+
+
+def exercise_handlers():
+    employees = EmployeeData()
+    companies = OwnCompanyData()
+    salaries = SalaryData()
+    works = Works()
+    bus_types = BusTypes()
+
+    bus_types.add_bus_type({"bus_type": "volvo"})
+    bus_types.update_bus_type(1, {"bus_type": "volvo"})
+    works.add_work({"work_name": "paint", "bus_type": "volvo", "cost": 500})
+    works.update_work(1, {"work_name": "paint", "bus_type": "volvo", "cost": 600})
+    works.get_all_works_brief()
+    works.get_works_page(10, after=0, fields="work_name")
+
+    employees.add_employee({"full_name": "Ravi"})
+    employees.update_employee(1, {"full_name": "Ravi"})
+    employees.get_employee(1)
+    employees.get_all_employees()
+    employees.get_employees_page(10, after=0, fields="full_name")
+    companies.add_own_company({"company_name": "saisri"})
+    companies.update_own_company(1, {"company_name": "saisri"})
+    companies.get_all_own_companies()
+    companies.get_own_companies_page(10, after=0)
+    companies.get_all_own_company_names()
+
+    entry = {"payment": 10, "employee_id": 1, "company": "saisri", "work_ids": [1], "costs": [600], "quantities": [2]}
+    salaries.add_salary_entry(entry)
+    salaries.add_salary_entries([entry, entry])
+    salaries.update_salary_entry(1, entry)
+    salaries.get_all_salary_entries()
+    salaries.get_salary_entries_page(10, after=0)
+    salaries.get_salary_entries_page(10, after=0, fields="payment")
+    salaries.get_all_salary_entries_company("saisri")
+    salaries.get_all_salary_entries_of_an_employee(1)
+    salaries.get_all_salary_entries_of_an_employee_company(1, "saisri")
+    salaries.get_work_totals("saisri")
+    SummaryInsights().get_payment_summary("saisri")
+    salaries.delete_salary_entry(1, 1)
+
+    works.delete_work(1)
+    bus_types.delete_bus_type(1)
+    companies.delete_own_company(1)
+    employees.delete_employee(1)
+
+
+def full_scans(db, query, params):
+    plan = db.pool.writer().execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    coroutines = {f"SCAN {row[3].removeprefix('CO-ROUTINE ')}" for row in plan if row[3].startswith("CO-ROUTINE ")}
+    # sqlite_sequence holds one row per AUTOINCREMENT table and cannot be indexed
+    allowed = coroutines | {"SCAN sqlite_sequence"}
+    return [row[3] for row in plan if row[3].startswith("SCAN ") and "VIRTUAL TABLE" not in row[3] and row[3] not in allowed]
+
+
+def test_filtered_handler_queries_use_indexes(recorded_queries):
+    db, queries = recorded_queries
+    assert queries
+    offenders = []
+    for query, params in queries:
+        if not re.search(r"\bWHERE\b", query, re.IGNORECASE):
+            continue
+        scans = full_scans(db, query, params)
+        if scans:
+            offenders.append((" ".join(query.split()), scans))
+    assert offenders == []
+
+
+def test_payment_summary_is_a_primary_key_lookup(recorded_queries):
+    db, queries = recorded_queries
+    query, params = next((query, params) for query, params in queries if "total_payment" in query)
+    plan = " ".join(row[3] for row in db.pool.writer().execute(f"EXPLAIN QUERY PLAN {query}", params))
+    assert "SEARCH company_payment_rollup USING INDEX sqlite_autoindex_company_payment_rollup_1 (company=?)" in plan
+
+
+@pytest.mark.parametrize("aggregate", ["MIN(payment)", "MAX(payment)", "MIN(work_done)", "MAX(work_done)"])
+def test_rollup_min_max_refresh_uses_covering_index(recorded_queries, aggregate):
+    db, _ = recorded_queries
+    plan = " ".join(row[3] for row in db.pool.writer().execute(f"EXPLAIN QUERY PLAN SELECT {aggregate} FROM salaries WHERE company = ?", ("saisri",)))
+    assert "SEARCH salaries USING COVERING INDEX" in plan
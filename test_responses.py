@@ -0,0 +1,28 @@
+import json
+import polars as pl
+from data_handler import SalaryData
+from responses import FrameJSONResponse
+
+
+def test_frame_json_matches_dicts():
+    df = pl.DataFrame({
+        "salary_entry_id": [1, 2],
+        "company": ["saisri", None],
+        "costs": [[2, 3], []],
+        "description": ["ద్వారా \"quoted\"", "line\nbreak"],
+    })
+    body = FrameJSONResponse({"salary_entries": df, "key": None, "token": "t"}).body
+    assert json.loads(body) == {"salary_entries": df.to_dicts(), "key": None, "token": "t"}
+
+
+def test_empty_frame_is_an_empty_list():
+    body = FrameJSONResponse({"works": pl.DataFrame(schema={"work_id": pl.Int64})}).body
+    assert json.loads(body) == {"works": []}
+
+
+def test_salary_listing_serializes_like_dicts(company, employee_id):
+    salary_data = SalaryData()
+    entry = {"payment": 100, "employee_id": employee_id, "company": company, "work_ids": [1, 2], "costs": [2, 3], "quantities": [10, 5]}
+    salary_data.add_salary_entries([entry, dict(entry, work_ids=[], costs=[], quantities=[])])
+    df = salary_data.get_all_salary_entries_as_df()
+    assert json.loads(FrameJSONResponse({"salary_entries": df}).body) == {"salary_entries": salary_data.get_all_salary_entries()}
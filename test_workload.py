@@ -0,0 +1,46 @@
+import sqlite3
+import polars as pl
+from data_handler import SalaryData, SummaryInsights
+from workload import generate, write
+
+
+def test_generate_is_deterministic_by_seed():
+    tables = generate(seed=3, employees=50, companies=4, works=20, salary_entries=2_000)
+    again = generate(seed=3, employees=50, companies=4, works=20, salary_entries=2_000)
+    other = generate(seed=4, employees=50, companies=4, works=20, salary_entries=2_000)
+    assert all(tables[table].equals(again[table]) for table in tables)
+    assert not tables["salaries"].equals(other["salaries"])
+
+
+def test_generated_entries_are_consistent():
+    tables = generate(seed=0, employees=50, companies=4, works=20, salary_entries=2_000, reserve=5)
+    salaries, lines = tables["salaries"], tables["salary_lines"]
+    assert salaries["record_date"].is_sorted()
+    assert salaries["employee_id"].max() <= 50 and tables["employees"].height == 55
+    assert set(salaries["company"]) <= set(tables["own_companies"]["company_name"].head(4))
+
+    totals = lines.group_by("salary_entry_id").agg(line_total=(pl.col("cost") * pl.col("quantity")).sum(), lines=pl.len())
+    entries = salaries.join(totals, on="salary_entry_id", how="left", coalesce=True)
+    advances = entries.filter(entries["type_of_payment"] == "advance")
+    assert advances["lines"].null_count() == advances.height and (advances["work_done"] == 0).all()
+    work = entries.filter(entries["type_of_payment"] == "salary")
+    assert (work["work_done"] == work["line_total"]).all() and work["lines"].null_count() == 0
+
+
+def test_written_workload_reads_back_through_the_handlers(db_name):
+    tables = generate(seed=0, employees=50, companies=4, works=20, salary_entries=2_000)
+    write(db_name, tables)
+
+    read = {row["salary_entry_id"]: row for row in SalaryData().get_all_salary_entries_company("company 2")}
+    work = tables["salaries"].filter(company="company 2", type_of_payment="salary")["salary_entry_id"][0]
+    lines = tables["salary_lines"].filter(salary_entry_id=work)
+    assert len(lines) > 0 and read[work]["costs"] == lines["cost"].to_list()
+    # advances are the only entries without lines
+    advance = tables["salaries"].filter(company="company 2", type_of_payment="advance")["salary_entry_id"][0]
+    assert read[advance]["costs"] == [] and read[advance]["work_ids"] == []
+
+    summary = SummaryInsights().get_payment_summary("company 2")
+    company = tables["salaries"].filter(company="company 2")
+    assert summary["total_entries"] == company.height and summary["total_payment"] == company["payment"].sum()
+    indexes = sqlite3.connect(db_name).execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')").fetchall()
+    assert ("idx_salaries_employee_company",) in indexes and ("trg_salaries_rollup_insert",) in indexes
@@ -0,0 +1,208 @@
+"""
+Deterministic synthetic data shaped like ours, for tests, benchmarks and capacity planning.
+
+`generate` draws every table of the data_handler schema as Polars DataFrames
+with vectorized NumPy draws, so millions of salary entries take seconds:
+
+- employees differ in how often they are paid, most entries of an employee
+  are with one home company and every employee has several entries a month
+- advances (no work lines, no work done) are mixed with salary entries for
+  work done, which carry one or more work lines priced from the works table
+- salary entry ids follow the record dates, as if entered as the work was done
+
+`write` inserts the frames into a migrated database. The same seed always
+gives the same frames, e.g.
+
+    tables = generate(seed=0, employees=1_000, salary_entries=100_000)
+    write(db_name, tables)
+"""
+import numpy as np
+import polars as pl
+
+from database_interface import DatabaseInterface
+
+BUS_TYPES = ("volvo", "ashok leyland", "tata", "eicher", "bharat benz", "scania", "mercedes", "force")
+DESIGNATIONS = ("painter", "welder", "fitter", "electrician", "helper")
+PAYMENT_MODES = ("cash", "upi", "bank")
+PAYMENT_MODE_WEIGHTS = (0.5, 0.35, 0.15)
+ADVANCE_SHARE = 0.3
+# share of an employee's entries that are with their home company
+HOME_COMPANY_SHARE = 0.9
+# line counts of work entries are 1 + geometric, capped at this
+MAX_LINES = 6
+CREATED_AT = "2024-01-01 09:00:00"
+# rows per executemany call in `write`
+WRITE_CHUNK_ROWS = 50_000
+
+# insert order, parents before the rows referring to them
+TABLES = ("bus_types", "employees", "own_companies", "works", "salaries", "salary_lines")
+ROLLUP_TRIGGER = "trg_salaries_rollup_insert"
+# the per-company totals of every salary entry, as the migration that added the rollup computes them
+ROLLUP_REBUILD = """
+    INSERT INTO company_payment_rollup
+    SELECT company, COUNT(payment), COALESCE(SUM(payment), 0), MAX(payment), MIN(payment),
+    COUNT(work_done), COALESCE(SUM(work_done), 0), MAX(work_done), MIN(work_done)
+    FROM salaries GROUP BY company
+"""
+
+
+def generate(
+    seed: int = 0,
+    employees: int = 10_000,
+    companies: int = 50,
+    works: int = 500,
+    salary_entries: int = 1_000_000,
+    months: int = 12,
+    first_month: str = "2024-01",
+    reserve: int = 0,
+) -> dict[str, pl.DataFrame]:
+    """
+    Build the rows of every table, keyed by table name.
+
+    Parameters:
+    -----------
+    seed : int
+        Seed of the generator, equal seeds give equal frames.
+    employees, companies, works : int
+        Rows of the employees, own_companies and works tables.
+    salary_entries : int
+        Salary entries, spread over `months` months starting at `first_month` ("YYYY-MM").
+    reserve : int
+        Extra employees, companies and works after the regular ones that no
+        salary entry refers to, so they can be deleted.
+
+    Returns:
+    --------
+    dict[str, polars.DataFrame]:
+        Frames with the columns of their table, ids starting at 1.
+    """
+    rng = np.random.default_rng(seed)
+    tables = {"bus_types": pl.DataFrame({"bus_type_id": np.arange(1, len(BUS_TYPES) + 1), "bus_type": BUS_TYPES})}
+
+    employee_count = employees + reserve
+    tables["employees"] = pl.DataFrame({
+        "employee_id": np.arange(1, employee_count + 1),
+        "full_name": numbered("employee", employee_count),
+        "created_at": pl.repeat(CREATED_AT, employee_count, eager=True),
+        "phone_no": digits("9", rng.integers(0, 10**9, employee_count)),
+        "address": numbered("street", employee_count, rng.integers(1, 500, employee_count)),
+        "designation": pick(DESIGNATIONS, rng.integers(0, len(DESIGNATIONS), employee_count)),
+    })
+
+    company_count = companies + reserve
+    company_names = numbered("company", company_count)
+    tables["own_companies"] = pl.DataFrame({
+        "company_id": np.arange(1, company_count + 1),
+        "company_name": company_names,
+        "created_at": pl.repeat(CREATED_AT, company_count, eager=True),
+        "phone_no": digits("8", rng.integers(0, 10**9, company_count)),
+        "type_of_company": pl.repeat("private", company_count, eager=True),
+    })
+
+    work_count = works + reserve
+    # catalog prices in steps of 10, most works are cheap
+    work_costs = np.clip(np.round(rng.lognormal(6.5, 0.7, work_count), -1), 50, 20_000).astype(np.int64)
+    tables["works"] = pl.DataFrame({
+        "work_id": np.arange(1, work_count + 1),
+        "work_name": numbered("work", work_count),
+        "bus_type": pick(BUS_TYPES, rng.integers(0, len(BUS_TYPES), work_count)),
+        "cost": work_costs,
+    })
+
+    # how often each employee is paid, a few are paid much more often than most
+    activity = rng.gamma(2.0, 1.0, employees)
+    employee_index = rng.choice(employees, salary_entries, p=activity / activity.sum())
+    home_company = rng.integers(0, companies, employees)
+    away = rng.random(salary_entries) >= HOME_COMPANY_SHARE
+    company_index = np.where(away, rng.integers(0, companies, salary_entries), home_company[employee_index])
+
+    # entry ids follow the record dates
+    day_index = np.sort(rng.integers(0, months * 28, salary_entries))
+    year, month = (int(part) for part in first_month.split("-"))
+    month_numbers = (year * 12 + month - 1) + np.arange(months)
+    dates = [f"{m // 12}-{m % 12 + 1:02d}-{day:02d}" for m in month_numbers for day in range(1, 29)]
+
+    advance = rng.random(salary_entries) < ADVANCE_SHARE
+    line_counts = np.where(advance, 0, np.minimum(rng.geometric(0.5, salary_entries), MAX_LINES))
+    line_total = int(line_counts.sum())
+    line_entry = np.repeat(np.arange(salary_entries), line_counts)
+    line_starts = np.cumsum(line_counts) - line_counts
+    line_work = rng.integers(0, works, line_total)
+    line_cost = work_costs[line_work]
+    line_quantity = rng.integers(1, 11, line_total)
+    work_done = np.bincount(line_entry, weights=line_cost * line_quantity, minlength=salary_entries).astype(np.int64)
+
+    # advances are small round sums, work is paid out at 80 to 100% of the work done
+    payment = np.where(
+        advance,
+        rng.integers(5, 51, salary_entries) * 100,
+        np.round(work_done * rng.uniform(0.8, 1.0, salary_entries)).astype(np.int64),
+    )
+
+    tables["salaries"] = pl.DataFrame({
+        "salary_entry_id": np.arange(1, salary_entries + 1),
+        "payment": payment,
+        "record_date": pick(dates, day_index),
+        "employee_id": employee_index + 1,
+        "type_of_payment": pl.Series(np.where(advance, "advance", "salary")),
+        "mode_of_payment": pick(PAYMENT_MODES, rng.choice(len(PAYMENT_MODES), salary_entries, p=PAYMENT_MODE_WEIGHTS)),
+        "company": company_names.gather(company_index),
+        "work_done": work_done,
+        "created_at": pick(dates, day_index) + " 18:00:00",
+    })
+    tables["salary_lines"] = pl.DataFrame({
+        "salary_entry_id": line_entry + 1,
+        "line_no": np.arange(line_total) - np.repeat(line_starts, line_counts),
+        "work_id": line_work + 1,
+        "cost": line_cost,
+        "quantity": line_quantity,
+    })
+    return tables
+
+
+def numbered(prefix: str, n: int, numbers=None) -> pl.Series:
+    """`prefix 1` to `prefix n`, or `prefix` followed by each of `numbers`."""
+    numbers = pl.Series(np.arange(1, n + 1) if numbers is None else numbers)
+    return f"{prefix} " + numbers.cast(pl.Utf8)
+
+
+def digits(prefix: str, numbers) -> pl.Series:
+    return prefix + pl.Series(numbers).cast(pl.Utf8).str.zfill(9)
+
+
+def pick(values, indices) -> pl.Series:
+    return pl.Series(list(values)).gather(indices)
+
+
+def write(db_name: str, tables: dict[str, pl.DataFrame]):
+    """
+    Insert generated frames into a migrated database, in one transaction.
+
+    The indexes of the written tables are dropped and built once the rows are
+    in. With salary entries, the company payment rollup is recomputed once
+    rather than updated by its insert trigger for every entry.
+    """
+    written = [table for table in TABLES if table in tables]
+    db = DatabaseInterface(db_name)
+    with db.transaction():
+        deferred = [
+            (kind, name, sql)
+            for kind, name, table, sql in db.execute_select_query(
+                "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"
+            ).iter_rows()
+            if (kind == "index" and table in written) or (name == ROLLUP_TRIGGER and "salaries" in written)
+        ]
+        for kind, name, _ in deferred:
+            db.execute_with_auto_commit(f"DROP {kind.upper()} {name}")
+
+        for table in written:
+            df = tables[table]
+            query = f"INSERT INTO {table} ({', '.join(df.columns)}) VALUES ({', '.join('?' * df.width)})"
+            for start in range(0, len(df), WRITE_CHUNK_ROWS):
+                db.execute_many(query, df.slice(start, WRITE_CHUNK_ROWS).iter_rows())
+
+        for _, _, sql in deferred:
+            db.execute_with_auto_commit(sql)
+        # after the indexes are back, the totals are read from the covering company index
+        if "salaries" in written:
+            db.execute_statements_with_auto_commit([("DELETE FROM company_payment_rollup", ()), (ROLLUP_REBUILD, ())])